@@ -5,4 +5,193 @@ CREATE TABLE IF NOT EXISTS scores (
     score INTEGER NOT NULL DEFAULT 0,
     active INTEGER NOT NULL DEFAULT 1,
     PRIMARY KEY (member_id, guild_id)
+);
+
+-- Each guild's active members in rank order, so ranks, scoreboards and the
+-- members around someone are walks along the index instead of sorts
+CREATE INDEX IF NOT EXISTS scores_rank
+ON scores (guild_id, active, score DESC, member_id);
+
+-- Total score of each member across every guild, kept up to date by the
+-- triggers below so global ranks never need to aggregate the scores table
+CREATE TABLE IF NOT EXISTS global_scores (
+    member_id INTEGER PRIMARY KEY,
+    score INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS global_scores_rank
+ON global_scores (score DESC, member_id);
+
+-- Backfill the totals the first time the table is created
+INSERT INTO global_scores (member_id, score)
+    SELECT member_id, SUM(score) FROM scores
+    WHERE NOT EXISTS (SELECT 1 FROM global_scores)
+    GROUP BY member_id;
+
+CREATE TRIGGER IF NOT EXISTS global_scores_insert
+AFTER INSERT ON scores
+BEGIN
+    INSERT INTO global_scores (member_id, score) VALUES (NEW.member_id, NEW.score)
+    ON CONFLICT (member_id) DO UPDATE SET score = score + excluded.score;
+END;
+
+CREATE TRIGGER IF NOT EXISTS global_scores_update
+AFTER UPDATE OF score ON scores
+WHEN NEW.score != OLD.score
+BEGIN
+    UPDATE global_scores SET score = score + NEW.score - OLD.score
+    WHERE member_id = NEW.member_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS global_scores_delete
+AFTER DELETE ON scores
+BEGIN
+    UPDATE global_scores SET score = score - OLD.score
+    WHERE member_id = OLD.member_id;
+END;
+
+-- Per guild XP rules, compiled into an in memory evaluator by xp.py
+CREATE TABLE IF NOT EXISTS xp_config (
+    guild_id INTEGER PRIMARY KEY,
+    base_xp INTEGER NOT NULL DEFAULT 30,
+    random_min INTEGER NOT NULL DEFAULT 0,
+    random_max INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS xp_channel_multipliers (
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    multiplier REAL NOT NULL DEFAULT 1,
+    PRIMARY KEY (guild_id, channel_id)
+);
+
+CREATE TABLE IF NOT EXISTS xp_role_multipliers (
+    guild_id INTEGER NOT NULL,
+    role_id INTEGER NOT NULL,
+    multiplier REAL NOT NULL DEFAULT 1,
+    PRIMARY KEY (guild_id, role_id)
+);
+
+CREATE TABLE IF NOT EXISTS xp_ignored_channels (
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, channel_id)
+);
+
+-- Roles given to members when they reach a level
+CREATE TABLE IF NOT EXISTS level_rewards (
+    guild_id INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    role_id INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, level, role_id)
+);
+
+-- Where to announce level ups, a NULL channel announces in the message's channel
+CREATE TABLE IF NOT EXISTS level_announcements (
+    guild_id INTEGER PRIMARY KEY,
+    channel_id INTEGER
+);
+
+-- The level curve of guilds that changed it from the default, see levels.py
+CREATE TABLE IF NOT EXISTS level_curves (
+    guild_id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    value TEXT
+);
+
+-- When each inactive member left, kept up to date by the triggers below so
+-- the archive job finds long departed members without scanning scores
+CREATE TABLE IF NOT EXISTS departures (
+    guild_id INTEGER NOT NULL,
+    member_id INTEGER NOT NULL,
+    departed_at INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, member_id)
+);
+
+-- Members who were already inactive count as leaving now
+INSERT OR IGNORE INTO departures (guild_id, member_id, departed_at)
+    SELECT guild_id, member_id, CAST(strftime('%s', 'now') AS INTEGER) FROM scores
+    WHERE active = 0 AND NOT EXISTS (SELECT 1 FROM departures);
+
+CREATE TRIGGER IF NOT EXISTS departures_insert
+AFTER INSERT ON scores
+WHEN NEW.active = 0
+BEGIN
+    INSERT OR IGNORE INTO departures (guild_id, member_id, departed_at)
+    VALUES (NEW.guild_id, NEW.member_id, CAST(strftime('%s', 'now') AS INTEGER));
+END;
+
+CREATE TRIGGER IF NOT EXISTS departures_leave
+AFTER UPDATE OF active ON scores
+WHEN OLD.active = 1 AND NEW.active = 0
+BEGIN
+    INSERT OR IGNORE INTO departures (guild_id, member_id, departed_at)
+    VALUES (NEW.guild_id, NEW.member_id, CAST(strftime('%s', 'now') AS INTEGER));
+END;
+
+CREATE TRIGGER IF NOT EXISTS departures_return
+AFTER UPDATE OF active ON scores
+WHEN OLD.active = 0 AND NEW.active = 1
+BEGIN
+    DELETE FROM departures WHERE guild_id = NEW.guild_id AND member_id = NEW.member_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS departures_delete
+AFTER DELETE ON scores
+BEGIN
+    DELETE FROM departures WHERE guild_id = OLD.guild_id AND member_id = OLD.member_id;
+END;
+
+-- Scores of members who left long ago, or whose guild the bot left, moved
+-- out of scores by the archive job. They still count towards global_scores.
+CREATE TABLE IF NOT EXISTS archived_scores (
+    member_id INTEGER NOT NULL,
+    guild_id INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    archived_at INTEGER NOT NULL,
+    PRIMARY KEY (member_id, guild_id)
+);
+
+-- A member who comes back gets their archived score back
+CREATE TRIGGER IF NOT EXISTS archived_scores_restore
+AFTER INSERT ON scores
+WHEN EXISTS (
+    SELECT 1 FROM archived_scores
+    WHERE member_id = NEW.member_id AND guild_id = NEW.guild_id
 )
+BEGIN
+    -- The archived score never left the global total, take it out before
+    -- global_scores_update adds it back
+    UPDATE global_scores SET score = score - (
+        SELECT score FROM archived_scores
+        WHERE member_id = NEW.member_id AND guild_id = NEW.guild_id
+    )
+    WHERE member_id = NEW.member_id;
+
+    UPDATE scores SET score = score + (
+        SELECT score FROM archived_scores
+        WHERE member_id = NEW.member_id AND guild_id = NEW.guild_id
+    )
+    WHERE member_id = NEW.member_id AND guild_id = NEW.guild_id;
+
+    DELETE FROM archived_scores
+    WHERE member_id = NEW.member_id AND guild_id = NEW.guild_id;
+END;
+
+-- Score gained per day by each member, as a ring of HISTORY_DAYS unsigned
+-- 32 bit counters, see db/history.py. last_day is the day number of the
+-- newest slot written.
+CREATE TABLE IF NOT EXISTS score_history (
+    member_id INTEGER NOT NULL,
+    guild_id INTEGER NOT NULL,
+    last_day INTEGER NOT NULL,
+    history BLOB NOT NULL,
+    PRIMARY KEY (member_id, guild_id)
+);
+
+-- The sequence number of the last journaled increment committed here, see
+-- db/journal.py. Replaying the journal skips everything up to it.
+CREATE TABLE IF NOT EXISTS journal_checkpoint (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    lsn INTEGER NOT NULL
+);
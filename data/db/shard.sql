@@ -0,0 +1,92 @@
+-- A score shard, holding the scores of the guilds routed to it. The totals
+-- across guilds stay in global_scores in the main database, which the
+-- sharded storage keeps up to date itself, so no triggers here touch them.
+CREATE TABLE IF NOT EXISTS scores (
+    member_id INTEGER NOT NULL,
+    guild_id INTEGER NOT NULL,
+    score INTEGER NOT NULL DEFAULT 0,
+    active INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (member_id, guild_id)
+);
+
+-- Rank order within each guild, as in the main database
+CREATE INDEX IF NOT EXISTS scores_rank
+ON scores (guild_id, active, score DESC, member_id);
+
+-- When each inactive member left, as in the main database
+CREATE TABLE IF NOT EXISTS departures (
+    guild_id INTEGER NOT NULL,
+    member_id INTEGER NOT NULL,
+    departed_at INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, member_id)
+);
+
+CREATE TRIGGER IF NOT EXISTS departures_insert
+AFTER INSERT ON scores
+WHEN NEW.active = 0
+BEGIN
+    INSERT OR IGNORE INTO departures (guild_id, member_id, departed_at)
+    VALUES (NEW.guild_id, NEW.member_id, CAST(strftime('%s', 'now') AS INTEGER));
+END;
+
+CREATE TRIGGER IF NOT EXISTS departures_leave
+AFTER UPDATE OF active ON scores
+WHEN OLD.active = 1 AND NEW.active = 0
+BEGIN
+    INSERT OR IGNORE INTO departures (guild_id, member_id, departed_at)
+    VALUES (NEW.guild_id, NEW.member_id, CAST(strftime('%s', 'now') AS INTEGER));
+END;
+
+CREATE TRIGGER IF NOT EXISTS departures_return
+AFTER UPDATE OF active ON scores
+WHEN OLD.active = 0 AND NEW.active = 1
+BEGIN
+    DELETE FROM departures WHERE guild_id = NEW.guild_id AND member_id = NEW.member_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS departures_delete
+AFTER DELETE ON scores
+BEGIN
+    DELETE FROM departures WHERE guild_id = OLD.guild_id AND member_id = OLD.member_id;
+END;
+
+CREATE TABLE IF NOT EXISTS archived_scores (
+    member_id INTEGER NOT NULL,
+    guild_id INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    archived_at INTEGER NOT NULL,
+    PRIMARY KEY (member_id, guild_id)
+);
+
+-- A member who comes back gets their archived score back, it never left
+-- the global total
+CREATE TRIGGER IF NOT EXISTS archived_scores_restore
+AFTER INSERT ON scores
+WHEN EXISTS (
+    SELECT 1 FROM archived_scores
+    WHERE member_id = NEW.member_id AND guild_id = NEW.guild_id
+)
+BEGIN
+    UPDATE scores SET score = score + (
+        SELECT score FROM archived_scores
+        WHERE member_id = NEW.member_id AND guild_id = NEW.guild_id
+    )
+    WHERE member_id = NEW.member_id AND guild_id = NEW.guild_id;
+
+    DELETE FROM archived_scores
+    WHERE member_id = NEW.member_id AND guild_id = NEW.guild_id;
+END;
+
+CREATE TABLE IF NOT EXISTS score_history (
+    member_id INTEGER NOT NULL,
+    guild_id INTEGER NOT NULL,
+    last_day INTEGER NOT NULL,
+    history BLOB NOT NULL,
+    PRIMARY KEY (member_id, guild_id)
+);
+
+-- The last journaled increment committed to this shard, as in the main database
+CREATE TABLE IF NOT EXISTS journal_checkpoint (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    lsn INTEGER NOT NULL
+);
@@ -1,14 +1,35 @@
 """The Discord Bot"""
 
+import json
+import asyncio
 import logging
 from datetime import datetime
+from hashlib import sha256
 from os import listdir
+from pathlib import Path
 
 import discord
 from discord.ext import commands, tasks
 
-from db import db
+from db import get_storage, backup
+from constants import (
+    BACKUP_INTERVAL_HOURS,
+    COMMAND_TREE_HASH_PATH,
+    DB_COMMIT_SECONDS,
+    JOURNAL_ENABLED,
+    JOURNAL_SYNC_SECONDS,
+    LOW_MEMORY_MEMBERS,
+    MINIMAL_INTENTS,
+    PREWARM_ENABLED,
+    WATCHDOG_ENABLED
+)
+from members import MemberCache
+from prewarm import Prewarmer
+from xp import XPRulesCache
+from .gateway import GatewayStats
 from .logs import setup_logs
+from .startup import StartupTimer
+from .watchdog import LoopWatchdog
 
 log = logging.getLogger(__name__)
 
@@ -17,20 +38,75 @@ class Bot(commands.Bot):
     """The bot itself"""
 
     def __init__(self):
+        options = {}
+
+        # Without the member cache the scores table is the source of truth
+        # for membership and members are fetched when a command needs them
+        if LOW_MEMORY_MEMBERS:
+            options["member_cache_flags"] = discord.MemberCacheFlags.none()
+            options["chunk_guilds_at_startup"] = False
+
+        # Only subscribe to what the bot uses, presences are by far the
+        # largest share of gateway traffic and are looked up on demand
+        if MINIMAL_INTENTS:
+            intents = discord.Intents(
+                guilds=True, members=True, guild_messages=True, message_content=True
+            )
+        else:
+            intents = discord.Intents.all()
+
+            # Raw payloads give the gateway stats the size of each event,
+            # for the baseline minimal mode's savings are measured against
+            options["enable_debug_events"] = True
+
         super().__init__(
             command_prefix="os ",
-            intents=discord.Intents.all()
+            intents=intents,
+            **options
         )
 
         self.start_time = datetime.utcnow()
+        self.member_cache = MemberCache(self)
+        self.gateway_stats = GatewayStats(MINIMAL_INTENTS)
+        self.xp_rules = XPRulesCache()
+        self.startup = StartupTimer()
+        self.watchdog = LoopWatchdog()
+        self.prewarmer = Prewarmer(self)
+        self.ready_once = False
         setup_logs()
 
-    @tasks.loop(minutes=10)
+    @tasks.loop(seconds=DB_COMMIT_SECONDS)
     async def _autosave_database(self) -> None:
-        """Autosave the database every 5 minutes"""
+        """Commit the database often, reads on other threads only see commits"""
+
+        log.debug("Autosaving database...")
+        get_storage().commit()
+
+    @tasks.loop(seconds=JOURNAL_SYNC_SECONDS)
+    async def _sync_journal(self) -> None:
+        """Write and fsync the increments journaled since the last sync, on a thread"""
+
+        journal = get_storage().journal
+        if journal is None or journal.idle:
+            return
+
+        await asyncio.to_thread(journal.sync)
+
+    @tasks.loop(hours=BACKUP_INTERVAL_HOURS)
+    async def _backup_database(self) -> None:
+        """Back up the database on a thread, the bot keeps writing meanwhile"""
+
+        # The loop runs as soon as it starts, keep the first backup from
+        # competing with startup
+        if self._backup_database.current_loop == 0:  # pylint: disable=E1101
+            return
+
+        get_storage().commit()
 
-        log.info("Autosaving database...")
-        db.commit()
+        try:
+            await asyncio.to_thread(backup.backup_all)
+        except (backup.BackupError, OSError):
+            log.exception("Scheduled backup failed")
 
     @property
     async def runtime(self) -> datetime:
@@ -42,32 +118,98 @@ class Bot(commands.Bot):
 
         return datetime.utcnow() - self.start_time
 
+    def command_tree_hash(self) -> str:
+        """Hash the payload that syncing the command tree would upload
+
+        Returns:
+            str: The hex digest of the command tree
+        """
+
+        payload = {
+            "application_id": self.application_id,
+            "commands": [command.to_dict() for command in self.tree.get_commands()]
+        }
+
+        return sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
     async def sync_app_commands(self) -> None:
-        """Sync application commands"""
+        """Sync application commands if they changed since the last sync"""
+
+        tree_hash = self.command_tree_hash()
+        hash_file = Path(COMMAND_TREE_HASH_PATH)
+
+        if hash_file.is_file() and hash_file.read_text(encoding="utf-8") == tree_hash:
+            log.info("Application commands unchanged, skipping sync")
+            return
 
         log.info("Syncing application commands...")
-        await self.wait_until_ready()
         await self.tree.sync()
+        hash_file.write_text(tree_hash, encoding="utf-8")
         log.info("Application commands synced")
 
+    async def setup_hook(self) -> None:
+        """Called once per process after logging in, before connecting"""
+
+        self.startup.lap("login")
+
+        with self.startup.phase("command sync"):
+            await self.sync_app_commands()
+
+        if JOURNAL_ENABLED:
+            with self.startup.phase("journal replay"):
+                get_storage().open_journal()
+
+            self._sync_journal.start()  # pylint: disable=E1101
+
+        self._autosave_database.start()  # pylint: disable=E1101
+        self._backup_database.start()  # pylint: disable=E1101
+
+        if WATCHDOG_ENABLED:
+            self.watchdog.start()
+
     async def on_ready(self) -> None:
-        """When the bot is ready"""
+        """When the bot is ready, this is called again on every reconnect"""
 
         log.info("Bot ready")
-        self._autosave_database.start()  # pylint: disable=E1101
-        await self.sync_app_commands()
+
+        if self.ready_once:
+            return
+
+        self.ready_once = True
+        self.startup.lap("gateway connect")
+
+        if PREWARM_ENABLED:
+            self.prewarmer.start()
+
+    async def on_socket_event_type(self, event_type: str) -> None:
+        """Count every event received from the gateway"""
+
+        self.gateway_stats.record(event_type)
+
+    async def on_socket_raw_receive(self, payload: str) -> None:
+        """Note the size of every payload, dispatched just before its event type"""
+
+        self.gateway_stats.record_size(len(payload))
 
     async def close(self) -> None:
         """Called when the bot is closing"""
 
         log.info("Closing bot...")
-        db.commit()  # commit changes before closing
+        get_storage().commit()  # commit changes before closing
+        self._sync_journal.cancel()  # pylint: disable=E1101
+        if (journal := get_storage().journal) is not None:
+            journal.close()  # empties it, everything in it was just committed
+
+        self.gateway_stats.save_baseline()
+        self.watchdog.stop()
+        await self.prewarmer.stop()
         await super().close()
 
     async def load_extensions(self) -> None:
         """Load all extensions"""
 
         # Iterate through all files in the ext folder and load them
-        for filename in listdir("src/ext"):
-            if filename.endswith(".py"):
-                await self.load_extension(f"ext.{filename[:-3]}")
+        with self.startup.phase("extensions"):
+            for filename in listdir("src/ext"):
+                if filename.endswith(".py"):
+                    await self.load_extension(f"ext.{filename[:-3]}")
@@ -0,0 +1,177 @@
+"""Statistics on the events received from the Discord gateway"""
+
+import json
+import logging
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from constants import GATEWAY_BASELINE_PATH, GATEWAY_BASELINE_SECONDS
+
+
+log = logging.getLogger(__name__)
+
+# Events that the minimal intents don't subscribe to
+MINIMAL_INTENTS_DROPPED = frozenset((
+    "PRESENCE_UPDATE",
+    "TYPING_START",
+    "VOICE_STATE_UPDATE",
+    "MESSAGE_REACTION_ADD",
+    "MESSAGE_REACTION_REMOVE",
+    "GUILD_EMOJIS_UPDATE",
+    "GUILD_STICKERS_UPDATE",
+    "INVITE_CREATE",
+    "INVITE_DELETE",
+    "GUILD_SCHEDULED_EVENT_UPDATE"
+))
+
+
+class GatewayStats:
+    """Counts gateway events and their size by type
+
+    With full intents the rates of the events minimal intents drop are
+    saved as a baseline, so that in minimal mode the summary can estimate
+    the traffic it's saving. Sizes are only known when the client
+    dispatches raw socket events, which the bot enables with full intents.
+    """
+
+    def __init__(self, minimal_intents: bool, baseline_path: str=GATEWAY_BASELINE_PATH):
+        self.minimal_intents = minimal_intents
+        self.baseline_path = Path(baseline_path)
+        self.events: Counter[str] = Counter()
+        self.sizes: Counter[str] = Counter()
+        self.since = datetime.utcnow()
+
+        # The size of the last payload, its event type is dispatched next
+        self.pending_size = 0
+
+    def record_size(self, size: int) -> None:
+        """Note the size of a payload, before its event type is recorded
+
+        Args:
+            size (int): The payload's decompressed length
+        """
+
+        self.pending_size = size
+
+    def record(self, event_type: str) -> None:
+        """Count an event
+
+        Args:
+            event_type (str): The gateway event name, eg. MESSAGE_CREATE
+        """
+
+        self.events[event_type] += 1
+        self.sizes[event_type] += self.pending_size
+        self.pending_size = 0
+
+    @property
+    def seconds(self) -> float:
+        """How long events have been counted for"""
+
+        return max((datetime.utcnow() - self.since).total_seconds(), 1)
+
+    @property
+    def total(self) -> int:
+        """The total number of events received"""
+
+        return sum(self.events.values())
+
+    @property
+    def droppable(self) -> int:
+        """The number of received events the minimal intents would drop"""
+
+        return sum(self.events[event] for event in MINIMAL_INTENTS_DROPPED)
+
+    def save_baseline(self) -> bool:
+        """Save the rates of the events minimal intents drop, with full intents only
+
+        Returns:
+            bool: Whether a baseline was saved, runs shorter than
+                GATEWAY_BASELINE_SECONDS aren't saved
+        """
+
+        seconds = self.seconds
+        if self.minimal_intents or seconds < GATEWAY_BASELINE_SECONDS:
+            return False
+
+        baseline = {
+            "measured": datetime.utcnow().isoformat(timespec="seconds"),
+            "seconds": seconds,
+            "events": {event: self.events[event] / seconds for event in MINIMAL_INTENTS_DROPPED},
+            "bytes": {event: self.sizes[event] / seconds for event in MINIMAL_INTENTS_DROPPED}
+        }
+
+        self.baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        self.baseline_path.write_text(json.dumps(baseline, indent=2), encoding="utf-8")
+        log.info("Saved the gateway baseline of %.0f seconds", seconds)
+        return True
+
+    def load_baseline(self) -> dict | None:
+        """Get the last saved baseline
+
+        Returns:
+            dict, None: The baseline, or None if there isn't a readable one
+        """
+
+        try:
+            return json.loads(self.baseline_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def savings(self) -> str:
+        """Estimate the traffic minimal intents are saving against the baseline
+
+        Returns:
+            str: The estimate
+        """
+
+        if (baseline := self.load_baseline()) is None:
+            return (
+                "Minimal intents enabled, run with full intents for "
+                f"{GATEWAY_BASELINE_SECONDS // 60} minutes to measure what they save"
+            )
+
+        events, sizes = baseline["events"], baseline["bytes"]
+        per_second, bytes_per_second = sum(events.values()), sum(sizes.values())
+        saved = self.seconds * bytes_per_second
+
+        return (
+            f"Minimal intents saving an estimated {per_second:.1f} events/s "
+            f"({bytes_per_second / 1024:.1f} kB/s, {saved / 1024 ** 2:.1f} MB so far), "
+            f"{events.get('PRESENCE_UPDATE', 0):.1f}/s of them presence updates, "
+            f"against {baseline['seconds'] / 60:.0f} minutes with full intents "
+            f"measured {baseline['measured']}"
+        )
+
+    def summary(self, top: int=10) -> str:
+        """Get a readable summary of the gateway traffic
+
+        Args:
+            top (int): How many of the most common events to list
+
+        Returns:
+            str: The summary
+        """
+
+        minutes = self.seconds / 60
+        total = self.total
+
+        lines = [f"{total} events in {minutes:.1f} minutes ({total / minutes:.1f}/min)"]
+        lines.extend(
+            f"{event}: {count} ({count / minutes:.1f}/min)"
+            for event, count in self.events.most_common(top)
+        )
+
+        if self.minimal_intents:
+            lines.append(self.savings())
+        elif total:
+            droppable_size = sum(self.sizes[event] for event in MINIMAL_INTENTS_DROPPED)
+            lines.append(
+                f"Minimal intents would drop {self.droppable} events "
+                f"({self.droppable / total:.1%} of gateway traffic, "
+                f"{droppable_size / 1024:.0f} kB, "
+                f"{self.events['PRESENCE_UPDATE']} of them presence updates)"
+            )
+
+        return "\n".join(lines)
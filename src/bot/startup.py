@@ -0,0 +1,59 @@
+"""Timing of the bot's startup phases"""
+
+import logging
+from contextlib import contextmanager
+from time import perf_counter
+
+log = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Records how long each phase of startup takes"""
+
+    def __init__(self):
+        self.phases: dict[str, float] = {}
+        self.last_lap = perf_counter()
+
+    def record(self, name: str, seconds: float) -> None:
+        """Record the duration of a phase
+
+        Args:
+            name (str): The name of the phase
+            seconds (float): How long the phase took
+        """
+
+        self.phases[name] = seconds
+        log.debug("Startup phase %s took %.3fs", name, seconds)
+
+    def lap(self, name: str) -> None:
+        """Record the time since the previous lap as a phase
+
+        Args:
+            name (str): The name of the phase
+        """
+
+        now = perf_counter()
+        self.record(name, now - self.last_lap)
+        self.last_lap = now
+
+    @contextmanager
+    def phase(self, name: str):
+        """Context manager that records the time spent inside it
+
+        Args:
+            name (str): The name of the phase
+        """
+
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, perf_counter() - start)
+            self.last_lap = perf_counter()
+
+    def report(self) -> None:
+        """Log the duration of every phase recorded so far"""
+
+        lines = [f"{name:<24}{seconds:>8.3f}s" for name, seconds in self.phases.items()]
+        lines.append(f"{'total':<24}{sum(self.phases.values()):>8.3f}s")
+        log.info("Startup timings:\n%s", "\n".join(lines))
@@ -0,0 +1,185 @@
+"""Watches the event loop for calls that block it
+
+A task on the loop sleeps for a short interval over and over and records
+how late it wakes up, which is the loop's lag. A thread checks that the
+task keeps waking up, and once the loop has been stuck for longer than a
+threshold it grabs the loop thread's stack while the blocking call is still
+running. Stalls are counted by the innermost line of the bot's own code in
+that stack, and the stacks are logged at most once per location per
+interval.
+"""
+
+import sys
+import asyncio
+import logging
+import threading
+import traceback
+from collections import Counter, deque
+from pathlib import Path
+from time import monotonic
+
+from constants import (
+    WATCHDOG_INTERVAL,
+    WATCHDOG_THRESHOLD,
+    WATCHDOG_LOG_INTERVAL,
+    WATCHDOG_LAG_SAMPLES
+)
+
+
+log = logging.getLogger(__name__)
+
+SOURCE_ROOT = Path(__file__).resolve().parents[1]
+
+
+class LoopWatchdog:
+    """Measures the loop's lag and captures what blocks it"""
+
+    def __init__(
+        self,
+        threshold: float=WATCHDOG_THRESHOLD,
+        interval: float=WATCHDOG_INTERVAL,
+        log_interval: float=WATCHDOG_LOG_INTERVAL
+    ):
+        self.threshold = threshold
+        self.interval = interval
+        self.log_interval = log_interval
+
+        self.lags: deque[float] = deque(maxlen=WATCHDOG_LAG_SAMPLES)
+        self.max_lag = 0.0
+        self.stalls: Counter[str] = Counter()
+        self.worst: dict[str, float] = {}
+        self.suppressed = 0
+
+        self.last_beat = monotonic()
+        self.stalled_at: str = None
+        self.logged_at: dict[str, float] = {}
+
+        self.loop_thread: int = None
+        self.heartbeat: asyncio.Task = None
+        self.watcher: threading.Thread = None
+        self.stopped = threading.Event()
+
+    def start(self) -> None:
+        """Start watching the running loop, call from the loop's thread"""
+
+        self.loop_thread = threading.get_ident()
+        self.last_beat = monotonic()
+        self.heartbeat = asyncio.create_task(self._beat())
+
+        self.watcher = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self.watcher.start()
+
+        log.info("Watching the event loop for stalls over %ss", self.threshold)
+
+    def stop(self) -> None:
+        """Stop watching the loop"""
+
+        if self.heartbeat is not None:
+            self.heartbeat.cancel()
+
+        if self.watcher is not None:
+            self.stopped.set()
+            self.watcher.join()
+
+    async def _beat(self) -> None:
+        """Sleep in short intervals and record how late each wake up is"""
+
+        while True:
+            before = monotonic()
+            await asyncio.sleep(self.interval)
+            self.last_beat = now = monotonic()
+
+            lag = max(now - before - self.interval, 0)
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+            # The stall the watcher caught is over, now its length is known
+            if (location := self.stalled_at) is not None:
+                self.stalled_at = None
+                self.worst[location] = max(self.worst.get(location, 0), lag)
+
+    def _watch(self) -> None:
+        """Check the heartbeat and capture the loop's stack once it stalls"""
+
+        while not self.stopped.wait(self.interval):
+            beat = self.last_beat
+            stalled_for = monotonic() - beat - self.interval
+
+            if stalled_for < self.threshold or self.stalled_at is not None:
+                continue
+
+            frame = sys._current_frames().get(self.loop_thread)  # pylint: disable=W0212
+            if frame is None:
+                continue
+
+            # The loop woke up while the frames were being taken
+            if self.last_beat != beat:
+                continue
+
+            stack = traceback.extract_stack(frame)
+            location = self.locate(stack)
+            self.stalled_at = location
+            self.stalls[location] += 1
+
+            now = monotonic()
+            if now - self.logged_at.get(location, -self.log_interval) < self.log_interval:
+                self.suppressed += 1
+                continue
+
+            self.logged_at[location] = now
+            log.warning(
+                "Event loop blocked for %.2fs at %s (%s stalls there so far)\n%s",
+                stalled_for, location, self.stalls[location], "".join(stack.format())
+            )
+
+    @staticmethod
+    def locate(stack: traceback.StackSummary) -> str:
+        """Get where a stack is, preferring the innermost line of the bot's code
+
+        Args:
+            stack (traceback.StackSummary): The stack, outermost first
+
+        Returns:
+            str: The file, line and function
+        """
+
+        for frame in reversed(stack):
+            path = Path(frame.filename)
+            if path.is_relative_to(SOURCE_ROOT) and path.name != "watchdog.py":
+                return f"{path.relative_to(SOURCE_ROOT)}:{frame.lineno} in {frame.name}"
+
+        frame = stack[-1]
+        return f"{Path(frame.filename).name}:{frame.lineno} in {frame.name}"
+
+    def summary(self, top: int=10) -> str:
+        """Get a readable summary of the loop's lag and stalls
+
+        Args:
+            top (int): How many of the most common stall locations to list
+
+        Returns:
+            str: The summary
+        """
+
+        lags = sorted(self.lags)
+        if lags:
+            median = lags[len(lags) // 2] * 1000
+            p99 = lags[min(int(len(lags) * 0.99), len(lags) - 1)] * 1000
+            lines = [
+                f"Loop lag over the last {len(lags)} checks: {median:.1f}ms median, "
+                f"{p99:.1f}ms p99, {self.max_lag * 1000:.0f}ms worst since startup"
+            ]
+        else:
+            lines = ["No loop lag measured yet"]
+
+        total = sum(self.stalls.values())
+        lines.append(
+            f"{total} stalls over {self.threshold}s, "
+            f"{self.suppressed} of them not logged again"
+        )
+        lines.extend(
+            f"{location}: {count} stalls, worst {self.worst.get(location, 0):.2f}s"
+            for location, count in self.stalls.most_common(top)
+        )
+
+        return "\n".join(lines)
@@ -2,21 +2,108 @@
 
 DB_PATH = "data/db/db.sqlite"
 BUILD_PATH = "data/db/build.sql"
+STORAGE_BACKEND = "sqlite"  # where scores are kept, "sqlite", "sharded" or "memory"
+SHARD_PATH = "data/db/shards"
+SHARD_BUILD_PATH = "data/db/shard.sql"
+DB_SHARDS = 4  # shards for a new sharded database, manage.py reshard changes an existing one
+COMMAND_TREE_HASH_PATH = "data/command_tree.hash"
+DB_STATEMENT_CACHE = 512  # prepared statements kept by each database connection
+DB_COMMIT_SECONDS = 5  # how often writes are committed, and so how stale other threads' reads can be
+JOURNAL_ENABLED = True  # journal score increments so a crash between commits loses almost none
+JOURNAL_PATH = "data/db/scores.journal"
+JOURNAL_SYNC_SECONDS = 0.2  # how often journaled increments are fsynced, the most a crash loses
+BACKUP_PATH = "data/backups"
+BACKUP_INTERVAL_HOURS = 6
+BACKUP_KEEP = 8  # newest backups kept, older ones are deleted
+BACKUP_PAGES_PER_STEP = 256  # pages copied per backup step
+BACKUP_STEP_SLEEP = 0.005  # seconds between backup steps
+BACKUP_COMPRESS = True  # gzip backups once they are verified
 
 LOGS = 'logs/'
 LOG_FILENAME_FORMAT_PREFIX = '%Y-%m-%d %H-%M-%S'
 MAX_LOGFILE_AGE_DAYS = 7
 
-from easy_pil import Font
+# Render scheduling
+RENDER_WORKERS = 2
+RENDER_QUEUE_SIZE = 16
+RENDER_DEADLINE_INTERACTION = 60  # seconds a deferred interaction render may wait
+RENDER_DEADLINE_COMMAND = 30  # seconds a prefix command render may wait
+
+# Prewarming avatars and scoreboard columns
+PREWARM_ENABLED = True
+PREWARM_INTERVAL = 60  # seconds between looks at which scoreboards and rank cards are likely
+PREWARM_ACTIVE_SECONDS = 900  # guilds scored in and rank cards shown within this are prewarmed
+PREWARM_RANK_MEMBERS = 500  # recent rank card members remembered
+PREWARM_BANDWIDTH = 512 * 1024  # bytes per second of avatar downloads
+PREWARM_CPU_SHARE = 0.25  # share of one core spent drawing columns
+AVATAR_CACHE_BYTES = 32 * 1024 * 1024  # downloaded avatars kept, encoded
+TILE_CACHE_BYTES = 32 * 1024 * 1024  # drawn grid columns kept, as PNGs
+
+# Member caching
+LOW_MEMORY_MEMBERS = False  # fetch members on demand instead of caching them all
+MEMBER_CACHE_SIZE = 1024  # members kept by the on demand cache
+USER_FETCH_CONCURRENCY = 5  # users requested at once for the global scoreboard
+MINIMAL_INTENTS = False  # drop the presences intent and other unused intents, cards lose their status
+STATUS_CACHE_SECONDS = 60  # how long a status requested for a rank card is reused
+GATEWAY_BASELINE_PATH = "data/gateway_baseline.json"  # traffic measured with full intents, what minimal mode saves is compared to it
+GATEWAY_BASELINE_SECONDS = 600  # how long the bot has to run with full intents to save a baseline
+
+# Score export and import
+TRANSFER_FORMATS = ("csv", "jsonl")
+TRANSFER_BATCH_SIZE = 5000  # rows per fetch when exporting, rows per transaction when importing
+TRANSFER_LOOP_BATCH_SIZE = 500  # rows per transaction when the bot imports, written on the event loop
+
+# Archiving members who left
+ARCHIVE_AFTER_DAYS = 90  # inactive members are archived after this long
+ARCHIVE_INTERVAL_HOURS = 1
+ARCHIVE_BATCH_SIZE = 500  # members archived per transaction
+ARCHIVE_BATCH_PAUSE = 0.1  # seconds between batches
+
+# Score history
+HISTORY_DAYS = 90  # days of score gained kept per member, 4 bytes each
+SPARKLINE_DAYS = 30  # days shown on rank cards
+
+# Scoring
+DEFAULT_BASE_XP = 30  # XP per message in guilds that haven't configured it
+SCORE_COOLDOWN_SECONDS = 60  # a member is scored at most once per window per guild, 0 to disable
+COOLDOWN_RESOLUTION_SECONDS = 1  # granularity of the cooldown timing wheel
+
+# Levels
+LEVEL_CURVE_FACTOR = "0.07"  # the default curve, level = factor * sqrt(score) + 1
+LEVEL_CURVE_MAX_LEVEL = 10000  # levels formula curves precompute, higher scores stay at the last
+
+# Level up rewards
+REWARD_QUEUE_SIZE = 1000  # level ups waiting for roles or announcements
+REWARD_BATCH_SECONDS = 2  # how long to gather level ups before applying them
+REWARD_ACTION_INTERVAL = 0.5  # seconds between role edits and announcements
+
+# Profiling
+PROFILE_DEFAULT_SECONDS = 30  # how long os profile runs unless told otherwise
+PROFILE_MAX_SECONDS = 300
+PROFILE_SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+PROFILE_TRACEMALLOC_FRAMES = 10  # frames kept per allocation, more is slower
+PROFILE_TOP_ALLOCATIONS = 50  # allocation diffs written per profile
+
+# Event loop watchdog
+WATCHDOG_ENABLED = True
+WATCHDOG_INTERVAL = 0.1  # seconds between heartbeats on the loop and checks of them
+WATCHDOG_THRESHOLD = 0.5  # seconds the loop can be stuck before its stack is captured
+WATCHDOG_LOG_INTERVAL = 300  # seconds before the same stall location is logged again
+WATCHDOG_LAG_SAMPLES = 3000  # recent lag measurements kept for the summary
 
 BLACK = "#0F0F0F"
 WHITE = "#F9F9F9"
 DARK_GREY = "#2F2F2F"
 LIGHT_GREY = "#9F9F9F"
-POPPINS_LARGE = Font.poppins(size=100)
-POPPINS = Font.poppins(size=70)
-POPPINS_SMALL = Font.poppins(size=50)
-POPPINS_XSMALL = Font.poppins(size=35)
+
+# Fonts are loaded on first access (see __getattr__ at the bottom) so that
+# importing the constants doesn't import easy_pil and PIL
+FONT_SIZES = {
+    "POPPINS_LARGE": 100,
+    "POPPINS": 70,
+    "POPPINS_SMALL": 50,
+    "POPPINS_XSMALL": 35
+}
 
 # Scoreboard styles
 COL_WIDTH = 450
@@ -26,8 +113,43 @@ MARGIN = 60
 SHADOW_OFFSET_X = -10
 SHADOW_OFFSET_Y = 15
 
+SCOREBOARD_MEMORY_LIMIT = 48 * 1024 * 1024  # bytes of pixels a grid render may hold
+GRID_SCOREBOARD_SIZE = 30  # members shown by each style
+LIST_SCOREBOARD_SIZE = 50
+CONTEXT_NEIGHBOURS = 5  # members shown above and below someone by /rank context
+LIST_WIDTH = 1000
+LIST_ROW_HEIGHT = 80
+LIST_HEAD_HEIGHT = 120
+LIST_MARGIN = 30
+LIST_AVATAR_SIZE = 60
+
 from enum import Enum, auto
 
 class ScoreboardStyles(Enum):
     Grid = auto()
     List = auto()
+
+class Scopes(Enum):
+    Server = auto()
+    Global = auto()
+
+class RankStyles(Enum):
+    Card = auto()
+    Context = auto()
+
+class LevelCurves(Enum):
+    Quadratic = auto()
+    Linear = auto()
+    Table = auto()
+
+
+def __getattr__(name):
+    """Load a font the first time it is imported"""
+
+    if name not in FONT_SIZES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    from easy_pil import Font  # pylint: disable=C0415
+
+    font = globals()[name] = Font.poppins(size=FONT_SIZES[name])
+    return font
@@ -0,0 +1,98 @@
+"""In memory scoring cooldowns"""
+
+import logging
+from math import ceil
+from time import monotonic
+
+from constants import SCORE_COOLDOWN_SECONDS, COOLDOWN_RESOLUTION_SECONDS
+
+
+log = logging.getLogger(__name__)
+
+
+class CooldownWheel:
+    """Tracks which members are on cooldown with a hashed timing wheel
+
+    Time is split into ticks, and each slot of the wheel holds the members
+    whose cooldown ends on that tick. Moving the wheel forward empties the
+    slots it passes, so expired members age out without storing a
+    timestamp per member or scanning everyone that is cooling down.
+    """
+
+    def __init__(
+        self,
+        cooldown: float=SCORE_COOLDOWN_SECONDS,
+        resolution: float=COOLDOWN_RESOLUTION_SECONDS
+    ):
+        self.resolution = resolution
+        self.span = ceil(cooldown / resolution)
+        self.slots: list[set[int]] = [set() for _ in range(self.span + 1)]
+        self.cooling: set[int] = set()
+        self.tick = int(monotonic() // resolution)
+
+        # How many messages were scored and how many database writes were avoided
+        self.allowed = 0
+        self.suppressed = 0
+
+    def __len__(self) -> int:
+        return len(self.cooling)
+
+    @staticmethod
+    def key(member_id: int, guild_id: int) -> int:
+        """Pack a member and guild into a single int, smaller than a tuple
+
+        Args:
+            member_id (int): The member's ID
+            guild_id (int): The guild's ID
+
+        Returns:
+            int: The key
+        """
+
+        return (guild_id << 64) | member_id
+
+    def advance(self, now: float=None) -> None:
+        """Move the wheel forward to the current tick, expiring cooldowns
+
+        Args:
+            now (float): The current monotonic time, defaults to now
+        """
+
+        tick = int((monotonic() if now is None else now) // self.resolution)
+
+        # Only a full turn of the wheel needs clearing, however long it's been
+        for passed in range(self.tick + 1, min(tick, self.tick + len(self.slots)) + 1):
+            slot = self.slots[passed % len(self.slots)]
+            self.cooling -= slot
+            slot.clear()
+
+        self.tick = max(tick, self.tick)
+
+    def hit(self, member_id: int, guild_id: int, now: float=None) -> bool:
+        """Check whether a member can be scored, starting their cooldown if so
+
+        Args:
+            member_id (int): The member's ID
+            guild_id (int): The guild's ID
+            now (float): The current monotonic time, defaults to now
+
+        Returns:
+            bool: True if the member isn't on cooldown
+        """
+
+        # A cooldown of 0 disables the wheel
+        if not self.span:
+            self.allowed += 1
+            return True
+
+        self.advance(now)
+        key = self.key(member_id, guild_id)
+
+        if key in self.cooling:
+            self.suppressed += 1
+            return False
+
+        self.cooling.add(key)
+        self.slots[(self.tick + self.span) % len(self.slots)].add(key)
+        self.allowed += 1
+        return True
@@ -1,6 +1,7 @@
 """The database initializer"""
 
 from . import db
+from .storage import Storage, get_storage, set_storage
 
 # Build the database using the build script at data/db/build.sql
 db.build()
@@ -0,0 +1,282 @@
+"""Online backups of the database with SQLite's backup API
+
+A backup copies a few pages at a time from its own read only connection,
+inside a read transaction so every step sees the same snapshot. The
+database is in WAL mode, so the writer carries on while a backup runs and
+is never locked by it. Each backup is checked before it's kept, then
+optionally compressed, and old backups are rotated out.
+
+When scores are sharded each shard is backed up to its own file, named
+after the shard, alongside the main database's.
+"""
+
+import re
+import time
+import gzip
+import shutil
+import logging
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from itertools import count
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+from constants import (
+    BACKUP_PATH,
+    BACKUP_KEEP,
+    BACKUP_PAGES_PER_STEP,
+    BACKUP_STEP_SLEEP,
+    BACKUP_COMPRESS
+)
+from . import db
+from .storage import ShardedSQLiteStorage, get_storage
+
+
+log = logging.getLogger(__name__)
+
+# Tables whose row counts are compared between the database and a backup
+CHECKED_TABLES = ("scores", "global_scores")
+FILENAME_FORMAT = "%Y-%m-%d_%H-%M-%S"
+MAIN_PREFIX = "db"
+PREFIX_PATTERN = re.compile(r"^(db|shard-\d+)-\d{4}-")
+
+
+class BackupError(Exception):
+    """A backup or restore failed verification"""
+
+
+def count_rows(conn: sqlite3.Connection) -> dict[str, int]:
+    """Count the rows of the checked tables the database has
+
+    Args:
+        conn (sqlite3.Connection): The database
+
+    Returns:
+        dict[str, int]: The row count of each table
+    """
+
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+    return {
+        table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in CHECKED_TABLES if table in tables
+    }
+
+
+def databases() -> dict[str, db.Database]:
+    """Get every database to back up, by the prefix of their backups' names
+
+    Returns:
+        dict[str, db.Database]: The main database, then any score shards
+    """
+
+    found = {MAIN_PREFIX: db.main}
+
+    if isinstance(storage := get_storage(), ShardedSQLiteStorage):
+        found.update(
+            (f"shard-{index}", shard) for index, shard in enumerate(storage.router.shards)
+        )
+
+    return found
+
+
+def verify(path: Path, expected: dict[str, int]=None) -> None:
+    """Check a backup opens, passes SQLite's checks and has the expected rows
+
+    Args:
+        path (Path): The uncompressed backup
+        expected (dict[str, int], None): Row counts the tables should have
+
+    Raises:
+        BackupError: The backup is damaged or doesn't match
+    """
+
+    with closing(sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)) as conn:
+        try:
+            result = conn.execute("PRAGMA quick_check").fetchone()[0]
+            counts = count_rows(conn)
+        except sqlite3.DatabaseError as error:
+            raise BackupError(f"{path} isn't a usable database: {error}") from error
+
+    if result != "ok":
+        raise BackupError(f"{path} failed the integrity check: {result}")
+
+    if expected is not None and counts != expected:
+        raise BackupError(f"{path} has rows {counts}, expected {expected}")
+
+
+def pace(_status: int, remaining: int, _total: int) -> None:
+    """Rest between backup steps, so a backup doesn't hog the disk"""
+
+    if remaining:
+        time.sleep(BACKUP_STEP_SLEEP)
+
+
+def create_backup(
+    directory: str=BACKUP_PATH,
+    compress: bool=BACKUP_COMPRESS,
+    database: db.Database=None,
+    prefix: str=MAIN_PREFIX
+) -> Path:
+    """Back up a database while the bot keeps running, run it in a thread
+
+    Args:
+        directory (str): Where to keep backups
+        compress (bool): Whether to gzip the backup
+        database (db.Database, None): The database, defaults to the main one
+        prefix (str): The start of the backup's name, which database it is
+
+    Raises:
+        BackupError: The backup didn't verify, nothing is kept
+
+    Returns:
+        Path: The backup file
+    """
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    database = database or db.main
+
+    # Find a name that isn't taken by a backup made in the same second
+    timestamp = f"{prefix}-{datetime.now().strftime(FILENAME_FORMAT)}"
+    for i in count():
+        path = directory / (f"{timestamp}.sqlite" if i == 0 else f"{timestamp}_{i}.sqlite")
+        if not any(directory.glob(path.name + "*")):
+            break
+
+    partial = path.with_name(path.name + ".partial")
+
+    log.info("Backing up database %s to %s", database.path, path)
+
+    try:
+        with closing(database.open_reader()) as source, closing(sqlite3.connect(partial)) as target:
+            # Hold one read transaction so every step copies the same
+            # snapshot, instead of restarting whenever the writer commits
+            source.execute("BEGIN")
+            expected = count_rows(source)
+            source.backup(target, pages=BACKUP_PAGES_PER_STEP, progress=pace)
+            source.rollback()
+
+            # The copy is in WAL mode like the database, switch it back so
+            # the backup is a single file
+            target.execute("PRAGMA journal_mode = DELETE")
+
+        verify(partial, expected)
+
+        if compress:
+            path = path.with_name(path.name + ".gz")
+            with partial.open("rb") as file, gzip.open(path, "wb") as archive:
+                shutil.copyfileobj(file, archive)
+            partial.unlink()
+        else:
+            partial.rename(path)
+    finally:
+        partial.unlink(missing_ok=True)
+
+    log.info("Backup of %s verified", expected)
+    rotate(directory, prefix=prefix)
+    return path
+
+
+def backup_all(directory: str=BACKUP_PATH, compress: bool=BACKUP_COMPRESS) -> list[Path]:
+    """Back up the main database and every score shard, run it in a thread
+
+    Args:
+        directory (str): Where to keep backups
+        compress (bool): Whether to gzip the backups
+
+    Raises:
+        BackupError: A backup didn't verify, the ones before it are kept
+
+    Returns:
+        list[Path]: The backup files
+    """
+
+    return [
+        create_backup(directory, compress, database, prefix)
+        for prefix, database in databases().items()
+    ]
+
+
+def list_backups(directory: str=BACKUP_PATH, prefix: str=MAIN_PREFIX) -> list[Path]:
+    """Get the backups of one database in a directory, oldest first
+
+    Args:
+        directory (str): Where backups are kept
+        prefix (str): The start of the backups' names
+
+    Returns:
+        list[Path]: The backup files
+    """
+
+    backups = [
+        path for path in Path(directory).glob(f"{prefix}-*.sqlite*")
+        if path.name.endswith((".sqlite", ".sqlite.gz"))
+        and (match := PREFIX_PATTERN.match(path.name)) and match.group(1) == prefix
+    ]
+    return sorted(backups, key=lambda path: path.name)
+
+
+def rotate(directory: str=BACKUP_PATH, keep: int=BACKUP_KEEP, prefix: str=MAIN_PREFIX) -> None:
+    """Delete all but the newest backups of one database
+
+    Args:
+        directory (str): Where backups are kept
+        keep (int): How many backups to keep
+        prefix (str): The start of the backups' names
+    """
+
+    for path in list_backups(directory, prefix)[:-keep or None]:
+        log.info("Removing old backup %s", path.name)
+        path.unlink()
+
+
+def restore(path: str) -> None:
+    """Replace a database with a backup, only while the bot isn't running
+
+    The database is the one the backup's name says it was made from. The
+    backup is verified first, and the database checked again after.
+
+    Args:
+        path (str): The backup, compressed or not
+
+    Raises:
+        BackupError: The backup or the restored database didn't verify, or
+            it's of a shard that doesn't exist
+    """
+
+    path = Path(path)
+    match = PREFIX_PATTERN.match(path.name)
+    prefix = match.group(1) if match else MAIN_PREFIX
+
+    if (database := databases().get(prefix)) is None:
+        raise BackupError(f"{path} is a backup of {prefix}, which isn't open")
+
+    log.info("Restoring database %s from %s", database.path, path)
+
+    with NamedTemporaryFile(suffix=".sqlite", delete=False) as file:
+        uncompressed = Path(file.name)
+
+        if path.suffix == ".gz":
+            with gzip.open(path, "rb") as archive:
+                shutil.copyfileobj(archive, file)
+        else:
+            with path.open("rb") as backup:
+                shutil.copyfileobj(backup, file)
+
+    try:
+        verify(uncompressed)
+
+        with closing(sqlite3.connect(uncompressed)) as source:
+            expected = count_rows(source)
+            database.commit()
+            with database.writer_lock:
+                source.backup(database.writer)
+    finally:
+        uncompressed.unlink()
+
+    if (counts := count_rows(database.writer)) != expected:
+        raise BackupError(f"Restored database has rows {counts}, expected {expected}")
+
+    log.info("Restored %s", counts)
@@ -1,101 +1,227 @@
-"""Functions for interacting with the database."""
+"""Functions for interacting with the database.
+
+Writes go through a single writer connection, used by one thread at a time.
+Reads made on the thread that opened the database use the writer too, so
+they see changes that haven't been committed yet. Reads made on any other
+thread, like the render threads, use a read only connection of their own
+that is opened on first use. The database is in WAL mode, so those reads
+see the last commit and never wait behind the writer.
+
+Each SQLite file is a Database. The module level functions use the main
+database, score shards are Databases of their own (see shards.py).
+"""
 
 import logging
+import threading
+from contextlib import nullcontext
 from os.path import isfile
-from sqlite3 import connect
+from pathlib import Path
+from sqlite3 import connect, Connection
 
-from constants import DB_PATH, BUILD_PATH
+from constants import DB_PATH, BUILD_PATH, DB_STATEMENT_CACHE
 
 
 log = logging.getLogger(__name__)
 
-# Connect to the database
-conn = connect(DB_PATH, check_same_thread=False)
-cur = conn.cursor()
-cur.execute("PRAGMA foreign_keys = ON;")  # enable foreign keys
 
-log.info("Database connection established")
+class Database:
+    """A SQLite file with one writer and a read only connection per other thread"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+        # Connect to the database
+        self.writer = connect(path, check_same_thread=False, cached_statements=DB_STATEMENT_CACHE)
+        self.writer.execute("PRAGMA journal_mode = WAL;")  # let readers run alongside the writer
+        self.writer.execute("PRAGMA synchronous = NORMAL;")  # WAL stays consistent without a sync per commit
+        self.writer.execute("PRAGMA foreign_keys = ON;")  # enable foreign keys
+        self.writer_lock = threading.RLock()
+        self.writer_thread = threading.get_ident()
+
+        self.local = threading.local()
+        self.readers: list[Connection] = []
+        self.readers_lock = threading.Lock()
+
+        log.info("Database connection to %s established", path)
+
+    def open_reader(self) -> Connection:
+        """Open a new read only connection to the database
+
+        Returns:
+            Connection: The connection, the caller closes it
+        """
+
+        return connect(
+            f"{Path(self.path).resolve().as_uri()}?mode=ro", uri=True,
+            check_same_thread=False,  # so close() can close thread readers at shutdown
+            cached_statements=DB_STATEMENT_CACHE
+        )
+
+    def reader(self) -> Connection:
+        """Get the connection reads on the current thread should use
+
+        Returns:
+            Connection: The writer on the thread that opened the database,
+                otherwise the thread's own read only connection
+        """
+
+        if threading.get_ident() == self.writer_thread:
+            return self.writer
+
+        if (conn := getattr(self.local, "conn", None)) is None:
+            log.debug(
+                "Opening read only connection to %s for thread %s",
+                self.path, threading.current_thread().name
+            )
+            conn = self.local.conn = self.open_reader()
+            with self.readers_lock:
+                self.readers.append(conn)
+
+        return conn
+
+    def read(self, cmd, vals, fetch):
+        """Run a read on the current thread's connection and fetch the result"""
+
+        conn = self.reader()
+        if conn is not self.writer:
+            return fetch(conn.execute(cmd, vals))
+
+        with self.writer_lock:
+            return fetch(self.writer.execute(cmd, vals))
+
+    def build(self, path=BUILD_PATH):
+        """Build the database from a build script"""
+
+        log.debug("Building database %s", self.path)
+
+        if isfile(path):
+            self.scriptexec(path)
+            self.commit()
+            return
+
+        raise ValueError('Build script not found')
+
+    def commit(self):
+        """Commit changes to the database"""
+
+        log.debug("Committing changes")
+        with self.writer_lock:
+            self.writer.commit()
+
+    def close(self):
+        """Close the writer and every read only connection"""
+
+        log.debug("Closing database connection to %s", self.path)
+        with self.readers_lock:
+            for conn in self.readers:
+                conn.close()
+
+            self.readers.clear()
+
+        with self.writer_lock:
+            self.writer.close()
+
+    def field(self, cmd, *vals):
+        """Return a single field"""
+
+        log.debug("Executing command for field: %s, vals:%s", cmd, vals)
+        fetch = self.read(cmd, tuple(vals), lambda cur: cur.fetchone())
+
+        # If row exists, return the first row
+        if fetch is not None:
+            return fetch[0]
 
-def with_commit(func):
-    """Wrapper to commit changes to the database"""
+    def record(self, cmd, *vals):
+        """Return a single record"""
 
-    def inner(*args, **kwargs):
-        func(*args, **kwargs)
-        commit()
+        log.debug("Executing command for record: %s, vals: %s", cmd, vals)
+        return self.read(cmd, tuple(vals), lambda cur: cur.fetchone())
 
-    return inner
+    def records(self, cmd, *vals):
+        """Return all records"""
 
-@with_commit
-def build():
-    """Build the database from the build script"""
+        log.debug("Executing command for records: %s, vals: %s", cmd, vals)
+        return self.read(cmd, tuple(vals), lambda cur: cur.fetchall())
 
-    log.debug("Building database")
+    def column(self, cmd, *vals):
+        """Return a single column"""
 
-    if isfile(BUILD_PATH):
-        scriptexec(BUILD_PATH)
-        return
+        log.debug("Executing command for column: %s, vals: %s", cmd, vals)
+        return self.read(cmd, tuple(vals), lambda cur: [item[0] for item in cur.fetchall()])
 
-    raise ValueError('Build script not found')
+    def execute(self, cmd, *vals):
+        """Execute a command on the writer"""
 
-def commit():
-    """Commit changes to the database"""
+        log.debug("Executing command: %s, vals: %s", cmd, vals)
+        with self.writer_lock:
+            return self.writer.execute(cmd, tuple(vals))
 
-    log.debug("Committing changes")
-    conn.commit()
+    def write(self, cmd, *vals):
+        """Execute a command on the writer and return a single field of its result
 
-def close():
-    """Close the database connection"""
+        For statements with a RETURNING clause, which a read only connection
+        can't run.
+        """
 
-    log.debug("Closing database connection")
-    conn.close()
+        log.debug("Executing command for write: %s, vals: %s", cmd, vals)
+        with self.writer_lock:
+            fetch = self.writer.execute(cmd, tuple(vals)).fetchone()
 
-def field(cmd, *vals):
-    """Return a single field"""
+        if fetch is not None:
+            return fetch[0]
 
-    log.debug("Executing command for field: %s, vals:%s", cmd, vals)
-    cur.execute(cmd, tuple(vals))
+    def multiexec(self, cmd, valset):
+        """Execute multiple commands"""
 
-    # If row exists, return the first row
-    if (fetch := cur.fetchone()) is not None:
-        return fetch[0]
+        log.debug("Executing multiple commands: %s", cmd)
+        with self.writer_lock:
+            self.writer.executemany(cmd, valset)
 
-def record(cmd, *vals):
-    """Return a single record"""
+    def stream(self, cmd, *vals, size=1000):
+        """Yield records one at a time, fetching them in batches
 
-    log.debug("Executing command for record: %s, vals: %s", cmd, vals)
-    cur.execute(cmd, tuple(vals))
-    return cur.fetchone()
+        Uses its own cursor so the whole result never has to be in memory
+        and other queries can run while it is being consumed.
+        """
 
-def records(cmd, *vals):
-    """Return all records"""
+        log.debug("Executing command for stream: %s, vals: %s", cmd, vals)
+        conn = self.reader()
+        lock = self.writer_lock if conn is self.writer else nullcontext()
 
-    log.debug("Executing command for records: %s, vals: %s", cmd, vals)
-    cur.execute(cmd, tuple(vals))
-    return cur.fetchall()
+        with lock:
+            cursor = conn.execute(cmd, tuple(vals))
 
-def column(cmd, *vals):
-    """Return a single column"""
+        try:
+            while True:
+                with lock:
+                    rows = cursor.fetchmany(size)
 
-    log.debug("Executing command for column: %s, vals: %s", cmd, vals)
-    cur.execute(cmd, tuple(vals))
-    return [item[0] for item in cur.fetchall()]
+                if not rows:
+                    break
 
-def execute(cmd, *vals):
-    """Execute a command"""
+                yield from rows
+        finally:
+            cursor.close()
 
-    log.debug("Executing command: %s, vals: %s", cmd, vals)
-    cur.execute(cmd, tuple(vals))
-    return cur
+    def scriptexec(self, path):
+        """Execute a script"""
 
-def multiexec(cmd, valset):
-    """Execute multiple commands"""
+        log.debug("Executing script: %s", path)
+        with open(path, 'r', encoding='utf-8') as script, self.writer_lock:
+            self.writer.executescript(script.read())
 
-    log.debug("Executing multiple commands: %s, valset: %s", cmd, valset)
-    cur.executemany(cmd, valset)
 
-def scriptexec(path):
-    """Execute a script"""
+main = Database(DB_PATH)
 
-    log.debug("Executing script: %s", path)
-    with open(path, 'r', encoding='utf-8') as script:
-        cur.executescript(script.read())
+build = main.build
+commit = main.commit
+close = main.close
+field = main.field
+record = main.record
+records = main.records
+column = main.column
+execute = main.execute
+write = main.write
+multiexec = main.multiexec
+stream = main.stream
+scriptexec = main.scriptexec
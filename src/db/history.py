@@ -0,0 +1,131 @@
+"""Daily score history kept as a ring of counters in a BLOB
+
+Each member has one row per guild holding the score they gained on each of
+the last HISTORY_DAYS days, packed as little endian unsigned 32 bit
+integers. The slot for a day is its number since the epoch modulo the ring
+size, and the row remembers the last day written so slots for days with no
+activity can be cleared when the ring moves on.
+"""
+
+import sys
+import time
+from array import array
+
+from constants import HISTORY_DAYS
+
+
+SLOT_MAX = 0xFFFFFFFF
+
+
+def today() -> int:
+    """Get the number of the current UTC day since the epoch
+
+    Returns:
+        int: The day
+    """
+
+    return int(time.time() // 86400)
+
+
+def unpack(blob: bytes | None) -> array:
+    """Read a history ring, or make an empty one
+
+    Args:
+        blob (bytes, None): The stored ring
+
+    Returns:
+        array: The ring's counters
+    """
+
+    ring = array("I")
+    if blob is None or len(blob) != HISTORY_DAYS * ring.itemsize:
+        return array("I", bytes(HISTORY_DAYS * ring.itemsize))
+
+    ring.frombytes(blob)
+    if sys.byteorder == "big":
+        ring.byteswap()
+
+    return ring
+
+
+def pack(ring: array) -> bytes:
+    """Get the bytes to store a history ring as
+
+    Args:
+        ring (array): The ring's counters
+
+    Returns:
+        bytes: The stored ring
+    """
+
+    if sys.byteorder == "big":
+        ring = array("I", ring)
+        ring.byteswap()
+
+    return ring.tobytes()
+
+
+def advance(ring: array, last_day: int | None, day: int) -> int:
+    """Clear the slots of the days between the last one written and a new one
+
+    Args:
+        ring (array): The ring's counters, changed in place
+        last_day (int, None): The last day written, None for a new ring
+        day (int): The day about to be written
+
+    Returns:
+        int: The last day the ring now covers
+    """
+
+    if last_day is None or day <= last_day:
+        return max(day, last_day or day)
+
+    for skipped in range(last_day + 1, min(day, last_day + HISTORY_DAYS) + 1):
+        ring[skipped % HISTORY_DAYS] = 0
+
+    return day
+
+
+def add(ring: array, last_day: int | None, day: int, amount: int) -> int:
+    """Add score gained on a day to a ring
+
+    Days older than the ring are dropped.
+
+    Args:
+        ring (array): The ring's counters, changed in place
+        last_day (int, None): The last day written, None for a new ring
+        day (int): The day the score was gained
+        amount (int): The score gained
+
+    Returns:
+        int: The last day the ring now covers
+    """
+
+    last_day = advance(ring, last_day, day)
+
+    if day > last_day - HISTORY_DAYS:
+        slot = day % HISTORY_DAYS
+        ring[slot] = min(ring[slot] + max(amount, 0), SLOT_MAX)
+
+    return last_day
+
+
+def recent(ring: array, last_day: int, days: int, day: int=None) -> list[int]:
+    """Get the score gained on each of the last days, oldest first
+
+    Args:
+        ring (array): The ring's counters
+        last_day (int): The last day written to the ring
+        days (int): How many days to get, at most the ring's size
+        day (int, None): The last day to get, defaults to today
+
+    Returns:
+        list[int]: The score gained each day, 0 for days the ring doesn't cover
+    """
+
+    day = today() if day is None else day
+
+    return [
+        ring[past % HISTORY_DAYS] if last_day - HISTORY_DAYS < past <= last_day else 0
+        for past in range(day - days + 1, day + 1)
+    ]
@@ -0,0 +1,153 @@
+"""An append only journal of score increments, for surviving crashes
+
+Increments are committed to SQLite every few seconds. Each one is also
+appended to this journal as a fixed size record, and the records are
+written and fsynced in groups on a short interval, so a crash loses at
+most that interval instead of everything since the last commit.
+
+Every record has a sequence number. A commit stores the last number in
+each database in the same transaction as the scores, so on startup the
+records a database already has are skipped and replaying is idempotent.
+The journal is emptied once every record in it has been committed.
+"""
+
+import os
+import struct
+import logging
+import threading
+import zlib
+from pathlib import Path
+from typing import Iterator
+
+from constants import JOURNAL_PATH
+
+
+log = logging.getLogger(__name__)
+
+# lsn, member_id, guild_id, amount, then a CRC32 of those
+RECORD = struct.Struct("<QQQq")
+CHECKSUM = struct.Struct("<I")
+RECORD_SIZE = RECORD.size + CHECKSUM.size
+
+
+def read_records(path: str | Path) -> Iterator[tuple[int, int, int, int]]:
+    """Yield the complete, intact records of a journal file
+
+    Reading stops at the first torn or corrupt record, which can only be
+    the last write before a crash.
+
+    Args:
+        path (str, Path): The journal file
+
+    Yields:
+        tuple: lsn, member_id, guild_id, amount
+    """
+
+    path = Path(path)
+    if not path.is_file():
+        return
+
+    with path.open("rb") as file:
+        while len(chunk := file.read(RECORD_SIZE)) == RECORD_SIZE:
+            body, (checksum, ) = chunk[:RECORD.size], CHECKSUM.unpack(chunk[RECORD.size:])
+            if zlib.crc32(body) != checksum:
+                log.warning("Journal %s has a corrupt record, ignoring the rest", path)
+                return
+
+            yield RECORD.unpack(body)
+
+
+class Journal:
+    """Buffers records on the loop and writes them to disk on another thread"""
+
+    def __init__(self, path: str=JOURNAL_PATH, lsn: int=0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = self.path.open("ab")
+        self.empty = self.file.tell() == 0
+
+        self.lsn = lsn
+        self.buffer = bytearray()
+        self.buffer_lock = threading.Lock()
+        self.file_lock = threading.Lock()
+
+        self.written_lsn = lsn  # the newest record in the file
+        self.committed_lsn = lsn  # records up to here are in the databases
+        self.syncs = 0
+
+    def append(self, member_id: int, guild_id: int, amount: int) -> int:
+        """Add an increment to the next group written to disk
+
+        Args:
+            member_id (int): The member's ID
+            guild_id (int): The guild's ID
+            amount (int): The score added
+
+        Returns:
+            int: The record's sequence number
+        """
+
+        # Numbered under the lock, so a sync never takes a buffer without
+        # the records its sequence number covers
+        with self.buffer_lock:
+            self.lsn += 1
+            body = RECORD.pack(self.lsn, member_id, guild_id, amount)
+            self.buffer += body
+            self.buffer += CHECKSUM.pack(zlib.crc32(body))
+            return self.lsn
+
+    def committed(self, lsn: int) -> None:
+        """Note that the databases have every record up to a sequence number
+
+        Args:
+            lsn (int): The last committed record
+        """
+
+        self.committed_lsn = max(self.committed_lsn, lsn)
+
+    @property
+    def idle(self) -> bool:
+        """Whether a sync would have nothing to write and nothing to empty"""
+
+        return not self.buffer and (self.empty or self.written_lsn > self.committed_lsn)
+
+    def sync(self) -> None:
+        """Write the buffered records and fsync them, blocks so run it in a thread
+
+        The file is emptied first if every record already in it has been
+        committed, and buffered records are dropped if they all have been.
+        Otherwise they're written, any committed ones are skipped when
+        replaying.
+        """
+
+        with self.buffer_lock:
+            data, self.buffer = self.buffer, bytearray()
+            lsn = self.lsn
+
+        if lsn <= self.committed_lsn:
+            data = None
+
+        with self.file_lock:
+            if self.file.closed:
+                return
+
+            if self.written_lsn <= self.committed_lsn and not self.empty:
+                self.file.truncate(0)
+                self.file.seek(0)
+                self.empty = True
+
+            if data:
+                self.file.write(data)
+                self.written_lsn = lsn
+                self.empty = False
+
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.syncs += 1
+
+    def close(self) -> None:
+        """Write what's left and close the file"""
+
+        self.sync()
+        with self.file_lock:
+            self.file.close()
@@ -0,0 +1,293 @@
+"""Routing guilds' scores to one of several SQLite files
+
+Each shard is a Database with its own writer, so a busy guild only holds
+up writes and checkpoints for the guilds that share its shard. A guild
+always lives in shard guild_id % count. The count is kept in a manifest
+next to the shards rather than read from the constants, since changing it
+means moving every guild, which is what reshard() is for.
+
+Totals across guilds stay in global_scores in the main database.
+"""
+
+import json
+import shutil
+import logging
+from collections import defaultdict
+from itertools import chain, islice
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from constants import SHARD_PATH, SHARD_BUILD_PATH, DB_SHARDS, TRANSFER_BATCH_SIZE, JOURNAL_PATH
+from . import db, journal
+from .db import Database
+
+
+log = logging.getLogger(__name__)
+
+MANIFEST = "shards.json"
+
+# The tables a shard holds and the columns copied when resharding
+SHARD_TABLES = {
+    "scores": ("member_id", "guild_id", "score", "active"),
+    "archived_scores": ("member_id", "guild_id", "score", "archived_at"),
+    "departures": ("guild_id", "member_id", "departed_at"),
+    "score_history": ("member_id", "guild_id", "last_day", "history")
+}
+
+
+def is_sharded(directory: str=SHARD_PATH) -> bool:
+    """Check whether scores have been moved into shards
+
+    Args:
+        directory (str): Where the shards are kept
+
+    Returns:
+        bool: True if there's a shard manifest
+    """
+
+    return (Path(directory) / MANIFEST).is_file()
+
+
+def shard_path(directory: str | Path, index: int) -> Path:
+    """Get the file of a shard
+
+    Args:
+        directory (str, Path): Where the shards are kept
+        index (int): The shard's number
+
+    Returns:
+        Path: The shard's SQLite file
+    """
+
+    return Path(directory) / f"shard-{index}.sqlite"
+
+
+class ShardRouter:
+    """Opens the shards and picks the one a guild belongs to"""
+
+    def __init__(self, directory: str=SHARD_PATH):
+        self.directory = Path(directory)
+        manifest = self.directory / MANIFEST
+
+        if manifest.is_file():
+            count = json.loads(manifest.read_text(encoding="utf-8"))["count"]
+            if count != DB_SHARDS:
+                log.warning(
+                    "Scores are in %s shards, not the configured %s, run manage.py reshard to change",
+                    count, DB_SHARDS
+                )
+        else:
+            count = DB_SHARDS
+            self.directory.mkdir(parents=True, exist_ok=True)
+            manifest.write_text(json.dumps({"count": count}), encoding="utf-8")
+
+        self.shards = []
+        for index in range(count):
+            shard = Database(str(shard_path(self.directory, index)))
+            shard.build(SHARD_BUILD_PATH)
+            self.shards.append(shard)
+
+        log.info("Opened %s score shards in %s", count, self.directory)
+
+    def __len__(self) -> int:
+        return len(self.shards)
+
+    def index(self, guild_id: int) -> int:
+        """Get the number of the shard a guild is in
+
+        Args:
+            guild_id (int): The guild's ID
+
+        Returns:
+            int: The shard's number
+        """
+
+        return guild_id % len(self.shards)
+
+    def shard(self, guild_id: int) -> Database:
+        """Get the shard a guild is in
+
+        Args:
+            guild_id (int): The guild's ID
+
+        Returns:
+            Database: The shard
+        """
+
+        return self.shards[guild_id % len(self.shards)]
+
+    def gather(self, cmd: str, *vals) -> list[tuple]:
+        """Run a read on every shard, for admin commands and tools
+
+        Args:
+            cmd (str): The query
+            vals: The query's parameters
+
+        Returns:
+            list[tuple]: The records of every shard, shard by shard
+        """
+
+        return [row for shard in self.shards for row in shard.records(cmd, *vals)]
+
+    def stream(self, cmd: str, *vals, size: int=1000) -> Iterator[tuple]:
+        """Yield the records of a read on every shard, one shard after another
+
+        Args:
+            cmd (str): The query
+            vals: The query's parameters
+            size (int): Records fetched at a time
+
+        Yields:
+            tuple: A record
+        """
+
+        yield from chain.from_iterable(
+            shard.stream(cmd, *vals, size=size) for shard in self.shards
+        )
+
+    def recount_globals(self, member_ids: Iterable[int]) -> None:
+        """Set members' global scores to the sum of their scores in every shard
+
+        For writes that replace scores instead of adding to them, like
+        imports. Archived scores still count.
+
+        Args:
+            member_ids (Iterable[int]): The members
+        """
+
+        member_ids = json.dumps(list(set(member_ids)))
+        totals = defaultdict(int)
+
+        for member_id, score in self.gather(
+            "SELECT member_id, score FROM scores "
+            "WHERE member_id IN (SELECT value FROM json_each(?)) "
+            "UNION ALL SELECT member_id, score FROM archived_scores "
+            "WHERE member_id IN (SELECT value FROM json_each(?))",
+            member_ids, member_ids
+        ):
+            totals[member_id] += score
+
+        db.multiexec(
+            "INSERT INTO global_scores (member_id, score) VALUES (?, ?) "
+            "ON CONFLICT (member_id) DO UPDATE SET score = excluded.score",
+            totals.items()
+        )
+
+    def commit(self) -> None:
+        """Commit every shard"""
+
+        for shard in self.shards:
+            shard.commit()
+
+    def close(self) -> None:
+        """Close every shard"""
+
+        for shard in self.shards:
+            shard.close()
+
+
+def reshard(count: int, directory: str=SHARD_PATH) -> dict[str, int]:
+    """Move every guild's scores into a new set of shards, with the bot stopped
+
+    The scores come from the current shards, or from the main database the
+    first time. The new shards are built next to the old ones and swapped
+    in once every row is copied, so a failure leaves the old layout as it
+    was. Scores moved out of the main database are deleted from it, with
+    global_scores left as it was.
+
+    Args:
+        count (int): How many shards to make
+        directory (str): Where the shards are kept
+
+    Raises:
+        ValueError: The count is less than 1
+        RuntimeError: The journal has increments left from a crash, which
+            the new shards' checkpoints wouldn't know to skip
+
+    Returns:
+        dict[str, int]: The number of rows copied from each table
+    """
+
+    if count < 1:
+        raise ValueError("There must be at least one shard")
+
+    if next(journal.read_records(JOURNAL_PATH), None) is not None:
+        raise RuntimeError("The score journal isn't empty, start and stop the bot to replay it first")
+
+    directory = Path(directory)
+    staging = directory.with_name(directory.name + ".new")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    sharded = is_sharded(directory)
+    sources = ShardRouter(directory).shards if sharded else [db.main]
+    targets = []
+
+    log.info("Resharding scores from %s into %s shards", len(sources) if sharded else "main", count)
+
+    try:
+        for index in range(count):
+            target = Database(str(shard_path(staging, index)))
+            target.build(SHARD_BUILD_PATH)
+            targets.append(target)
+
+        copied = {}
+        for table, columns in SHARD_TABLES.items():
+            # Replacing, since the triggers add departures as scores are copied
+            insert = (
+                f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))})"
+            )
+            guild_column = columns.index("guild_id")
+            copied[table] = 0
+
+            for source in sources:
+                rows = source.stream(
+                    f"SELECT {', '.join(columns)} FROM {table}", size=TRANSFER_BATCH_SIZE
+                )
+
+                while batch := list(islice(rows, TRANSFER_BATCH_SIZE)):
+                    by_shard = defaultdict(list)
+                    for row in batch:
+                        by_shard[row[guild_column] % count].append(row)
+
+                    for index, shard_rows in by_shard.items():
+                        targets[index].multiexec(insert, shard_rows)
+
+                    copied[table] += len(batch)
+
+            for target in targets:
+                target.commit()
+
+            log.info("Copied %s rows of %s", copied[table], table)
+
+        (staging / MANIFEST).write_text(json.dumps({"count": count}), encoding="utf-8")
+    finally:
+        for target in targets:
+            target.close()
+
+        if sharded:
+            for source in sources:
+                source.close()
+
+    # Swap the new shards in, then drop what they replaced
+    if directory.exists():
+        retired = directory.with_name(directory.name + ".old")
+        shutil.rmtree(retired, ignore_errors=True)
+        directory.rename(retired)
+        staging.rename(directory)
+        shutil.rmtree(retired)
+    else:
+        staging.rename(directory)
+
+    if not sharded:
+        # The totals already count these scores, keep the delete trigger
+        # from taking them back out
+        db.execute("DROP TRIGGER IF EXISTS global_scores_delete")
+        for table in SHARD_TABLES:
+            db.execute(f"DELETE FROM {table}")
+        db.commit()
+        db.build()
+
+    log.info("Resharded into %s shards", count)
+    return copied
@@ -0,0 +1,871 @@
+"""Storage backends for the scores the bot keeps
+
+Everything the bot does with scores goes through a Storage, so the SQLite
+database can be swapped for the in memory engine in benchmarks and tests.
+Guild settings and the export tools still use the SQLite database directly.
+"""
+
+import json
+import logging
+from abc import ABC, abstractmethod
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Iterable, Iterator
+
+from constants import STORAGE_BACKEND, JOURNAL_PATH, SHARD_PATH
+from . import db, history, shards
+from .journal import Journal, read_records
+
+
+log = logging.getLogger(__name__)
+
+
+class Storage(ABC):
+    """The score operations the bot uses"""
+
+    journal: Journal = None
+
+    @abstractmethod
+    def increment(self, member_id: int, guild_id: int, amount: int) -> int:
+        """Add to a member's score, creating and activating their row if needed
+
+        Args:
+            member_id (int): The member's ID
+            guild_id (int): The guild's ID
+            amount (int): The score to add
+
+        Returns:
+            int: The new total score
+        """
+
+    @abstractmethod
+    def upsert_member(self, member_id: int, guild_id: int) -> None:
+        """Add a member with no score, or activate them if they already exist
+
+        Args:
+            member_id (int): The member's ID
+            guild_id (int): The guild's ID
+        """
+
+    @abstractmethod
+    def set_active(self, member_id: int, guild_id: int, active: bool) -> None:
+        """Activate or deactivate a member
+
+        Args:
+            member_id (int): The member's ID
+            guild_id (int): The guild's ID
+            active (bool): Whether the member is in the guild
+        """
+
+    @abstractmethod
+    def set_guild_active(self, guild_id: int, active: bool) -> None:
+        """Activate or deactivate every member of a guild
+
+        Args:
+            guild_id (int): The guild's ID
+            active (bool): Whether the members are in the guild
+        """
+
+    @abstractmethod
+    def iter_members(self) -> Iterator[tuple[int, int, bool]]:
+        """Yield every member that has a score
+
+        Yields:
+            tuple: member_id, guild_id, active
+        """
+
+    @abstractmethod
+    def score(self, member_id: int, guild_id: int) -> int | None:
+        """Get a member's score
+
+        Args:
+            member_id (int): The member's ID
+            guild_id (int): The guild's ID
+
+        Returns:
+            int, None: The score, or None if the member has no row
+        """
+
+    @abstractmethod
+    def rank(self, member_id: int, guild_id: int) -> int | None:
+        """Get a member's rank among the active members of their guild
+
+        Args:
+            member_id (int): The member's ID
+            guild_id (int): The guild's ID
+
+        Returns:
+            int, None: The rank starting at 1, or None if the member isn't active
+        """
+
+    @abstractmethod
+    def top(self, guild_id: int, limit: int) -> list[tuple[int, int]]:
+        """Get the highest scores of the active members of a guild
+
+        Args:
+            guild_id (int): The guild's ID
+            limit (int): The maximum number of scores
+
+        Returns:
+            list[tuple[int, int]]: member_id and score pairs, highest first
+        """
+
+    @abstractmethod
+    def neighbours(
+        self,
+        member_id: int,
+        guild_id: int | None,
+        count: int
+    ) -> tuple[int, list[tuple[int, int]]] | None:
+        """Get the members ranked just above and below a member
+
+        Args:
+            member_id (int): The member's ID
+            guild_id (int, None): The guild's ID, or None to rank by total score
+            count (int): The most members to get on each side
+
+        Returns:
+            tuple, None: The rank of the first member, and member_id and
+                score pairs in rank order with the member among them, or
+                None if the member isn't ranked
+        """
+
+    @abstractmethod
+    def global_score(self, member_id: int) -> int | None:
+        """Get a member's total score across all guilds
+
+        Args:
+            member_id (int): The member's ID
+
+        Returns:
+            int, None: The total score, or None if the member has no score
+        """
+
+    @abstractmethod
+    def global_rank(self, member_id: int) -> int | None:
+        """Get a member's rank by total score across all guilds
+
+        Args:
+            member_id (int): The member's ID
+
+        Returns:
+            int, None: The rank starting at 1, or None if the member has no score
+        """
+
+    @abstractmethod
+    def global_top(self, limit: int) -> list[tuple[int, int]]:
+        """Get the highest total scores across all guilds
+
+        Args:
+            limit (int): The maximum number of scores
+
+        Returns:
+            list[tuple[int, int]]: member_id and total score pairs, highest first
+        """
+
+    def archive(self, departed_before: float, guild_ids: Iterable[int], limit: int) -> int:
+        """Move a batch of members who left long ago out of the hot storage
+
+        Archived members no longer slow down ranks and scoreboards, they
+        still count towards global scores and get their score and history
+        back when they're added again.
+
+        Args:
+            departed_before (float): Archive members who left before this
+                Unix timestamp
+            guild_ids (Iterable[int]): The guilds the bot is in, inactive
+                members of any other guild are archived whenever they left
+            limit (int): The most members to archive
+
+        Returns:
+            int: The number of members archived, 0 once there are none left
+        """
+
+        return 0
+
+    def history(self, member_id: int, guild_id: int | None, days: int) -> list[int]:
+        """Get the score a member gained on each of the last days
+
+        Args:
+            member_id (int): The member's ID
+            guild_id (int, None): The guild's ID, or None for all guilds
+            days (int): How many days, at most HISTORY_DAYS
+
+        Returns:
+            list[int]: The score gained each day, oldest first, or an empty
+                list if the backend keeps no history
+        """
+
+        return []
+
+    def open_journal(self, path: str=JOURNAL_PATH) -> int:
+        """Replay the increments a crash left in the journal, then journal new ones
+
+        Args:
+            path (str): The journal file
+
+        Returns:
+            int: The number of increments replayed, always 0 for backends
+                that keep nothing on disk
+        """
+
+        return 0
+
+    def commit(self) -> None:
+        """Make the changes so far durable"""
+
+    def close(self) -> None:
+        """Release anything the backend holds"""
+
+
+class SQLiteStorage(Storage):
+    """Scores kept in the SQLite database
+
+    Score gained is also added up per member and day in memory, and written
+    to the history rings on commit rather than on every increment. Once the
+    journal is open, increments are journaled too (see journal.py).
+    """
+
+    sharded = False
+
+    def __init__(self):
+        if shards.is_sharded() and not self.sharded:
+            raise RuntimeError(
+                "Scores have been moved into shards, set STORAGE_BACKEND to \"sharded\""
+            )
+
+        self.pending_history: dict[tuple[int, int, int], int] = {}
+
+    def database(self, _guild_id: int) -> db.Database:
+        """Get the database a guild's scores are in
+
+        Args:
+            guild_id (int): The guild's ID
+
+        Returns:
+            db.Database: The database
+        """
+
+        return db.main
+
+    def databases(self) -> list[db.Database]:
+        """Get every database that holds scores
+
+        Returns:
+            list[db.Database]: The databases
+        """
+
+        return [db.main]
+
+    def increment(self, member_id, guild_id, amount):
+        key = (member_id, guild_id, history.today())
+        self.pending_history[key] = self.pending_history.get(key, 0) + amount
+
+        # A new row may get an archived score back from a trigger, which
+        # RETURNING doesn't see. It's computed before the trigger deletes
+        # the archived row, so the archived score is added here instead.
+        total = self.database(guild_id).write(
+            "INSERT INTO scores (member_id, guild_id, score) VALUES (?, ?, ?) "
+            "ON CONFLICT (member_id, guild_id) DO UPDATE "
+            "SET score = score + excluded.score, active = 1 "
+            "RETURNING score + COALESCE((SELECT score FROM archived_scores "
+                "WHERE member_id = ?1 AND guild_id = ?2), 0)",
+            member_id, guild_id, amount
+        )
+
+        if self.journal is not None:
+            self.journal.append(member_id, guild_id, amount)
+
+        return total
+
+    def upsert_member(self, member_id, guild_id):
+        self.database(guild_id).execute(
+            "INSERT INTO scores (member_id, guild_id) VALUES (?, ?) "
+            "ON CONFLICT (member_id, guild_id) DO UPDATE SET active = 1",
+            member_id, guild_id
+        )
+
+    def set_active(self, member_id, guild_id, active):
+        self.database(guild_id).execute(
+            "UPDATE scores SET active = ? "
+            "WHERE member_id = ? AND guild_id = ?",
+            int(active), member_id, guild_id
+        )
+
+    def set_guild_active(self, guild_id, active):
+        self.database(guild_id).execute(
+            "UPDATE scores SET active = ? WHERE guild_id = ?",
+            int(active), guild_id
+        )
+
+    def iter_members(self):
+        for database in self.databases():
+            yield from database.stream("SELECT member_id, guild_id, active FROM scores")
+
+    def score(self, member_id, guild_id):
+        return self.database(guild_id).field(
+            "SELECT score FROM scores "
+            "WHERE member_id = ? AND guild_id = ?",
+            member_id, guild_id
+        )
+
+    def rank(self, member_id, guild_id):
+        # Counts along the scores_rank index instead of ranking the guild
+        return self.database(guild_id).field(
+            "SELECT 1 + (SELECT COUNT(*) FROM scores "
+                "WHERE guild_id = own.guild_id AND active = 1 AND score >= own.score "
+                "AND NOT (score = own.score AND member_id >= own.member_id)) "
+            "FROM scores AS own WHERE own.member_id = ? AND own.guild_id = ? AND own.active = 1",
+            member_id, guild_id
+        )
+
+    def top(self, guild_id, limit):
+        return self.database(guild_id).records(
+            "SELECT member_id, score FROM scores "
+            "WHERE guild_id = ? AND active = 1 "
+            "ORDER BY score DESC, member_id LIMIT ?",
+            guild_id, limit
+        )
+
+    def neighbours(self, member_id, guild_id, count):
+        if guild_id is None:
+            database, table, where, vals = db.main, "global_scores", "", ()
+            score = self.global_score(member_id)
+        else:
+            database, table = self.database(guild_id), "scores"
+            where, vals = "guild_id = ? AND active = 1 AND ", (guild_id, )
+            score = database.field(
+                "SELECT score FROM scores WHERE member_id = ? AND guild_id = ? AND active = 1",
+                member_id, guild_id
+            )
+
+        if score is None:
+            return None
+
+        if guild_id is None:
+            rank = self.global_rank(member_id)
+        else:
+            rank = self.rank(member_id, guild_id)
+
+        # Each side is a short walk along the rank index from the member,
+        # however far down the guild they are
+        above = database.records(
+            f"SELECT member_id, score FROM {table} WHERE {where}score >= ? "
+            "AND NOT (score = ? AND member_id >= ?) "
+            "ORDER BY score, member_id DESC LIMIT ?",
+            *vals, score, score, member_id, count
+        )
+        below = database.records(
+            f"SELECT member_id, score FROM {table} WHERE {where}score <= ? "
+            "AND NOT (score = ? AND member_id <= ?) "
+            "ORDER BY score DESC, member_id LIMIT ?",
+            *vals, score, score, member_id, count
+        )
+
+        return rank - len(above), above[::-1] + [(member_id, score)] + below
+
+    def global_score(self, member_id):
+        return db.field(
+            "SELECT score FROM global_scores WHERE member_id = ?",
+            member_id
+        )
+
+    def global_rank(self, member_id):
+        # Counts along the global_scores_rank index, no aggregation needed
+        return db.field(
+            "SELECT 1 "
+                "+ (SELECT COUNT(*) FROM global_scores WHERE score > own.score) "
+                "+ (SELECT COUNT(*) FROM global_scores "
+                    "WHERE score = own.score AND member_id < own.member_id) "
+            "FROM global_scores AS own WHERE own.member_id = ?",
+            member_id
+        )
+
+    def global_top(self, limit):
+        return db.records(
+            "SELECT member_id, score FROM global_scores "
+            "ORDER BY score DESC, member_id LIMIT ?",
+            limit
+        )
+
+    def archive_batch(
+        self,
+        database: db.Database,
+        departed_before: float,
+        guild_ids: Iterable[int],
+        limit: int
+    ) -> list[tuple[int, int, int]]:
+        """Archive a batch of members from one database
+
+        Args:
+            database (db.Database): The database
+            departed_before (float): Archive members who left before this
+                Unix timestamp
+            guild_ids (Iterable[int]): The guilds the bot is in
+            limit (int): The most members to archive
+
+        Returns:
+            list[tuple[int, int, int]]: The member_id, guild_id and score of
+                each member archived
+        """
+
+        rows = database.records(
+            "SELECT scores.member_id, scores.guild_id, scores.score FROM departures "
+            "JOIN scores USING (guild_id, member_id) "
+            "WHERE departures.departed_at < ? "
+            "OR departures.guild_id NOT IN (SELECT value FROM json_each(?)) "
+            "LIMIT ?",
+            int(departed_before), json.dumps(list(guild_ids)), limit
+        )
+
+        if not rows:
+            return rows
+
+        database.multiexec(
+            "INSERT INTO archived_scores (member_id, guild_id, score, archived_at) "
+            "VALUES (?, ?, ?, CAST(strftime('%s', 'now') AS INTEGER))",
+            rows
+        )
+        # Their score history stays, it's only read by member and it's there
+        # for them if they come back
+        database.multiexec(
+            "DELETE FROM scores WHERE member_id = ? AND guild_id = ?",
+            [(member_id, guild_id) for member_id, guild_id, _ in rows]
+        )
+
+        return rows
+
+    def archive(self, departed_before, guild_ids, limit):
+        rows = self.archive_batch(db.main, departed_before, guild_ids, limit)
+
+        # Archived scores still count globally, put back what the delete took
+        db.multiexec(
+            "UPDATE global_scores SET score = score + ? WHERE member_id = ?",
+            [(score, member_id) for member_id, _, score in rows]
+        )
+
+        return len(rows)
+
+    def history(self, member_id, guild_id, days):
+        if guild_id is None:
+            rows = [
+                row for database in self.databases()
+                for row in database.records(
+                    "SELECT guild_id, last_day, history FROM score_history WHERE member_id = ?",
+                    member_id
+                )
+            ]
+        else:
+            rows = self.database(guild_id).records(
+                "SELECT guild_id, last_day, history FROM score_history "
+                "WHERE member_id = ? AND guild_id = ?",
+                member_id, guild_id
+            )
+
+        day = history.today()
+        totals = [0] * days
+
+        for _, last_day, blob in rows:
+            ring = history.unpack(blob)
+            for i, amount in enumerate(history.recent(ring, last_day, days, day)):
+                totals[i] += amount
+
+        # Add what hasn't been written to the rings yet
+        for (pending_member, pending_guild, pending_day), amount in self.pending_history.items():
+            if pending_member != member_id or guild_id not in (None, pending_guild):
+                continue
+
+            if day - days < pending_day <= day:
+                totals[pending_day - day + days - 1] += amount
+
+        return totals
+
+    def flush_history(self) -> None:
+        """Write the score gained since the last flush to the history rings"""
+
+        if not self.pending_history:
+            return
+
+        pending, self.pending_history = self.pending_history, {}
+        rings: dict[tuple[int, int], tuple] = {}
+
+        # Oldest first, so a flush across midnight fills yesterday then today
+        for (member_id, guild_id, day), amount in sorted(pending.items(), key=lambda i: i[0][2]):
+            if (member_id, guild_id) in rings:
+                ring, last_day = rings[(member_id, guild_id)]
+            else:
+                row = self.database(guild_id).record(
+                    "SELECT history, last_day FROM score_history "
+                    "WHERE member_id = ? AND guild_id = ?",
+                    member_id, guild_id
+                )
+                ring, last_day = history.unpack(row and row[0]), row and row[1]
+
+            rings[(member_id, guild_id)] = (ring, history.add(ring, last_day, day, amount))
+
+        by_database = defaultdict(list)
+        for (member_id, guild_id), (ring, last_day) in rings.items():
+            by_database[self.database(guild_id)].append(
+                (member_id, guild_id, last_day, history.pack(ring))
+            )
+
+        for database, rows in by_database.items():
+            database.multiexec(
+                "INSERT INTO score_history (member_id, guild_id, last_day, history) "
+                "VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (member_id, guild_id) DO UPDATE "
+                "SET last_day = excluded.last_day, history = excluded.history",
+                rows
+            )
+
+        log.debug("Wrote score history of %s members", len(rings))
+
+    def open_journal(self, path=JOURNAL_PATH):
+        checkpoints = {
+            database: database.field("SELECT lsn FROM journal_checkpoint") or 0
+            for database in self.databases()
+        }
+        lsn = max(checkpoints.values())
+        member_ids = set()
+        replayed = 0
+
+        for record_lsn, member_id, guild_id, amount in read_records(path):
+            lsn = max(lsn, record_lsn)
+            member_ids.add(member_id)
+
+            if record_lsn > checkpoints[self.database(guild_id)]:
+                self.increment(member_id, guild_id, amount)
+                replayed += 1
+
+        if member_ids:
+            self.replayed(member_ids)
+
+        if replayed:
+            log.warning("Replayed %s score increments from the journal", replayed)
+
+        # The commit checkpoints every database, the journal is emptied on
+        # its first sync
+        self.journal = Journal(path, lsn)
+        self.commit()
+
+        return replayed
+
+    def replayed(self, member_ids: set[int]) -> None:
+        """Fix up anything replaying the journal doesn't
+
+        Args:
+            member_ids (set[int]): The members in the journal, replayed or not
+        """
+
+    def checkpoint(self) -> int | None:
+        """Store the last journaled increment in every database, before committing
+
+        Returns:
+            int, None: The increment's sequence number, or None if there's
+                no journal
+        """
+
+        if self.journal is None:
+            return None
+
+        lsn = self.journal.lsn
+        for database in self.databases():
+            database.execute(
+                "INSERT INTO journal_checkpoint (id, lsn) VALUES (1, ?) "
+                "ON CONFLICT (id) DO UPDATE SET lsn = excluded.lsn",
+                lsn
+            )
+
+        return lsn
+
+    def commit(self):
+        self.flush_history()
+        lsn = self.checkpoint()
+        db.commit()
+
+        if lsn is not None:
+            self.journal.committed(lsn)
+
+    def close(self):
+        db.close()
+
+
+class ShardedSQLiteStorage(SQLiteStorage):
+    """Scores kept in SQLite shards, each guild in one shard (see shards.py)
+
+    The totals across guilds stay in the main database's global_scores,
+    which the shards have no triggers for, so they're kept up to date here.
+    What each member gained is added up in memory and written in one batch
+    on commit, or before anything reads the totals, so increments only
+    ever write to their guild's shard.
+    """
+
+    sharded = True
+
+    def __init__(self, directory: str=SHARD_PATH):
+        super().__init__()
+        self.pending_globals: dict[int, int] = {}
+        self.router = shards.ShardRouter(directory)
+
+    def database(self, guild_id):
+        return self.router.shard(guild_id)
+
+    def databases(self):
+        return self.router.shards
+
+    def increment(self, member_id, guild_id, amount):
+        total = super().increment(member_id, guild_id, amount)
+        self.pending_globals[member_id] = self.pending_globals.get(member_id, 0) + amount
+        return total
+
+    def upsert_member(self, member_id, guild_id):
+        super().upsert_member(member_id, guild_id)
+        self.pending_globals.setdefault(member_id, 0)
+
+    def flush_globals(self) -> None:
+        """Add what members gained since the last flush to their global totals"""
+
+        if not self.pending_globals:
+            return
+
+        pending, self.pending_globals = self.pending_globals, {}
+        db.multiexec(
+            "INSERT INTO global_scores (member_id, score) VALUES (?, ?) "
+            "ON CONFLICT (member_id) DO UPDATE SET score = score + excluded.score",
+            pending.items()
+        )
+
+        log.debug("Wrote global scores of %s members", len(pending))
+
+    def recount_globals(self, member_ids: Iterable[int]) -> None:
+        """Set members' global totals to the sum of their scores in the shards
+
+        Args:
+            member_ids (Iterable[int]): The members
+        """
+
+        # Flushed first, so what's pending isn't added on top of the recount
+        self.flush_globals()
+        self.router.recount_globals(member_ids)
+
+    def replayed(self, member_ids):
+        # A crash between the shards' commits and the main one can leave
+        # the totals behind the shards, replayed or not
+        self.recount_globals(member_ids)
+
+    def neighbours(self, member_id, guild_id, count):
+        if guild_id is None:
+            self.flush_globals()
+
+        return super().neighbours(member_id, guild_id, count)
+
+    def global_score(self, member_id):
+        self.flush_globals()
+        return super().global_score(member_id)
+
+    def global_rank(self, member_id):
+        self.flush_globals()
+        return super().global_rank(member_id)
+
+    def global_top(self, limit):
+        self.flush_globals()
+        return super().global_top(limit)
+
+    def archive(self, departed_before, guild_ids, limit):
+        guild_ids = list(guild_ids)
+        archived = 0
+
+        # The global totals are left alone, nothing took the scores out
+        for shard in self.router.shards:
+            if archived >= limit:
+                break
+
+            archived += len(self.archive_batch(shard, departed_before, guild_ids, limit - archived))
+
+        return archived
+
+    def commit(self):
+        self.flush_history()
+        self.flush_globals()
+        lsn = self.checkpoint()
+        self.router.commit()
+        db.commit()
+
+        if lsn is not None:
+            self.journal.committed(lsn)
+
+    def close(self):
+        self.router.close()
+        db.close()
+
+
+class MemoryStorage(Storage):
+    """Scores kept in memory, for benchmarks, tests and as a hot cache
+
+    Each guild keeps a sorted list of its active members' (-score, member_id)
+    so ranks and top scores are a bisect or a slice, mirroring the order the
+    SQLite backend uses. Nothing is persisted.
+    """
+
+    def __init__(self):
+        self.scores: dict[tuple[int, int], list[int]] = {}  # [score, active]
+        self.ranked: dict[int, list[tuple[int, int]]] = {}
+        self.totals: dict[int, int] = {}
+        self.global_ranked: list[tuple[int, int]] = []
+        self.histories: dict[tuple[int, int], list] = {}  # [ring, last_day]
+
+    def _unrank(self, member_id: int, guild_id: int) -> None:
+        score, active = self.scores[(member_id, guild_id)]
+        if active:
+            ranked = self.ranked[guild_id]
+            del ranked[bisect_left(ranked, (-score, member_id))]
+
+    def _rank(self, member_id: int, guild_id: int) -> None:
+        score, active = self.scores[(member_id, guild_id)]
+        if active:
+            insort(self.ranked.setdefault(guild_id, []), (-score, member_id))
+
+    def _add_total(self, member_id: int, amount: int) -> None:
+        if member_id in self.totals:
+            total = self.totals[member_id]
+            del self.global_ranked[bisect_left(self.global_ranked, (-total, member_id))]
+        else:
+            total = 0
+
+        self.totals[member_id] = total + amount
+        insort(self.global_ranked, (-total - amount, member_id))
+
+    def increment(self, member_id, guild_id, amount):
+        key = (member_id, guild_id)
+
+        if key in self.scores:
+            self._unrank(member_id, guild_id)
+            self.scores[key][0] += amount
+            self.scores[key][1] = 1
+        else:
+            self.scores[key] = [amount, 1]
+
+        self._rank(member_id, guild_id)
+        self._add_total(member_id, amount)
+
+        ring_and_day = self.histories.setdefault(key, [history.unpack(None), None])
+        ring_and_day[1] = history.add(ring_and_day[0], ring_and_day[1], history.today(), amount)
+
+        return self.scores[key][0]
+
+    def upsert_member(self, member_id, guild_id):
+        if (member_id, guild_id) not in self.scores:
+            self.scores[(member_id, guild_id)] = [0, 0]
+            self._add_total(member_id, 0)
+
+        self.set_active(member_id, guild_id, True)
+
+    def set_active(self, member_id, guild_id, active):
+        key = (member_id, guild_id)
+        if key not in self.scores or self.scores[key][1] == int(active):
+            return
+
+        self._unrank(member_id, guild_id)
+        self.scores[key][1] = int(active)
+        self._rank(member_id, guild_id)
+
+    def set_guild_active(self, guild_id, active):
+        for member_id, member_guild_id in list(self.scores):
+            if member_guild_id == guild_id:
+                self.set_active(member_id, guild_id, active)
+
+    def iter_members(self):
+        for (member_id, guild_id), (_, active) in list(self.scores.items()):
+            yield member_id, guild_id, active
+
+    def score(self, member_id, guild_id):
+        if (row := self.scores.get((member_id, guild_id))) is not None:
+            return row[0]
+
+        return None
+
+    def rank(self, member_id, guild_id):
+        row = self.scores.get((member_id, guild_id))
+        if row is None or not row[1]:
+            return None
+
+        return bisect_left(self.ranked[guild_id], (-row[0], member_id)) + 1
+
+    def top(self, guild_id, limit):
+        return [
+            (member_id, -score)
+            for score, member_id in self.ranked.get(guild_id, [])[:limit]
+        ]
+
+    def neighbours(self, member_id, guild_id, count):
+        if guild_id is None:
+            ranked, rank = self.global_ranked, self.global_rank(member_id)
+        else:
+            ranked, rank = self.ranked.get(guild_id, []), self.rank(member_id, guild_id)
+
+        if rank is None:
+            return None
+
+        start = max(rank - 1 - count, 0)
+        return start + 1, [(ranked_id, -score) for score, ranked_id in ranked[start:rank + count]]
+
+    def global_score(self, member_id):
+        return self.totals.get(member_id)
+
+    def global_rank(self, member_id):
+        if (total := self.totals.get(member_id)) is None:
+            return None
+
+        return bisect_left(self.global_ranked, (-total, member_id)) + 1
+
+    def global_top(self, limit):
+        return [(member_id, -score) for score, member_id in self.global_ranked[:limit]]
+
+    def history(self, member_id, guild_id, days):
+        day = history.today()
+        totals = [0] * days
+
+        for (ring_member_id, ring_guild_id), (ring, last_day) in self.histories.items():
+            if ring_member_id != member_id or guild_id not in (None, ring_guild_id):
+                continue
+
+            for i, amount in enumerate(history.recent(ring, last_day, days, day)):
+                totals[i] += amount
+
+        return totals
+
+
+BACKENDS = {
+    "sqlite": SQLiteStorage,
+    "sharded": ShardedSQLiteStorage,
+    "memory": MemoryStorage
+}
+
+_storage: Storage = None
+
+
+def get_storage() -> Storage:
+    """Get the storage backend, creating the configured one on first use
+
+    Returns:
+        Storage: The storage backend
+    """
+
+    global _storage  # pylint: disable=W0603
+
+    if _storage is None:
+        log.info("Using %s storage backend", STORAGE_BACKEND)
+        _storage = BACKENDS[STORAGE_BACKEND]()
+
+    return _storage
+
+
+def set_storage(storage: Storage) -> None:
+    """Replace the storage backend, used by tools that need their own engine
+
+    Args:
+        storage (Storage): The new storage backend
+    """
+
+    global _storage  # pylint: disable=W0603
+    _storage = storage
@@ -0,0 +1,303 @@
+"""Streaming export and import of the scores table"""
+
+import csv
+import json
+import logging
+from collections import defaultdict
+from itertools import islice
+from typing import Callable, Iterator, TextIO
+
+from constants import TRANSFER_BATCH_SIZE, TRANSFER_FORMATS as FORMATS
+from . import db
+from .storage import SQLiteStorage, ShardedSQLiteStorage, get_storage
+
+
+log = logging.getLogger(__name__)
+
+FIELDS = ("member_id", "guild_id", "score", "active")
+
+# Column names used by other leveling bots' exports
+ALIASES = {
+    "member_id": ("member_id", "user_id", "userid", "id"),
+    "guild_id": ("guild_id", "guildid", "server_id"),
+    "score": ("score", "xp", "exp", "experience", "points"),
+    "active": ("active", )
+}
+
+
+def detect_format(filename: str) -> str:
+    """Work out the format of a file from its name
+
+    Args:
+        filename (str): The file's name
+
+    Raises:
+        ValueError: The format isn't supported
+
+    Returns:
+        str: The format, one of FORMATS
+    """
+
+    extension = filename.rsplit(".", 1)[-1].lower()
+    if extension in ("json", "ndjson"):
+        extension = "jsonl"
+
+    if extension not in FORMATS:
+        raise ValueError(f"Unsupported format: {extension}")
+
+    return extension
+
+
+def score_database(guild_id: int) -> db.Database:
+    """Get the database a guild's scores are in, the main one unless sharded
+
+    Args:
+        guild_id (int): The guild's ID
+
+    Returns:
+        db.Database: The database
+    """
+
+    storage = get_storage()
+    if isinstance(storage, SQLiteStorage):
+        return storage.database(guild_id)
+
+    return db.main
+
+
+def score_databases() -> list[db.Database]:
+    """Get every database that holds scores, the main one unless sharded
+
+    Returns:
+        list[db.Database]: The databases
+    """
+
+    storage = get_storage()
+    if isinstance(storage, SQLiteStorage):
+        return storage.databases()
+
+    return [db.main]
+
+
+def iter_scores(guild_id: int=None) -> Iterator[tuple[int, int, int, int]]:
+    """Yield every score row without loading the table into memory
+
+    Args:
+        guild_id (int, None): Only yield rows from this guild
+
+    Yields:
+        tuple: member_id, guild_id, score, active
+    """
+
+    # Archived members are exported as inactive members
+    if guild_id is None:
+        for database in score_databases():
+            yield from database.stream(
+                "SELECT member_id, guild_id, score, active FROM scores "
+                "UNION ALL SELECT member_id, guild_id, score, 0 FROM archived_scores",
+                size=TRANSFER_BATCH_SIZE
+            )
+        return
+
+    yield from score_database(guild_id).stream(
+        "SELECT member_id, guild_id, score, active FROM scores WHERE guild_id = ? "
+        "UNION ALL SELECT member_id, guild_id, score, 0 FROM archived_scores WHERE guild_id = ?",
+        guild_id, guild_id, size=TRANSFER_BATCH_SIZE
+    )
+
+
+def export_scores(
+    file: TextIO,
+    fmt: str,
+    guild_id: int=None,
+    progress: Callable[[int], None]=None
+) -> int:
+    """Write scores to a file
+
+    Args:
+        file (TextIO): The file to write to
+        fmt (str): The format, one of FORMATS
+        guild_id (int, None): Only export this guild's scores
+        progress (Callable, None): Called with the number of rows written so
+            far after every batch
+
+    Returns:
+        int: The number of rows written
+    """
+
+    log.info("Exporting scores as %s", fmt)
+
+    if fmt == "csv":
+        writer = csv.writer(file)
+        writer.writerow(FIELDS)
+        write = writer.writerow
+    else:
+        def write(row):
+            file.write(json.dumps(dict(zip(FIELDS, row))) + "\n")
+
+    count = 0
+    for count, row in enumerate(iter_scores(guild_id), start=1):
+        write(row)
+        if progress and count % TRANSFER_BATCH_SIZE == 0:
+            progress(count)
+
+    if progress:
+        progress(count)
+
+    log.info("Exported %s scores", count)
+    return count
+
+
+def _normalise(record: dict, guild_id: int=None) -> tuple[int, int, int, int]:
+    """Turn a record from any supported source into a score row
+
+    Args:
+        record (dict): The record with any of the aliased column names
+        guild_id (int, None): The guild to use when the record doesn't have one
+
+    Raises:
+        ValueError: A required column is missing
+
+    Returns:
+        tuple: member_id, guild_id, score, active
+    """
+
+    record = {key.strip().lower(): value for key, value in record.items()}
+    row = {}
+
+    for field, aliases in ALIASES.items():
+        row[field] = next(
+            (record[alias] for alias in aliases if record.get(alias) not in (None, "")),
+            None
+        )
+
+    if row["guild_id"] is None:
+        row["guild_id"] = guild_id
+
+    if row["member_id"] is None or row["guild_id"] is None or row["score"] is None:
+        raise ValueError(f"Record is missing a member, guild or score: {record}")
+
+    active = 1 if row["active"] is None else int(row["active"])
+    return int(row["member_id"]), int(row["guild_id"]), int(float(row["score"])), active
+
+
+def _read_records(file: TextIO, fmt: str) -> Iterator[dict]:
+    """Yield the records in a file one at a time"""
+
+    if fmt == "csv":
+        yield from csv.DictReader(file)
+        return
+
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_batches(
+    file: TextIO,
+    fmt: str,
+    guild_id: int=None,
+    size: int=TRANSFER_BATCH_SIZE
+) -> Iterator[list[tuple[int, int, int, int]]]:
+    """Read and normalise the rows of a file a batch at a time
+
+    Only reads, so the bot can run it on a thread while it writes the
+    batches on the event loop's.
+
+    Args:
+        file (TextIO): The file to read from
+        fmt (str): The format, one of FORMATS
+        guild_id (int, None): The guild for records that don't name one
+        size (int): The rows per batch
+
+    Raises:
+        ValueError: A record is missing a column or isn't a number
+
+    Yields:
+        list[tuple]: member_id, guild_id, score, active of each row
+    """
+
+    rows = (_normalise(record, guild_id) for record in _read_records(file, fmt))
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def write_batch(rows: list[tuple[int, int, int, int]]) -> None:
+    """Upsert a batch of score rows and commit them
+
+    Existing rows have their score and active state replaced. The writes
+    go through the storage's own writers, so the bot calls this on the
+    event loop's thread, and the commit includes whatever the bot wrote
+    in the meantime.
+
+    Args:
+        rows (list[tuple]): member_id, guild_id, score, active of each row
+    """
+
+    storage = get_storage()
+    by_database = defaultdict(list)
+    for row in rows:
+        by_database[score_database(row[1])].append(row)
+
+    for database, database_rows in by_database.items():
+        # Bring archived rows back first, so the upsert overwrites their
+        # score instead of the restore trigger adding to the imported one
+        database.multiexec(
+            "INSERT OR IGNORE INTO scores (member_id, guild_id, score, active) "
+            "SELECT member_id, guild_id, 0, 0 FROM archived_scores "
+            "WHERE member_id = ? AND guild_id = ?",
+            [row[:2] for row in database_rows]
+        )
+        database.multiexec(
+            "INSERT INTO scores (member_id, guild_id, score, active) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (member_id, guild_id) DO UPDATE "
+            "SET score = excluded.score, active = excluded.active",
+            database_rows
+        )
+
+    # Shards have no triggers for the totals, and imports replace scores
+    if isinstance(storage, ShardedSQLiteStorage):
+        storage.recount_globals(row[0] for row in rows)
+
+    # The storage's commit also checkpoints the journal, so a crash
+    # doesn't replay increments this commit already included
+    if isinstance(storage, SQLiteStorage):
+        storage.commit()
+    else:
+        db.commit()
+
+
+def import_scores(
+    file: TextIO,
+    fmt: str,
+    guild_id: int=None,
+    progress: Callable[[int], None]=None
+) -> int:
+    """Upsert scores from a file, one transaction per batch
+
+    Args:
+        file (TextIO): The file to read from
+        fmt (str): The format, one of FORMATS
+        guild_id (int, None): The guild for records that don't name one
+        progress (Callable, None): Called with the number of rows imported
+            so far after every batch
+
+    Raises:
+        ValueError: A record is missing a column or isn't a number, the
+            batches before it are already imported
+
+    Returns:
+        int: The number of rows imported
+    """
+
+    log.info("Importing scores from %s", fmt)
+
+    count = 0
+    for batch in read_batches(file, fmt, guild_id):
+        write_batch(batch)
+        count += len(batch)
+        if progress:
+            progress(count)
+
+    log.info("Imported %s scores", count)
+    return count
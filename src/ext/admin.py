@@ -0,0 +1,303 @@
+"""Extension for the bot owner's admin commands"""
+
+import io
+import asyncio
+import logging
+from pathlib import Path
+from tempfile import TemporaryFile
+from time import monotonic
+
+import discord
+from discord.ext import commands
+
+from db import transfer, backup, get_storage
+from db.storage import ShardedSQLiteStorage
+from profiler import ProfileSession
+from constants import PROFILE_DEFAULT_SECONDS, PROFILE_MAX_SECONDS, TRANSFER_LOOP_BATCH_SIZE
+
+log = logging.getLogger(__name__)
+
+
+class AdminCog(commands.Cog, name="Admin Commands"):
+    """Cog for commands only the bot owner can use"""
+
+    def __init__(self, bot: commands.Bot):
+        super().__init__()
+        self.bot = bot
+        self.profile: ProfileSession = None
+
+    async def cog_check(self, ctx: commands.Context) -> bool:
+        """Only allow the bot owner to use these commands"""
+
+        return await self.bot.is_owner(ctx.author)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """Called when the bot is ready"""
+
+        log.info("Cog %s is ready", self.qualified_name)
+
+    @commands.Cog.listener()
+    async def on_message(self, _message: discord.Message):
+        """Count messages towards a running profile"""
+
+        if self.profile is not None:
+            self.profile.request()
+
+    @commands.Cog.listener()
+    async def on_interaction(self, _interaction: discord.Interaction):
+        """Count interactions towards a running profile"""
+
+        if self.profile is not None:
+            self.profile.request()
+
+    @commands.command(name="gateway")
+    async def _gateway(self, ctx: commands.Context):
+        """Show the gateway traffic received since startup"""
+
+        await ctx.reply(f"```\n{self.bot.gateway_stats.summary()}\n```")
+
+    @commands.command(name="shards")
+    async def _shards(self, ctx: commands.Context):
+        """Show how the guilds and scores are spread across the shards"""
+
+        storage = get_storage()
+        if not isinstance(storage, ShardedSQLiteStorage):
+            return await ctx.reply("Scores aren't sharded")
+
+        lines = []
+        for index, shard in enumerate(storage.router.shards):
+            guilds, members, archived = shard.record(
+                "SELECT COUNT(DISTINCT guild_id), COUNT(*), "
+                "(SELECT COUNT(*) FROM archived_scores) FROM scores"
+            )
+            size = Path(shard.path).stat().st_size / 1024 ** 2
+            lines.append(
+                f"Shard {index}: {guilds} guilds, {members} members, "
+                f"{archived} archived, {size:.1f} MB"
+            )
+
+        await ctx.reply("```\n" + "\n".join(lines) + "\n```")
+
+    @commands.command(name="lag")
+    async def _lag(self, ctx: commands.Context):
+        """Show the event loop's lag and where it has been blocked"""
+
+        await ctx.reply(f"```\n{self.bot.watchdog.summary()}\n```")
+
+    @commands.command(name="stats")
+    async def _stats(self, ctx: commands.Context):
+        """Show how the bot's caches and queues are coping"""
+
+        lines = []
+
+        if (commands_cog := self.bot.get_cog("Score Commands")) is not None:
+            renderer = commands_cog.renderer
+            lines.append(
+                f"Renders: {renderer.completed} completed, {renderer.rejected} rejected, "
+                f"{renderer.expired} expired, {renderer.too_large} too large, "
+                f"{renderer.failed} failed, {renderer.queue.qsize()} queued"
+            )
+
+        # Imported here so the cog loads without the image libraries
+        from image import avatar_cache, tile_cache  # pylint: disable=C0415
+
+        prewarmer = self.bot.prewarmer
+        lines.append(
+            f"Prewarm: {prewarmer.avatars} avatars ({prewarmer.downloaded // 1024} kB), "
+            f"{prewarmer.tiles} columns in {prewarmer.cpu_seconds:.1f}s CPU, "
+            f"{prewarmer.deferred} waits for renders"
+        )
+        for name, cache in (("Avatar", avatar_cache), ("Column", tile_cache)):
+            lines.append(
+                f"{name} cache: {len(cache)} entries, {cache.size // 1024} of "
+                f"{cache.limit // 1024} kB, {cache.hits} hits, {cache.misses} misses"
+            )
+
+        member_cache = self.bot.member_cache
+        lines.append(
+            f"Member cache: {len(member_cache)} members, "
+            f"{member_cache.hits} hits, {member_cache.misses} misses"
+        )
+        lines.append(
+            f"Statuses: {member_cache.status_hits} cached, {member_cache.status_queries} "
+            f"requested, {member_cache.status_unknown} unknown"
+        )
+
+        if (listeners_cog := self.bot.get_cog("Event Listeners")) is not None:
+            cooldown = listeners_cog.cooldown
+            lines.append(
+                f"Cooldowns: {len(cooldown)} cooling down, {cooldown.allowed} scored, "
+                f"{cooldown.suppressed} writes avoided"
+            )
+
+            rewards = listeners_cog.rewards
+            lines.append(
+                f"Level ups: {rewards.processed} processed, {rewards.dropped} dropped, "
+                f"{rewards.queue.qsize()} queued"
+            )
+
+        await ctx.reply("```\n" + "\n".join(lines) + "\n```")
+
+    @commands.command(name="profile")
+    async def _profile(
+        self,
+        ctx: commands.Context,
+        scope: str="all",
+        seconds: float=PROFILE_DEFAULT_SECONDS,
+        requests: int=0,
+        mode: str="sample"
+    ):
+        """Profile the bot for a while or a number of messages and interactions
+
+        Scopes are all, render, db and listeners. The sample mode samples
+        every thread, the cprofile mode traces the event loop's thread.
+        Results are written to the logs directory.
+        """
+
+        if self.profile is not None:
+            return await ctx.reply("A profile is already running")
+
+        try:
+            session = ProfileSession(scope, mode)
+        except ValueError as error:
+            return await ctx.reply(str(error))
+
+        seconds = min(seconds, PROFILE_MAX_SECONDS)
+        until = f" or {requests} requests" if requests else ""
+        message = await ctx.reply(f"Profiling {scope} for {seconds:g}s{until}...")
+
+        self.profile = session
+        session.start()
+        try:
+            await session.wait(seconds, requests)
+        finally:
+            session.stop()
+            self.profile = None
+
+        paths = await asyncio.to_thread(session.write)
+        await message.edit(
+            content=f"Profiled {scope} over {session.requests} requests, wrote:\n"
+            + "\n".join(f"`{path}`" for path in paths)
+        )
+
+    @commands.command(name="backup")
+    async def _backup(self, ctx: commands.Context):
+        """Back up the database now"""
+
+        message = await ctx.reply("Backing up...")
+        get_storage().commit()
+
+        try:
+            paths = await asyncio.to_thread(backup.backup_all)
+        except backup.BackupError as error:
+            return await message.edit(content=f"Backup failed: {error}")
+
+        await message.edit(
+            content="Backed up to " + ", ".join(f"`{path}`" for path in paths)
+        )
+
+    def progress_reporter(self, message: discord.Message, verb: str):
+        """Create a progress callback that can be called from the loop or another thread
+
+        Args:
+            message (discord.Message): The message to edit with the progress
+            verb (str): What is being done to the rows, eg. "Exported"
+        """
+
+        loop = asyncio.get_running_loop()
+        last_report = 0
+
+        def report(count: int) -> None:
+            nonlocal last_report
+
+            # Edits are rate limited, so only report every few seconds
+            if monotonic() - last_report < 3:
+                return
+
+            last_report = monotonic()
+            asyncio.run_coroutine_threadsafe(
+                message.edit(content=f"{verb} {count} rows..."), loop
+            )
+
+        return report
+
+    @commands.command(name="export")
+    async def _export(self, ctx: commands.Context, guild_id: int=None, fmt: str="csv"):
+        """Export a guild's scores, defaults to the current guild"""
+
+        if fmt not in transfer.FORMATS:
+            return await ctx.reply(f"Format must be one of {', '.join(transfer.FORMATS)}")
+
+        if (guild_id := guild_id or getattr(ctx.guild, "id", None)) is None:
+            return await ctx.reply("Give the ID of the guild to export outside a guild")
+
+        message = await ctx.reply("Exporting scores...")
+        progress = self.progress_reporter(message, "Exported")
+
+        # Spool to disk so large exports aren't held in memory
+        with TemporaryFile("w+b") as file:
+            text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+            count = await asyncio.to_thread(
+                transfer.export_scores, text, fmt, guild_id, progress
+            )
+            text.flush()
+            file.seek(0)
+
+            await message.edit(
+                content=f"Exported {count} rows",
+                attachments=[discord.File(file, filename=f"scores-{guild_id}.{fmt}")]
+            )
+
+            text.detach()
+
+    @commands.command(name="import")
+    async def _import(self, ctx: commands.Context, guild_id: int=None):
+        """Upsert scores from an attached csv or jsonl file
+
+        Rows without a guild column go to the guild given, defaults to the
+        current guild. Outside a guild every row needs a guild column.
+        """
+
+        if not ctx.message.attachments:
+            return await ctx.reply("Attach a csv or jsonl file to import")
+
+        attachment = ctx.message.attachments[0]
+
+        try:
+            fmt = transfer.detect_format(attachment.filename)
+        except ValueError as error:
+            return await ctx.reply(str(error))
+
+        guild_id = guild_id or getattr(ctx.guild, "id", None)
+        message = await ctx.reply("Importing scores...")
+        progress = self.progress_reporter(message, "Imported")
+
+        with TemporaryFile("w+b") as file:
+            await attachment.save(file)
+            file.seek(0)
+            text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+            batches = transfer.read_batches(text, fmt, guild_id, TRANSFER_LOOP_BATCH_SIZE)
+
+            # The file is parsed on a thread, only the writes are on the
+            # loop's, where they share the writers and their open
+            # transactions with everything else the bot writes
+            count = 0
+            try:
+                while batch := await asyncio.to_thread(next, batches, None):
+                    transfer.write_batch(batch)
+                    count += len(batch)
+                    progress(count)
+            except ValueError as error:
+                return await message.edit(content=f"Import failed after {count} rows: {error}")
+            finally:
+                text.detach()
+
+        log.info("Imported %s scores", count)
+        await message.edit(content=f"Imported {count} rows")
+
+
+async def setup(bot: commands.Bot) -> None:
+    """Setup the cog"""
+
+    await bot.add_cog(AdminCog(bot))
@@ -9,12 +9,33 @@ from discord import (
 )
 from discord.ext import commands
 
-from db import db
+from db import get_storage
 from score import ScoreObject
-from image import ScoreEditor, GridScoreboardEditor
+from levels import LevelCurve, DEFAULT_CURVE
+from constants import (
+    Scopes,
+    RankStyles,
+    ScoreboardStyles,
+    GRID_SCOREBOARD_SIZE,
+    LIST_SCOREBOARD_SIZE,
+    CONTEXT_NEIGHBOURS,
+    SPARKLINE_DAYS
+)
+from scheduler import (
+    RenderScheduler,
+    RenderPriority,
+    RenderExpired,
+    RenderTooLarge,
+    SchedulerSaturated
+)
+from utils import humanize_number
 
 log = logging.getLogger(__name__)
 
+# Footers of the text versions sent instead of images
+BUSY_NOTE = "Images are busy right now, here's the short version"
+TOO_LARGE_NOTE = "That image would be too large to draw, here's the short version"
+
 
 class CommandsCog(commands.Cog, name="Score Commands"):
     """Cog for level commands"""
@@ -22,47 +43,178 @@ class CommandsCog(commands.Cog, name="Score Commands"):
     def __init__(self, bot: commands.Bot):
         super().__init__()
         self.bot = bot
+        self.storage = get_storage()
+        self.renderer = RenderScheduler()
 
         rank_ctx_menu = app_commands.ContextMenu(
             name="/rank", callback=self._rank_context_menu
         )
         bot.tree.add_command(rank_ctx_menu)
 
+    async def cog_load(self) -> None:
+        """Start the render scheduler when the cog is loaded"""
+
+        self.renderer.start()
+
+    async def cog_unload(self) -> None:
+        """Stop the render scheduler when the cog is unloaded"""
+
+        await self.renderer.stop()
+
     @commands.Cog.listener()
     async def on_ready(self):
         """Called when the bot is ready"""
 
         log.info("Cog %s is ready", self.qualified_name)
 
-    async def get_rank(self, member: discord.Member) -> discord.File:
+    async def render(self, render, priority: RenderPriority) -> tuple[discord.File | None, str | None]:
+        """Queue a render on the scheduler and wait for the result
+
+        Args:
+            render (Callable): Coroutine function that produces the file
+            priority (RenderPriority): The priority of the render
+
+        Returns:
+            discord.File, None: The image, or None if the scheduler
+                couldn't render it in time or within its memory limit
+            str, None: Why there's no image, for the text version's footer
+        """
+
+        try:
+            return await self.renderer.submit(render, priority), None
+        except RenderTooLarge:
+            return None, TOO_LARGE_NOTE
+        except (SchedulerSaturated, RenderExpired):
+            return None, BUSY_NOTE
+
+    def get_curve(self, guild_id: int | None) -> LevelCurve:
+        """Get the level curve of a guild
+
+        Args:
+            guild_id (int, None): The guild's ID, or None for global scores
+
+        Returns:
+            LevelCurve: The guild's curve, global scores use the default
+        """
+
+        if guild_id is None:
+            return DEFAULT_CURVE
+
+        return self.bot.xp_rules.get(guild_id).curve
+
+    def get_score(
+        self,
+        member: discord.Member,
+        scope: Scopes=Scopes.Server,
+        history_days: int=0
+    ) -> ScoreObject:
+        """Get the score object of the member
+
+        Args:
+            member (discord.Member): The member
+            scope (Scopes): Whether to get the guild or global score
+            history_days (int): How many days of score history to include
+
+        Returns:
+            ScoreObject: The score object
+        """
+
+        guild_id = None if scope is Scopes.Global else member.guild.id
+        return ScoreObject.fetch(
+            member.id, guild_id, self.storage, history_days, self.get_curve(guild_id)
+        )
+
+    async def get_rank(self, member: discord.Member, scope: Scopes=Scopes.Server) -> discord.File:
         """Get the rank of the user
 
         Args:
-            inter (Inter): The interaction
-            member_id (int): The member id
+            member (discord.Member): The member
+            scope (Scopes): Whether to get the guild or global rank
 
         Returns:
             discord.File: The rank image
         """
 
-        score = db.field(
-            "SELECT score FROM scores "
-            "WHERE member_id = ? AND guild_id = ?",
-            member.id, member.guild.id
-        )
+        # Imported here so loading the extension doesn't wait on PIL
+        from image import ScoreEditor  # pylint: disable=C0415
 
-        score_obj = ScoreObject(member.id, member.guild.id, score)
-        score_image_editor = ScoreEditor(member, score_obj)
+        score_obj = self.get_score(member, scope, SPARKLINE_DAYS)
+        status = await self.bot.member_cache.fetch_status(member.guild, member.id)
+        score_image_editor = ScoreEditor(member, score_obj, status=status)
         await score_image_editor.draw()
         return score_image_editor.to_file()
 
-    async def respond_with_rank(self, inter: Inter, member: discord.Member=None):
+    async def get_rank_context(self, member: discord.Member, scope: Scopes=Scopes.Server) -> discord.File:
+        """Get the members ranked just above and below the member
+
+        Args:
+            member (discord.Member): The member
+            scope (Scopes): Whether to rank within the guild or globally
+
+        Returns:
+            discord.File: The scoreboard image, or the rank card if the
+                member isn't ranked
+        """
+
+        from image import ContextScoreboardEditor  # pylint: disable=C0415
+
+        guild = None if scope is Scopes.Global else member.guild
+        guild_id = None if guild is None else guild.id
+        neighbours = self.storage.neighbours(member.id, guild_id, CONTEXT_NEIGHBOURS)
+
+        if neighbours is None:
+            return await self.get_rank(member, scope)
+
+        start, rows = neighbours
+        scores = ScoreObject.ranked(rows, guild_id, start, self.get_curve(guild_id))
+        members_and_scores = await self.fetch_members(guild, scores)
+
+        context_image_editor = ContextScoreboardEditor(members_and_scores, member.id, guild)
+        await context_image_editor.draw()
+        return context_image_editor.to_file()
+
+    def get_rank_embed(
+        self,
+        member: discord.Member,
+        scope: Scopes=Scopes.Server,
+        note: str=BUSY_NOTE
+    ) -> discord.Embed:
+        """Get a text summary of the rank, used when the image can't be drawn
+
+        Args:
+            member (discord.Member): The member
+            scope (Scopes): Whether to get the guild or global rank
+            note (str): Why there's no image
+
+        Returns:
+            discord.Embed: The rank embed
+        """
+
+        score = self.get_score(member, scope)
+
+        embed = discord.Embed(title=member.display_name, colour=member.colour)
+        embed.set_thumbnail(url=member.display_avatar.url)
+        embed.add_field(name="Rank", value="Unranked" if score.rank is None else f"#{score.rank}")
+        embed.add_field(name="Level", value=humanize_number(score.level))
+        embed.add_field(name="Score", value=f"{humanize_number(score.total_score)} XP")
+        embed.set_footer(text=note)
+        return embed
+
+    async def respond_with_rank(
+        self,
+        inter: Inter,
+        member: discord.Member=None,
+        scope: Scopes=Scopes.Server,
+        style: RankStyles=RankStyles.Card
+    ):
         """Respond with the rank of the member to an interaction,
         or the user who invoked the interaction if no member is provided
 
         Args:
             inter (Inter): The interaction
             member (discord.Member, None): The member or NoneType
+            scope (Scopes): Whether to respond with the guild or global rank
+            style (RankStyles): The rank card, or the members ranked around them
         """
 
         member = member or inter.user
@@ -70,13 +222,23 @@ class CommandsCog(commands.Cog, name="Score Commands"):
             await inter.response.send_message("Bots don't have ranks :(")
             return
 
-        # The member object from the interaction doesn't have the status
-        # data, so we must get a new member object from the guild
-        member = member.guild.get_member(member.id)
+        # Don't make the member wait on a queue that can't take the job
+        if self.renderer.saturated:
+            await inter.response.send_message(embed=self.get_rank_embed(member, scope))
+            return
 
         await inter.response.defer(thinking=True)
 
-        rank_image_file = await self.get_rank(member)
+        self.bot.prewarmer.note_rank(member)
+        get_image = self.get_rank_context if style is RankStyles.Context else self.get_rank
+        rank_image_file, note = await self.render(
+            lambda: get_image(member, scope), RenderPriority.INTERACTION_RANK
+        )
+
+        if rank_image_file is None:
+            await inter.followup.send(embed=self.get_rank_embed(member, scope, note))
+            return
+
         await inter.followup.send(file=rank_image_file)
 
     async def _rank_context_menu(self, inter: Inter, member: discord.Member=None):
@@ -85,10 +247,21 @@ class CommandsCog(commands.Cog, name="Score Commands"):
         await self.respond_with_rank(inter, member)
 
     @app_commands.command(name="rank")
-    async def _rank(self, inter: Inter, member: discord.Member=None):
-        """Get the user's rank"""
+    async def _rank(
+        self,
+        inter: Inter,
+        member: discord.Member=None,
+        scope: Scopes=Scopes.Server,
+        style: RankStyles=RankStyles.Card
+    ):
+        """Get the user's rank
 
-        await self.respond_with_rank(inter, member)
+        Args:
+            scope (Scopes): Rank in this server or across all servers
+            style (RankStyles): The rank card, or the members ranked just above and below
+        """
+
+        await self.respond_with_rank(inter, member, scope, style)
 
     @app_commands.command(name="level")
     async def _level(self, inter: Inter, member: discord.Member=None):
@@ -110,73 +283,196 @@ class CommandsCog(commands.Cog, name="Score Commands"):
         if member.bot:
             return await ctx.reply("Bots don't have ranks :(")
 
-        rank_image_file = await self.get_rank(member or ctx.author)
+        self.bot.prewarmer.note_rank(member)
+        rank_image_file, note = await self.render(
+            lambda: self.get_rank(member), RenderPriority.COMMAND_RANK
+        )
+
+        if rank_image_file is None:
+            return await ctx.reply(embed=self.get_rank_embed(member, note=note))
+
         await ctx.reply(file=rank_image_file)
 
-    async def get_scoreboard(self, guild: discord.Guild):
-        """Get the scoreboard of the guild
+    def get_scoreboard_scores(
+        self,
+        guild: discord.Guild,
+        limit: int=GRID_SCOREBOARD_SIZE
+    ) -> list[ScoreObject]:
+        """Get the highest scores of the guild
 
         Args:
-            guild (discord.Guild): The guild
+            guild (discord.Guild, None): The guild, or None for the global scores
+            limit (int): The maximum amount of scores
 
         Returns:
-            discord.File: The scoreboard image
+            list[ScoreObject]: The scores, highest first
         """
 
-        scores = db.records(
-            "SELECT member_id, score FROM scores "
-            "WHERE guild_id = ? AND active = 1 "
-            "ORDER BY score DESC LIMIT 30",
-            guild.id
+        # The rows come back in rank order, so no rank queries are needed
+        if guild is None:
+            return ScoreObject.ranked(self.storage.global_top(limit), None)
+
+        return ScoreObject.ranked(
+            self.storage.top(guild.id, limit), guild.id, curve=self.get_curve(guild.id)
         )
 
-        members_and_scores = [
-            (
-                guild.get_member(member_id),
-                ScoreObject(member_id, guild.id, score)
-            )
-            for member_id, score in scores
+    async def fetch_members(
+        self,
+        guild: discord.Guild,
+        scores: list[ScoreObject]
+    ) -> list[tuple[discord.Member, ScoreObject]]:
+        """Get the members of scores, for drawing them
+
+        Args:
+            guild (discord.Guild, None): The guild, or None for global scores
+            scores (list[ScoreObject]): The scores
+
+        Returns:
+            list[tuple[discord.Member, ScoreObject]]: The members and their
+                scores, without anyone who couldn't be found
+        """
+
+        member_ids = [score.member_id for score in scores]
+
+        if guild is None:
+            members = await self.bot.member_cache.fetch_users(member_ids)
+        else:
+            members = await self.bot.member_cache.fetch_many(guild, member_ids)
+
+        # Skip anyone who left without the bot noticing
+        return [
+            (members[score.member_id], score)
+            for score in scores if score.member_id in members
         ]
 
-        scoreboard_image_editor = GridScoreboardEditor(members_and_scores)
+    async def get_scoreboard(
+        self,
+        guild: discord.Guild,
+        style: ScoreboardStyles=ScoreboardStyles.Grid
+    ):
+        """Get the scoreboard of the guild
+
+        Args:
+            guild (discord.Guild, None): The guild, or None for the global scoreboard
+            style (ScoreboardStyles): Member cards in a grid, or compact rows
+
+        Returns:
+            discord.File: The scoreboard image
+        """
+
+        from image import GridScoreboardEditor, ListScoreboardEditor  # pylint: disable=C0415
+
+        if style is ScoreboardStyles.List:
+            editor_class, limit = ListScoreboardEditor, LIST_SCOREBOARD_SIZE
+        else:
+            editor_class, limit = GridScoreboardEditor, GRID_SCOREBOARD_SIZE
+
+        scores = self.get_scoreboard_scores(guild, limit)
+        members_and_scores = await self.fetch_members(guild, scores)
+
+        scoreboard_image_editor = editor_class(members_and_scores, guild)
         await scoreboard_image_editor.draw()
         return scoreboard_image_editor.to_file()
 
-    async def respond_with_scoreboard(self, inter: Inter, guild: discord.Guild):
+    def get_scoreboard_embed(self, guild: discord.Guild, note: str=BUSY_NOTE) -> discord.Embed:
+        """Get a text version of the scoreboard, used when the image can't be drawn
+
+        Args:
+            guild (discord.Guild, None): The guild, or None for the global scoreboard
+            note (str): Why there's no image
+
+        Returns:
+            discord.Embed: The scoreboard embed
+        """
+
+        lines = [
+            f"**#{score.rank}** <@{score.member_id}> - Level {int(score.level)}"
+            for score in self.get_scoreboard_scores(guild, limit=10)
+        ]
+
+        title = "Global Scoreboard" if guild is None else guild.name
+        embed = discord.Embed(title=title, description="\n".join(lines))
+        embed.set_footer(text=note)
+        return embed
+
+    async def respond_with_scoreboard(
+        self,
+        inter: Inter,
+        guild: discord.Guild,
+        style: ScoreboardStyles=ScoreboardStyles.Grid
+    ):
         """Respond with the scoreboard of the guild to an interaction
 
         Args:
             inter (Inter): The interaction
-            guild (discord.Guild): The guild
-            style (ScoreboardStyles): The style of the scoreboard
+            guild (discord.Guild, None): The guild, or None for the global scoreboard
+            style (ScoreboardStyles): Member cards in a grid, or compact rows
         """
 
+        # Don't make the member wait on a queue that can't take the job
+        if self.renderer.saturated:
+            await inter.response.send_message(embed=self.get_scoreboard_embed(guild))
+            return
+
         await inter.response.defer(thinking=True)
 
-        scoreboard_image_file = await self.get_scoreboard(guild)
+        scoreboard_image_file, note = await self.render(
+            lambda: self.get_scoreboard(guild, style), RenderPriority.INTERACTION_SCOREBOARD
+        )
+
+        if scoreboard_image_file is None:
+            await inter.followup.send(embed=self.get_scoreboard_embed(guild, note))
+            return
+
         await inter.followup.send(file=scoreboard_image_file)
 
     @app_commands.command(name="scoreboard")
-    async def _scoreboard(self, inter: Inter):
+    async def _scoreboard(
+        self,
+        inter: Inter,
+        scope: Scopes=Scopes.Server,
+        style: ScoreboardStyles=ScoreboardStyles.Grid
+    ):
         """Get the scoreboard of the guild
 
         Args:
-            style (ScoreboardStyles): The style of the scoreboard
+            scope (Scopes): Scoreboard of this server or across all servers
+            style (ScoreboardStyles): Member cards in a grid, or a longer compact list
         """
 
-        await self.respond_with_scoreboard(inter, inter.guild)
+        guild = None if scope is Scopes.Global else inter.guild
+        await self.respond_with_scoreboard(inter, guild, style)
 
     @app_commands.command(name="leaderboard")
-    async def _leaderboard(self, inter: Inter):
-        """Get the scoreboard of the guild | Alias for `/scoreboard`"""
+    async def _leaderboard(
+        self,
+        inter: Inter,
+        scope: Scopes=Scopes.Server,
+        style: ScoreboardStyles=ScoreboardStyles.Grid
+    ):
+        """Get the scoreboard of the guild | Alias for `/scoreboard`
 
-        await self.respond_with_scoreboard(inter, inter.guild)
+        Args:
+            scope (Scopes): Scoreboard of this server or across all servers
+            style (ScoreboardStyles): Member cards in a grid, or a longer compact list
+        """
+
+        guild = None if scope is Scopes.Global else inter.guild
+        await self.respond_with_scoreboard(inter, guild, style)
 
     @commands.command(name="scoreboard", aliases=["leaderboard", "lb", "sb"])
-    async def _scoreboard_normal_cmd(self, ctx: commands.Context):
-        """Get the scoreboard of the guild"""
+    async def _scoreboard_normal_cmd(self, ctx: commands.Context, style: str="grid"):
+        """Get the scoreboard of the guild, `list` for the compact style"""
+
+        style = ScoreboardStyles.List if style.lower() == "list" else ScoreboardStyles.Grid
+
+        scoreboard_image_file, note = await self.render(
+            lambda: self.get_scoreboard(ctx.guild, style), RenderPriority.COMMAND_SCOREBOARD
+        )
+
+        if scoreboard_image_file is None:
+            return await ctx.reply(embed=self.get_scoreboard_embed(ctx.guild, note))
 
-        scoreboard_image_file = await self.get_scoreboard(ctx.guild)
         await ctx.reply(file=scoreboard_image_file)
 
     @app_commands.command(name="help")
@@ -1,13 +1,22 @@
 """Extension for the bot commands"""
 
+import asyncio
 import logging
-import sqlite3
+from time import time
 
 import discord
-from discord.ext import commands
-from discord.utils import get
-
-from db import db
+from discord.ext import commands, tasks
+
+from db import get_storage
+from constants import (
+    LOW_MEMORY_MEMBERS,
+    ARCHIVE_AFTER_DAYS,
+    ARCHIVE_INTERVAL_HOURS,
+    ARCHIVE_BATCH_SIZE,
+    ARCHIVE_BATCH_PAUSE
+)
+from cooldown import CooldownWheel
+from rewards import LevelUp, RewardQueue
 
 log = logging.getLogger(__name__)
 
@@ -18,6 +27,21 @@ class ListenersCog(commands.Cog, name="Event Listeners"):
     def __init__(self, bot: commands.Bot):
         super().__init__()
         self.bot = bot
+        self.storage = get_storage()
+        self.reconciliation: asyncio.Task = None
+        self.cooldown = CooldownWheel()
+        self.rewards = RewardQueue()
+
+    async def cog_load(self) -> None:
+        """Start the reward queue when the cog is loaded"""
+
+        self.rewards.start()
+
+    async def cog_unload(self) -> None:
+        """Stop the reward queue and archiving when the cog is unloaded"""
+
+        self.archive_departed.cancel()  # pylint: disable=E1101
+        await self.rewards.stop()
 
     def add_member(self, member_id: int, guild_id: int) -> None:
         """Add a member to the database
@@ -28,18 +52,7 @@ class ListenersCog(commands.Cog, name="Event Listeners"):
         """
 
         log.debug("Adding member %s to the database", member_id)
-        try:
-            db.execute(
-                "INSERT INTO scores (member_id, guild_id) VALUES (?, ?)",
-                member_id, guild_id
-            )
-        except sqlite3.IntegrityError:
-            log.debug("Activating existing member %s", member_id)
-            db.execute(
-                "UPDATE scores SET active = 1 "
-                "WHERE member_id = ? AND guild_id = ?",
-                member_id, guild_id
-            )
+        self.storage.upsert_member(member_id, guild_id)
 
     def add_guild_members(self, guild_id) -> None:
         """Add all members in a guild to the database
@@ -48,17 +61,23 @@ class ListenersCog(commands.Cog, name="Event Listeners"):
             guild_id (int): The guild's ID
         """
 
+        # There's no member list to go through without the member cache,
+        # members are added as they are seen instead
+        if LOW_MEMORY_MEMBERS:
+            return
+
         log.debug("Adding all members in guild %s to the database", guild_id)
         guild = self.bot.get_guild(guild_id)
         for member in guild.members:
             self.add_member(member.id, guild_id)
 
-    def add_all_members(self) -> None:
+    async def add_all_members(self) -> None:
         """Add all members in all guilds to the database"""
 
         log.debug("Adding all members in all guilds to the database")
         for guild in self.bot.guilds:
             self.add_guild_members(guild.id)
+            await asyncio.sleep(0)  # let other events through between guilds
 
     def remove_member(self, member_id: int, guild_id: int) -> None:
         """Deactivate a member in the database
@@ -69,11 +88,7 @@ class ListenersCog(commands.Cog, name="Event Listeners"):
         """
 
         log.debug("Deactivating member %s from the database", member_id)
-        db.execute(
-            "UPDATE scores SET active = 0 "
-            "WHERE member_id = ? AND guild_id = ?",
-            member_id, guild_id
-        )
+        self.storage.set_active(member_id, guild_id, False)
 
     def remove_guild_members(self, guild_id: int) -> None:
         """Deactivate all members in a guild in the database
@@ -83,45 +98,77 @@ class ListenersCog(commands.Cog, name="Event Listeners"):
         """
 
         log.debug("Deactivating all members in guild %s from the database", guild_id)
-        db.execute(
-            "UPDATE scores SET active = 0 "
-            "WHERE guild_id = ?",
-            guild_id
-        )
+        self.storage.set_guild_active(guild_id, False)
 
     async def validate_existing_members(self) -> None:
         """Validates members in database are in the assigned guild"""
 
         log.debug("Validating all members in the database")
 
-        members_data = db.records("SELECT member_id, active FROM scores")
+        for i, (member_id, guild_id, active) in enumerate(self.storage.iter_members()):
+
+            # Yield to the event loop regularly, this can be a lot of rows
+            if i % 1000 == 0:
+                await asyncio.sleep(0)
+
+            if (guild := self.bot.get_guild(guild_id)) is None:
+                continue
+
+            member_exists = guild.get_member(member_id) is not None
+
+            # If the member is in the guild and not active - reactivate them
+            if member_exists and not active:
+                log.debug("activating member %s", member_id)
+                self.storage.set_active(member_id, guild_id, True)
+
+            # If the member is NOT in the guild and active - deactivate them
+            elif not member_exists and active:
+                log.debug("deactivating member %s", member_id)
+                self.storage.set_active(member_id, guild_id, False)
+
+    async def reconcile_members(self) -> None:
+        """Bring the database in line with the guilds' member lists
+
+        This is the last phase of startup, so the startup timings are
+        reported once it's done.
+        """
+
+        if LOW_MEMORY_MEMBERS:
+            log.info("Member cache disabled, skipping member reconciliation")
+        else:
+            with self.bot.startup.phase("member reconciliation"):
+                await self.add_all_members()
+                await self.validate_existing_members()
+
+        self.bot.startup.report()
+
+    @tasks.loop(hours=ARCHIVE_INTERVAL_HOURS)
+    async def archive_departed(self) -> None:
+        """Archive members who left long ago, and members of guilds the bot left
+
+        Runs in small batches so the writer is never held for long. Only
+        inactive members are archived, and they get their score back if
+        they're seen again, so a wrong guild list can't lose anything.
+        """
 
-        for member_id, active in members_data:
-            for guild in self.bot.guilds:
+        departed_before = time() - ARCHIVE_AFTER_DAYS * 24 * 60 * 60
+        guild_ids = [guild.id for guild in self.bot.guilds]
+        archived = 0
 
-                log.debug("checking guild %s", guild.name)
-                member_exists = bool(get(guild.members, id=member_id))
+        while moved := self.storage.archive(departed_before, guild_ids, ARCHIVE_BATCH_SIZE):
+            self.storage.commit()
+            archived += moved
+            await asyncio.sleep(ARCHIVE_BATCH_PAUSE)
 
-                # If the member is in the guild and not active - reactivate them
-                if member_exists and not active:
-                    log.debug("activating member %s", member_id)
-                    db.execute(
-                        "UPDATE scores SET active = 1 "
-                        "WHERE member_id = ? AND guild_id = ?",
-                        member_id, guild.id
-                    )
+        if archived:
+            log.info("Archived %s departed members", archived)
 
-                # If the member is NOT in the guild and active - deactivate them
-                elif not member_exists and active:
-                    log.debug("deactivating member %s", member_id)
-                    db.execute(
-                        "UPDATE scores SET active = 0 "
-                        "WHERE member_id = ? AND guild_id = ?",
-                        member_id, guild.id
-                    )
+    @archive_departed.before_loop
+    async def before_archive_departed(self) -> None:
+        """Wait for reconciliation, so members who left while offline are known"""
 
-                else:
-                    log.debug("not changing anything for member %s", member_id)
+        if self.reconciliation is not None:
+            await self.reconciliation
 
     @commands.Cog.listener()
     async def on_member_join(self, member) -> None:
@@ -131,10 +178,15 @@ class ListenersCog(commands.Cog, name="Event Listeners"):
             self.add_member(member.id, member.guild.id)
 
     @commands.Cog.listener()
-    async def on_member_remove(self, member) -> None:
-        """When a member leaves a guild"""
+    async def on_raw_member_remove(self, payload: discord.RawMemberRemoveEvent) -> None:
+        """When a member leaves a guild, cached or not
+
+        on_member_remove is only dispatched for members in discord.py's
+        member cache, which is empty in low memory mode.
+        """
 
-        self.remove_member(member.id, member.guild.id)
+        self.remove_member(payload.user.id, payload.guild_id)
+        self.bot.member_cache.discard(payload.guild_id, payload.user.id)
 
     @commands.Cog.listener()
     async def on_guild_join(self, guild) -> None:
@@ -152,24 +204,68 @@ class ListenersCog(commands.Cog, name="Event Listeners"):
     async def on_message(self, message: discord.Message) -> None:
         """When a message is sent"""
 
-        if message.author.bot:
+        if message.author.bot or message.guild is None:
+            return
+
+        # Compiled rules are cached, so this doesn't query the database
+        rules = self.bot.xp_rules.get(message.guild.id)
+        if not (xp := rules.evaluate(message.channel, message.author)):
             return
 
-        log.debug("Adding score to member %s", message.author.id)
-        db.execute(
-            "UPDATE scores SET score = score + 30 "
-            "WHERE member_id = ? AND guild_id = ?",
-            message.author.id, message.guild.id
-        )
+        # Spam within the cooldown window never reaches the database
+        if not self.cooldown.hit(message.author.id, message.guild.id):
+            return
+
+        log.debug("Adding %s score to member %s", xp, message.author.id)
+
+        # Upsert, the member may not have a row yet if they joined while
+        # the bot was offline or the member cache is disabled
+        total = self.storage.increment(message.author.id, message.guild.id, xp)
+        self.bot.prewarmer.note_guild(message.guild.id)
+
+        # The old total is known from the increment, no need to read it back
+        old_level, new_level = rules.curve.levels((total - xp, total))
+
+        if new_level > old_level:
+            self.level_up(message, rules, old_level, new_level)
+
+    def level_up(self, message: discord.Message, rules, old_level: int, new_level: int) -> None:
+        """Queue the rewards and announcement for a member's level up
+
+        Args:
+            message (discord.Message): The message that levelled the member up
+            rules (XPRules): The guild's compiled rules
+            old_level (int): The level before the message
+            new_level (int): The level after the message
+        """
+
+        log.debug("Member %s reached level %s", message.author.id, new_level)
+
+        role_ids = rules.rewards_between(old_level, new_level)
+        if not role_ids and not rules.announce:
+            return
+
+        self.rewards.put(LevelUp(
+            message.author,
+            message.channel,
+            old_level,
+            new_level,
+            role_ids,
+            rules.announce,
+            rules.announce_channel_id
+        ))
 
     @commands.Cog.listener()
     async def on_ready(self):
         """Called when the bot is ready"""
 
         log.info("Cog %s is ready", self.qualified_name)
-        await self.bot.wait_until_ready()
-        self.add_all_members()
-        await self.validate_existing_members()
+
+        # Reconcile once per process in the background, on_ready is also
+        # called on reconnects and shouldn't hold up other listeners
+        if self.reconciliation is None:
+            self.reconciliation = asyncio.create_task(self.reconcile_members())
+            self.archive_departed.start()  # pylint: disable=E1101
 
 
 async def setup(bot: commands.Bot) -> None:
@@ -0,0 +1,235 @@
+"""Extension for the guild settings commands"""
+
+import logging
+
+import discord
+from discord import (
+    app_commands,
+    Interaction as Inter
+)
+from discord.ext import commands
+
+from constants import LevelCurves
+
+log = logging.getLogger(__name__)
+
+
+class SettingsCog(commands.Cog, name="Guild Settings"):
+    """Cog for commands that configure the bot in a guild"""
+
+    xp = app_commands.Group(
+        name="xp",
+        description="Configure how much XP messages are worth",
+        guild_only=True,
+        default_permissions=discord.Permissions(manage_guild=True)
+    )
+
+    def __init__(self, bot: commands.Bot):
+        super().__init__()
+        self.bot = bot
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """Called when the bot is ready"""
+
+        log.info("Cog %s is ready", self.qualified_name)
+
+    @xp.command(name="base")
+    async def _xp_base(
+        self,
+        inter: Inter,
+        base_xp: app_commands.Range[int, 0, 10000],
+        random_min: app_commands.Range[int, 0, 10000]=0,
+        random_max: app_commands.Range[int, 0, 10000]=0
+    ):
+        """Set the XP every message gets, with an optional random bonus
+
+        Args:
+            base_xp (int): The XP every message gets
+            random_min (int): The smallest random bonus
+            random_max (int): The largest random bonus, 0 for no bonus
+        """
+
+        if random_max < random_min:
+            await inter.response.send_message(
+                "The largest bonus can't be smaller than the smallest", ephemeral=True
+            )
+            return
+
+        self.bot.xp_rules.set_base_xp(inter.guild.id, base_xp, random_min, random_max)
+        await inter.response.send_message(
+            f"Messages are now worth {base_xp} XP"
+            + (f" plus {random_min}-{random_max} bonus XP" if random_max else ""),
+            ephemeral=True
+        )
+
+    @xp.command(name="channel")
+    async def _xp_channel(
+        self,
+        inter: Inter,
+        channel: discord.abc.GuildChannel,
+        multiplier: app_commands.Range[float, 0, 100]
+    ):
+        """Multiply the XP of messages in a channel, 1 to reset
+
+        Args:
+            channel (discord.abc.GuildChannel): The channel
+            multiplier (float): The multiplier
+        """
+
+        self.bot.xp_rules.set_channel_multiplier(inter.guild.id, channel.id, multiplier)
+        await inter.response.send_message(
+            f"Messages in {channel.mention} now get {multiplier}x XP", ephemeral=True
+        )
+
+    @xp.command(name="role")
+    async def _xp_role(
+        self,
+        inter: Inter,
+        role: discord.Role,
+        multiplier: app_commands.Range[float, 0, 100]
+    ):
+        """Multiply the XP of members with a role, 1 to reset
+
+        Args:
+            role (discord.Role): The role
+            multiplier (float): The multiplier
+        """
+
+        self.bot.xp_rules.set_role_multiplier(inter.guild.id, role.id, multiplier)
+        await inter.response.send_message(
+            f"Members with {role.mention} now get {multiplier}x XP", ephemeral=True
+        )
+
+    @xp.command(name="reward")
+    async def _xp_reward(
+        self,
+        inter: Inter,
+        level: app_commands.Range[int, 1, 1000],
+        role: discord.Role,
+        rewarded: bool=True
+    ):
+        """Give members a role when they reach a level
+
+        Args:
+            level (int): The level
+            role (discord.Role): The role to give
+            rewarded (bool): False to stop giving the role
+        """
+
+        self.bot.xp_rules.set_level_reward(inter.guild.id, level, role.id, rewarded)
+        await inter.response.send_message(
+            f"Members {'now get' if rewarded else 'no longer get'} {role.mention} "
+            f"at level {level}",
+            ephemeral=True
+        )
+
+    @xp.command(name="announce")
+    async def _xp_announce(
+        self,
+        inter: Inter,
+        enabled: bool,
+        channel: discord.TextChannel=None
+    ):
+        """Announce when members level up
+
+        Args:
+            enabled (bool): Whether to announce level ups
+            channel (discord.TextChannel): Where to announce, defaults to where
+                the member sent the message
+        """
+
+        self.bot.xp_rules.set_announcements(
+            inter.guild.id, enabled, channel.id if channel else None
+        )
+
+        if not enabled:
+            await inter.response.send_message("Level ups are no longer announced", ephemeral=True)
+            return
+
+        where = channel.mention if channel else "the channel the member is talking in"
+        await inter.response.send_message(f"Level ups are now announced in {where}", ephemeral=True)
+
+    @xp.command(name="curve")
+    async def _xp_curve(self, inter: Inter, curve: LevelCurves, value: str=None):
+        """Change how much XP each level takes
+
+        Args:
+            curve (LevelCurves): Quadratic levels take more XP as they go up,
+                linear ones take the same, a table lists them
+            value (str): The quadratic factor, the XP per level, or the XP
+                levels from 2 start at separated by commas
+        """
+
+        try:
+            self.bot.xp_rules.set_level_curve(inter.guild.id, curve.name.lower(), value)
+        except ValueError as error:
+            await inter.response.send_message(f"That isn't a level curve: {error}", ephemeral=True)
+            return
+
+        rules = self.bot.xp_rules.get(inter.guild.id)
+        await inter.response.send_message(f"Levels now follow: {rules.curve}", ephemeral=True)
+
+    @xp.command(name="ignore")
+    async def _xp_ignore(self, inter: Inter, channel: discord.abc.GuildChannel, ignored: bool=True):
+        """Stop or start giving XP for messages in a channel
+
+        Args:
+            channel (discord.abc.GuildChannel): The channel
+            ignored (bool): Whether to ignore the channel
+        """
+
+        self.bot.xp_rules.set_ignored(inter.guild.id, channel.id, ignored)
+        await inter.response.send_message(
+            f"Messages in {channel.mention} are now "
+            + ("ignored" if ignored else "scored"),
+            ephemeral=True
+        )
+
+    @xp.command(name="show")
+    async def _xp_show(self, inter: Inter):
+        """Show this server's XP rules"""
+
+        rules = self.bot.xp_rules.get(inter.guild.id)
+
+        embed = discord.Embed(title="XP Rules")
+        embed.add_field(
+            name="Per message",
+            value=f"{rules.base_xp} XP"
+            + (f" + {rules.random_min}-{rules.random_max}" if rules.random_max else ""),
+            inline=False
+        )
+        embed.add_field(name="Level curve", value=str(rules.curve), inline=False)
+        embed.add_field(
+            name="Channels",
+            value="\n".join(
+                f"<#{channel_id}> {multiplier}x"
+                for channel_id, multiplier in rules.channel_multipliers.items()
+            ) or "None",
+        )
+        embed.add_field(
+            name="Roles",
+            value="\n".join(
+                f"<@&{role_id}> {multiplier}x"
+                for role_id, multiplier in rules.role_multipliers.items()
+            ) or "None",
+        )
+        embed.add_field(
+            name="Ignored",
+            value="\n".join(f"<#{channel_id}>" for channel_id in rules.ignored_channels) or "None",
+        )
+        embed.add_field(
+            name="Rewards",
+            value="\n".join(
+                f"Level {level}: " + " ".join(f"<@&{role_id}>" for role_id in role_ids)
+                for level, role_ids in sorted(rules.level_rewards.items())
+            ) or "None",
+        )
+
+        await inter.response.send_message(embed=embed, ephemeral=True)
+
+
+async def setup(bot: commands.Bot) -> None:
+    """Setup the cog"""
+
+    await bot.add_cog(SettingsCog(bot))
@@ -1,18 +1,23 @@
 """Draw images to send to the user"""
 
+import io
 import logging
 import asyncio
+import threading
+from collections import OrderedDict
 from functools import cache
+from contextlib import contextmanager
 from abc import ABC, abstractmethod
-from threading import Thread, Lock
 from math import ceil
 
+import aiohttp
 from discord import Status, Colour, File, Member, Guild
 from easy_pil import Editor, Canvas, Text, load_image_async
-from PIL import Image
+from PIL import Image, ImageChops, ImageDraw
 
 from utils import humanize_number
 from score import ScoreObject
+from scheduler import RenderTooLarge
 from constants import (
     WHITE,
     BLACK,
@@ -21,17 +26,25 @@ from constants import (
     POPPINS,
     POPPINS_LARGE,
     POPPINS_SMALL,
+    POPPINS_XSMALL,
     COL_WIDTH,
     COL_HEIGHT,
     HEAD_HEIGHT,
     MARGIN,
     SHADOW_OFFSET_X,
-    SHADOW_OFFSET_Y
+    SHADOW_OFFSET_Y,
+    LIST_WIDTH,
+    LIST_ROW_HEIGHT,
+    LIST_HEAD_HEIGHT,
+    LIST_MARGIN,
+    LIST_AVATAR_SIZE,
+    SCOREBOARD_MEMORY_LIMIT,
+    AVATAR_CACHE_BYTES,
+    TILE_CACHE_BYTES
 )
 
 
 log = logging.getLogger(__name__)
-lock = Lock()
 
 @cache
 def get_status(status, /) -> tuple[Colour, Editor, tuple[int, int]]:
@@ -111,6 +124,184 @@ class ImageEditor(Editor, ABC):
         )
 
 
+def rgba_bytes(size: tuple[int, int]) -> int:
+    """Get the size of an RGBA image's pixels
+
+    Args:
+        size (tuple[int, int]): The width and height
+
+    Returns:
+        int: The size in bytes
+    """
+
+    return size[0] * size[1] * 4
+
+
+class RenderBudget:
+    """Keeps count of the image memory a render holds
+
+    Pillow allocates pixels outside of Python's allocator, so a render
+    reserves the size of its images here before making them, and is
+    stopped before it goes over its limit.
+    """
+
+    __slots__ = ("limit", "used", "peak")
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self.peak = 0
+
+    def reserve(self, size: int) -> None:
+        """Reserve memory for an image
+
+        Args:
+            size (int): The size in bytes
+
+        Raises:
+            RenderTooLarge: The render would go over its limit
+        """
+
+        if self.used + size > self.limit:
+            raise RenderTooLarge(
+                f"Render needs {self.used + size} bytes, the limit is {self.limit}"
+            )
+
+        self.used += size
+        self.peak = max(self.peak, self.used)
+
+    def release(self, size: int) -> None:
+        """Give back memory reserved for an image that was freed
+
+        Args:
+            size (int): The size in bytes
+        """
+
+        self.used -= size
+
+    @contextmanager
+    def hold(self, size: int):
+        """Reserve memory for the images made inside the block
+
+        Args:
+            size (int): The size in bytes
+        """
+
+        self.reserve(size)
+        try:
+            yield
+        finally:
+            self.release(size)
+
+
+class BytesCache:
+    """An LRU cache of encoded images, bounded by their total size
+
+    Shared by the render threads, the prewarm thread and the event loop,
+    which all read and evict entries, so every access to the entries takes
+    the lock. Images are kept encoded, a decoded avatar or column is many
+    times larger.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.size = 0
+        self.entries: OrderedDict[object, bytes] = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.entries)
+
+    def __contains__(self, key) -> bool:
+        with self.lock:
+            return key in self.entries
+
+    def get(self, key) -> bytes | None:
+        """Get an entry and mark it as recently used
+
+        Args:
+            key: The entry's key
+
+        Returns:
+            bytes, None: The entry, or None if it isn't cached
+        """
+
+        with self.lock:
+            if (data := self.entries.get(key)) is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return data
+
+    def put(self, key, data: bytes) -> None:
+        """Cache an entry, evicting the least recently used ones to make room
+
+        Args:
+            key: The entry's key
+            data (bytes): The encoded image
+        """
+
+        if len(data) > self.limit:
+            return
+
+        with self.lock:
+            if (old := self.entries.pop(key, None)) is not None:
+                self.size -= len(old)
+
+            self.entries[key] = data
+            self.size += len(data)
+
+            while self.size > self.limit:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+# Downloaded avatars by URL, and drawn grid columns by MemberColumn.tile_key
+avatar_cache = BytesCache(AVATAR_CACHE_BYTES)
+tile_cache = BytesCache(TILE_CACHE_BYTES)
+
+
+async def fetch_avatar(url: str) -> bytes:
+    """Download an avatar into the cache
+
+    Args:
+        url (str): The avatar's URL
+
+    Returns:
+        bytes: The encoded avatar
+    """
+
+    # A session per download, render threads each run their own loop
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as response:
+            data = await response.read()
+
+    avatar_cache.put(url, data)
+    return data
+
+
+async def load_avatar(url: str) -> Image.Image:
+    """Get an avatar, downloading it only if it isn't cached
+
+    Args:
+        url (str): The avatar's URL
+
+    Returns:
+        Image.Image: The decoded avatar, in RGBA
+    """
+
+    if (data := avatar_cache.get(url)) is None:
+        data = await fetch_avatar(url)
+
+    return Image.open(io.BytesIO(data)).convert("RGBA")
+
+
 class ScoreboardEditor(ImageEditor, ABC):
     """The image editor for the scoreboard image"""
 
@@ -136,15 +327,25 @@ class ScoreboardEditor(ImageEditor, ABC):
 class GridScoreboardEditor(ScoreboardEditor):
     """The image editor for the grid scoreboard image"""
 
-    __slots__ = ("members_and_scores", )
+    __slots__ = ("members_and_scores", "guild", "full_size", "budget")
     MAX_COLS = 6
 
-    def __init__(self, members_and_scores: list[tuple[Member, ScoreObject]]):
+    # Drawing a column also needs a blank copy of it and the composite of
+    # the two for every paste, on top of the column itself
+    COLUMN_OVERHEAD = 3
+
+    def __init__(
+        self,
+        members_and_scores: list[tuple[Member, ScoreObject]],
+        guild: Guild=None,
+        memory_limit: int=SCOREBOARD_MEMORY_LIMIT
+    ):
 
         if not members_and_scores:
             raise ValueError("members_and_scores cannot be empty")
 
         self.members_and_scores = members_and_scores
+        self.guild = guild
 
         width = MARGIN + (
             (COL_WIDTH + MARGIN) *
@@ -155,7 +356,13 @@ class GridScoreboardEditor(ScoreboardEditor):
             ceil(len(members_and_scores) / self.MAX_COLS)
         )
 
-        canvas = Canvas((width, height))
+        # Only the final 1x image spans the whole scoreboard, rows are drawn
+        # at 2x one strip at a time and scaled down into it
+        self.full_size = (width, height)
+        self.budget = RenderBudget(memory_limit)
+        self.budget.reserve(rgba_bytes((width // 2, height // 2)))
+
+        canvas = Canvas((width // 2, height // 2))
         super().__init__(canvas)
 
     async def draw(self) -> None:
@@ -163,68 +370,112 @@ class GridScoreboardEditor(ScoreboardEditor):
 
         log.debug("drawing grid scoreboard")
 
-        # Position of the first column
-        x_position = MARGIN
-        y_position = HEAD_HEIGHT + MARGIN
-
-        # list of threads and list of thread results
-        thread_queue = []
-        drawn_members: list[Editor, tuple[int, int]] = []
+        width = self.full_size[0]
+        row_height = COL_HEIGHT + MARGIN
+        column_size = (COL_WIDTH + (SHADOW_OFFSET_X * -1), COL_HEIGHT + SHADOW_OFFSET_Y)
+
+        # A strip at 2x, and the copy it's scaled down to
+        strip_cost = rgba_bytes((width, row_height)) + rgba_bytes((width // 2, row_height // 2))
+        column_cost = rgba_bytes(column_size) * self.COLUMN_OVERHEAD
+
+        # Draw as many columns at once as the budget has room for
+        room = self.budget.limit - self.budget.used - strip_cost
+        workers = min(self.MAX_COLS, room // column_cost)
+        if workers < 1:
+            raise RenderTooLarge(
+                f"A grid row needs {strip_cost + column_cost} bytes, "
+                f"{max(room + strip_cost, 0)} are left of the {self.budget.limit} limit"
+            )
 
-        def between_callback(position, *args):
+        def between_callback(*args):
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
 
-            member_image = loop.run_until_complete(self.draw_member(*args))
-            loop.close()
-            drawn_members.append((member_image, position))
-
-        # iterate over the members and create a new thread of each one
-        # each thread will draw the member and append it to the drawn_members list
-
-        for i, (member, score) in enumerate(self.members_and_scores):
+            try:
+                return loop.run_until_complete(self.draw_member(*args))
+            finally:
+                loop.close()
 
-            position = (x_position, y_position)
-            thread = Thread(target=between_callback, args=(position, member, score))
-            thread_queue.append(thread)
-
-            # calculate the position for the next member in the loop
-
-            i += 1  # i is 0 indexed
+        # Draw the header if the scoreboard is wide enough
+        if width > COL_WIDTH * 2:
+            with self.budget.hold(strip_cost):
+                header = await self.draw_header(self.guild)
+                self.paste_strip(header, 0)
+                del header
+
+        members_and_scores = self.members_and_scores
+        for row_start in range(0, len(members_and_scores), self.MAX_COLS):
+            row = members_and_scores[row_start:row_start + self.MAX_COLS]
+
+            with self.budget.hold(strip_cost):
+                strip = Editor(Canvas((width, row_height)))
+
+                for group_start in range(0, len(row), workers):
+                    group = row[group_start:group_start + workers]
+
+                    # Each column is drawn on a thread with its own loop,
+                    # without blocking this one while they run
+                    with self.budget.hold(column_cost * len(group)):
+                        columns = await asyncio.gather(*(
+                            asyncio.to_thread(between_callback, member, score)
+                            for member, score in group
+                        ))
+
+                        for i, column in enumerate(columns, start=group_start):
+                            x_position = MARGIN + ((COL_WIDTH + MARGIN) * i) + SHADOW_OFFSET_X
+                            strip.image.paste(column.image, (x_position, 0))
+
+                        del columns
+
+                y_position = HEAD_HEIGHT + MARGIN + (row_height * (row_start // self.MAX_COLS))
+                self.paste_strip(strip, y_position)
+                del strip
+
+        # Round the corners, the mask and alpha channels are a byte per pixel
+        with self.budget.hold(self.image.width * self.image.height * 3):
+            self.round_corners(10)
+
+        log.debug(
+            "drew grid scoreboard of %s members, peak %s bytes of a %s limit",
+            len(members_and_scores), self.budget.peak, self.budget.limit
+        )
 
-            # if the current column is the last column, move to the next row
-            if i % self.MAX_COLS == 0:
-                y_position += COL_HEIGHT + MARGIN
-                x_position = MARGIN
-                continue
+    def paste_strip(self, strip: Editor, y_position: int) -> None:
+        """Scale a 2x strip down and paste it onto the image
 
-            # otherwise, move to the next column
-            x_position += COL_WIDTH + MARGIN
+        Args:
+            strip (Editor): The strip, as wide as the 2x scoreboard
+            y_position (int): The top of the strip on the 2x scoreboard
+        """
 
-        # start all the threads and wait for them to finish
-        for thread in thread_queue:
-            thread.start()
-        for thread in thread_queue:
-            thread.join()
+        small = strip.image.resize(
+            (strip.image.width // 2, strip.image.height // 2),
+            Image.ANTIALIAS
+        )
+        self.image.paste(small, (0, y_position // 2))
 
-        # paste all completed member images onto the scoreboard
-        for member_image, position in drawn_members:
-            position = (position[0] + SHADOW_OFFSET_X, position[1])
-            self.paste(member_image, position)
+    def round_corners(self, radius: int) -> None:
+        """Round the corners of the image in place
 
-        # Draw the header if the scoreboard is wide enough
-        if self.image.width > COL_WIDTH * 2:
-            await self.draw_header(member.guild)  # pylint: disable=W0631
+        Args:
+            radius (int): The radius of the corners
+        """
 
-        # Round the corners and antialias the final image
-        self.rounded_corners(20)
-        self.antialias()
+        mask = Image.new("L", self.image.size, 0)
+        ImageDraw.Draw(mask).rounded_rectangle(
+            (1, 1, self.image.width - 1, self.image.height - 1), radius=radius, fill=255
+        )
+        self.image.putalpha(ImageChops.multiply(self.image.getchannel("A"), mask))
 
     async def draw_member(self, member: Member, score: ScoreObject) -> Editor:
         """Draw a certain member onto the scoreboard"""
 
         log.debug("drawing member %s", member)
 
+        # A column the prewarmer drew ahead of time only needs decoding
+        if (tile := tile_cache.get(MemberColumn.tile_key(member, score))) is not None:
+            return Editor(Image.open(io.BytesIO(tile)))
+
         # Create an editor for the member column
         width = COL_WIDTH + (SHADOW_OFFSET_X * -1)
         height = COL_HEIGHT + SHADOW_OFFSET_Y
@@ -233,35 +484,49 @@ class GridScoreboardEditor(ScoreboardEditor):
 
         return member_column
 
-    async def draw_header(self, guild:Guild) -> None:
-        """Draw the footer"""
+    async def draw_header(self, guild: Guild=None) -> Editor:
+        """Draw the header strip, with the guild's name or the global title
+
+        Returns:
+            Editor: The header at 2x, as wide as the 2x scoreboard
+        """
 
+        header = Editor(Canvas((self.full_size[0], HEAD_HEIGHT + MARGIN)))
         title_cordinates = (MARGIN, MARGIN + 35)
 
-        if guild.icon:
+        if guild is None:
+            title = "Global Scoreboard"
+            subtitle = f"Top {len(self.members_and_scores)} members across all servers"
+        else:
+            title = guild.name
+            subtitle = f"Showing {len(self.members_and_scores)} of {guild.member_count} members"
+
+        if guild and guild.icon:
             guild_icon = await load_image_async(guild.icon.url)
             guild_icon = Editor(guild_icon.resize((150, 150))).circle_image()
-            self.paste(guild_icon, (MARGIN, MARGIN))
+            header.image.paste(guild_icon.image, (MARGIN, MARGIN), guild_icon.image)
             title_cordinates = (150 + (MARGIN * 2), title_cordinates[1])
 
-        self.text(
+        header.text(
             title_cordinates,
-            f"{guild.name}",
+            title,
             font=POPPINS_LARGE,
             color=WHITE,
             align="left"
         )
 
-        member_count_cordinates = (self.image.width - MARGIN, title_cordinates[1] + 10)
+        member_count_cordinates = (header.image.width - MARGIN, title_cordinates[1] + 10)
 
-        self.text(
+        header.text(
             member_count_cordinates,
-            f"Showing {len(self.members_and_scores)} of {guild.member_count} members",
+            subtitle,
             font=POPPINS_SMALL,
             color=WHITE,
             align="right"
         )
 
+        return header
+
 class MemberColumn(ImageEditor):
     """A class to draw a member column"""
 
@@ -282,6 +547,35 @@ class MemberColumn(ImageEditor):
         canvas = Canvas(size)
         super().__init__(canvas)
 
+    @staticmethod
+    def tile_key(member: Member, score: ScoreObject) -> tuple:
+        """Get what a member's column depends on, to find it in the tile cache
+
+        Args:
+            member (discord.Member): The member
+            score (ScoreObject): The member's score
+
+        Returns:
+            tuple: The key, it changes whenever the column would look different
+        """
+
+        return (
+            member.id, member.display_name, member.colour.value,
+            member.display_avatar.url, score.rank, int(score.level)
+        )
+
+    def cache_tile(self) -> int:
+        """Put the drawn column in the tile cache for scoreboards to reuse
+
+        Returns:
+            int: The size of the encoded column in bytes
+        """
+
+        buffer = io.BytesIO()
+        self.image.save(buffer, "PNG", compress_level=1)  # decoding it is what matters
+        tile_cache.put(self.tile_key(self.member, self.score), buffer.getvalue())
+        return buffer.tell()
+
     async def draw(self):
         """Draw the member column"""
 
@@ -316,7 +610,7 @@ class MemberColumn(ImageEditor):
         avatar = Editor(Canvas((size, size), color=BLACK)).circle_image()
         avatar.paste(
             Editor(
-                await load_image_async(self.member.display_avatar.url)
+                await load_avatar(self.member.display_avatar.url)
             ).resize((size - 20, size - 20)).circle_image(),
             position=(10, 10)
         )
@@ -345,19 +639,16 @@ class MemberColumn(ImageEditor):
     def draw_level(self) -> None:
         """Draw the level for the member"""
 
-        # We need the GIL to prevent a reccursion error
-        with lock:
-
-            rank_position = ((SHADOW_OFFSET_X*-1) + (COL_WIDTH // 2), 470)
-            self.multi_text(
-                rank_position,
-                texts=(
-                    Text("RANK #", font=POPPINS_SMALL, color=LIGHT_GREY),
-                    Text(str(self.score.rank), font=POPPINS_SMALL, color=WHITE)
-                ),
-                align="center",
-                space_separated=False
-            )
+        rank_position = ((SHADOW_OFFSET_X*-1) + (COL_WIDTH // 2), 470)
+        self.multi_text(
+            rank_position,
+            texts=(
+                Text("RANK #", font=POPPINS_SMALL, color=LIGHT_GREY),
+                Text(str(self.score.rank), font=POPPINS_SMALL, color=WHITE)
+            ),
+            align="center",
+            space_separated=False
+        )
 
         level_position = (rank_position[0], 520)
         self.text(
@@ -366,12 +657,172 @@ class MemberColumn(ImageEditor):
         )
 
 
+class ListScoreboardEditor(ScoreboardEditor):
+    """The image editor for the list scoreboard image
+
+    Draws a compact row per member at the final size, so unlike the grid
+    there is no 2x canvas to antialias, no render threads and only small
+    avatars to download. Rows are pasted straight onto the image as soon
+    as they are drawn.
+    """
+
+    __slots__ = ("members_and_scores", "guild")
+
+    def __init__(
+        self,
+        members_and_scores: list[tuple[Member, ScoreObject]],
+        guild: Guild=None
+    ):
+
+        if not members_and_scores:
+            raise ValueError("members_and_scores cannot be empty")
+
+        self.members_and_scores = members_and_scores
+        self.guild = guild
+
+        height = LIST_HEAD_HEIGHT + (LIST_ROW_HEIGHT * len(members_and_scores)) + LIST_MARGIN
+        super().__init__(Canvas((LIST_WIDTH, height), color=BLACK))
+
+    async def draw(self) -> None:
+        """Draw the scoreboard image"""
+
+        log.debug("drawing list scoreboard")
+
+        self.draw_header(self.guild)
+
+        async def draw_row(i: int, member: Member, score: ScoreObject) -> None:
+            row = await self.draw_member(member, score)
+
+            # Pasting with PIL directly only touches the row's pixels
+            self.image.paste(row.image, (0, LIST_HEAD_HEIGHT + (LIST_ROW_HEIGHT * i)))
+
+        # The rows wait on their avatars at the same time
+        await asyncio.gather(*(
+            draw_row(i, member, score)
+            for i, (member, score) in enumerate(self.members_and_scores)
+        ))
+
+        # Flat rows and small avatars lose nothing visible in a palette,
+        # and a palette PNG is well under half the size to upload
+        self.image = self.image.convert("RGB").quantize(256)
+
+    async def draw_member(self, member: Member, score: ScoreObject) -> Editor:
+        """Draw a member's row"""
+
+        log.debug("drawing member row %s", member)
+
+        background = DARK_GREY if score.rank % 2 == 0 else BLACK
+        row = Editor(Canvas((LIST_WIDTH, LIST_ROW_HEIGHT), color=background))
+
+        # A strip of the member's colour down the left side
+        accent_colour = member.colour
+        if accent_colour == Colour.default():
+            accent_colour = Colour.light_grey()
+        row.rectangle((0, 0), width=8, height=LIST_ROW_HEIGHT, color=accent_colour.to_rgb())
+
+        text_y = (LIST_ROW_HEIGHT - 35) // 2 - 5
+        row.text((LIST_MARGIN, text_y), f"#{score.rank}", font=POPPINS_XSMALL, color=LIGHT_GREY)
+
+        # Ask the CDN for a small avatar instead of downloading the full one
+        avatar = await load_avatar(member.display_avatar.with_size(64).url)
+        avatar = Editor(avatar.resize((LIST_AVATAR_SIZE, LIST_AVATAR_SIZE))).circle_image()
+        avatar_y = (LIST_ROW_HEIGHT - LIST_AVATAR_SIZE) // 2
+        row.image.paste(avatar.image, (130, avatar_y), avatar.image)
+
+        name = member.display_name
+        if len(name) > 20:
+            name = name[:20]
+
+        row.text((130 + LIST_AVATAR_SIZE + 20, text_y), name, font=POPPINS_XSMALL, color=WHITE)
+        row.text(
+            (LIST_WIDTH - 260, text_y), f"LEVEL {int(score.level)}",
+            font=POPPINS_XSMALL, color=LIGHT_GREY, align="right"
+        )
+        row.text(
+            (LIST_WIDTH - LIST_MARGIN, text_y), f"{humanize_number(score.total_score)} XP",
+            font=POPPINS_XSMALL, color=WHITE, align="right"
+        )
+
+        return row
+
+    def draw_header(self, guild: Guild=None) -> None:
+        """Draw the header, with the guild's name or the global title"""
+
+        if guild is None:
+            title = "Global Scoreboard"
+            subtitle = f"Top {len(self.members_and_scores)} across all servers"
+        else:
+            title = guild.name
+            subtitle = f"Showing {len(self.members_and_scores)} of {guild.member_count} members"
+
+        self.text((LIST_MARGIN, 30), title[:25], font=POPPINS_SMALL, color=WHITE)
+        self.text(
+            (LIST_WIDTH - LIST_MARGIN, 45), subtitle,
+            font=POPPINS_XSMALL, color=LIGHT_GREY, align="right"
+        )
+
+
+class ContextScoreboardEditor(ListScoreboardEditor):
+    """The list scoreboard cut down to the members ranked around one member"""
+
+    __slots__ = ("members_and_scores", "guild", "member_id")
+
+    def __init__(
+        self,
+        members_and_scores: list[tuple[Member, ScoreObject]],
+        member_id: int,
+        guild: Guild=None
+    ):
+
+        self.member_id = member_id
+        super().__init__(members_and_scores, guild)
+
+    async def draw_member(self, member: Member, score: ScoreObject) -> Editor:
+        """Draw a member's row, outlining the member it's centred on"""
+
+        row = await super().draw_member(member, score)
+
+        if member.id == self.member_id:
+            row.rectangle(
+                (0, 0), width=LIST_WIDTH - 1, height=LIST_ROW_HEIGHT - 1,
+                outline=WHITE, stroke_width=3
+            )
+
+        return row
+
+    def draw_header(self, guild: Guild=None) -> None:
+        """Draw the header, with the ranks shown"""
+
+        first = self.members_and_scores[0][1].rank
+        last = self.members_and_scores[-1][1].rank
+
+        if guild is None:
+            title = "Global Scoreboard"
+            subtitle = f"Ranks #{first} to #{last} across all servers"
+        else:
+            title = guild.name
+            subtitle = f"Ranks #{first} to #{last} of {guild.member_count} members"
+
+        self.text((LIST_MARGIN, 30), title[:25], font=POPPINS_SMALL, color=WHITE)
+        self.text(
+            (LIST_WIDTH - LIST_MARGIN, 45), subtitle,
+            font=POPPINS_XSMALL, color=LIGHT_GREY, align="right"
+        )
+
+
 class ScoreEditor(ImageEditor):
     """The image editor for the score image"""
 
-    __slots__ = ("member", "accent_colour")
+    __slots__ = ("member", "accent_colour", "status")
 
-    def __init__(self, member: Member, score_object: ScoreObject, *args, **kwargs):
+    def __init__(
+        self,
+        member: Member,
+        score_object: ScoreObject,
+        *args,
+        status: Status=None,
+        **kwargs
+    ):
         super().__init__(
             Canvas((1800, 400), color=BLACK),
             *args, **kwargs
@@ -379,6 +830,7 @@ class ScoreEditor(ImageEditor):
 
         self.member = member
         self.score = score_object
+        self.status = status
 
         self.accent_colour = self.member.colour
         if self.accent_colour == Colour.default():
@@ -406,6 +858,7 @@ class ScoreEditor(ImageEditor):
         self.draw_level()
         self.draw_score()
         self.draw_progress()
+        self.draw_sparkline()
 
         # Smooth the corners
         self.rounded_corners(20)
@@ -426,7 +879,7 @@ class ScoreEditor(ImageEditor):
 
         log.debug("drawing avatar")
 
-        avatar = await load_image_async(self.member.display_avatar.url)
+        avatar = await load_avatar(self.member.display_avatar.url)
         avatar_image = Editor(avatar).resize((300, 300)).circle_image()
 
         avatar_image_container = Editor(Canvas((320, 320), color=BLACK)).circle_image()
@@ -435,10 +888,13 @@ class ScoreEditor(ImageEditor):
         self.paste(avatar_image_container, (40, 40))
 
     def draw_status(self):
-        """Draw the status icon over the avatar image"""
+        """Draw the status icon over the avatar image, if the status is known"""
+
+        if self.status is None:
+            return
 
         # Get the colour and icons for the status
-        status_colour, status_icon, status_icon_position = get_status(self.member.status)
+        status_colour, status_icon, status_icon_position = get_status(self.status)
 
         status_image = Editor(Canvas((90, 90), color=BLACK)).circle_image()
         status_image.paste(
@@ -482,6 +938,33 @@ class ScoreEditor(ImageEditor):
                 percentage=max(progress, 5),
             )
 
+    def draw_sparkline(self):
+        """Draw a line of the score gained each recent day, if there was any"""
+
+        history = self.score.history
+        if len(history) < 2 or not any(history):
+            return
+
+        log.debug("drawing sparkline")
+
+        left, top = 420, 60
+        width, height = 460, 110
+        peak = max(history)
+
+        points = [
+            (
+                left + (width * i // (len(history) - 1)),
+                top + height - (height * amount // peak)
+            )
+            for i, amount in enumerate(history)
+        ]
+
+        # A dim fill under the line, drawn directly so nothing is composited
+        draw = ImageDraw.Draw(self.image)
+        dim_colour = tuple(channel * 2 // 5 for channel in self.accent_colour)
+        draw.polygon(points + [(left + width, top + height), (left, top + height)], fill=dim_colour)
+        draw.line(points, fill=self.accent_colour, width=6, joint="curve")
+
     def draw_name(self):
         """Draw the member's name and discriminator on the image"""
 
@@ -0,0 +1,176 @@
+"""Level curves, each a table of the score every level starts at
+
+A curve is worked out once into a sorted array of integer thresholds, so
+a score's level is a bisect into it and the score a level starts or ends
+at is an index, with no floats to round the wrong way on a boundary.
+Formula curves are precomputed up to LEVEL_CURVE_MAX_LEVEL, scores past
+the last threshold stay at the last level.
+"""
+
+from array import array
+from bisect import bisect_right
+from fractions import Fraction
+from functools import cache
+from typing import Iterable, Sequence
+
+from constants import LEVEL_CURVE_FACTOR, LEVEL_CURVE_MAX_LEVEL
+
+
+SCORE_MAX = 2 ** 63 - 1  # the largest score SQLite and the thresholds array can hold
+
+
+class LevelCurve:
+    """The score each level starts at, level 1 starting at 0"""
+
+    __slots__ = ("thresholds", )
+
+    def __init__(self, thresholds: Sequence[int]):
+        if not thresholds or thresholds[0] != 0:
+            raise ValueError("Level 1 has to start at 0 XP")
+
+        if any(low >= high for low, high in zip(thresholds, thresholds[1:])):
+            raise ValueError("Each level has to start at more XP than the one before")
+
+        if thresholds[-1] > SCORE_MAX:
+            raise ValueError("The last level can't take more XP than a score can hold")
+
+        self.thresholds = array("q", thresholds)
+
+    @property
+    def max_level(self) -> int:
+        """The highest level in the table"""
+
+        return len(self.thresholds)
+
+    def level(self, score: int) -> int:
+        """Get the level a score is at
+
+        Args:
+            score (int): The total score
+
+        Returns:
+            int: The level, at least 1
+        """
+
+        return max(bisect_right(self.thresholds, score), 1)
+
+    def levels(self, scores: Iterable[int]) -> list[int]:
+        """Get the levels of many scores at once
+
+        Args:
+            scores (Iterable[int]): The total scores
+
+        Returns:
+            list[int]: The level of each score, in the same order
+        """
+
+        thresholds = self.thresholds
+        return [max(bisect_right(thresholds, score), 1) for score in scores]
+
+    def bounds(self, score: int) -> tuple[int, int, int | None]:
+        """Get a score's level and the scores the level starts and ends at
+
+        Args:
+            score (int): The total score
+
+        Returns:
+            int: The level
+            int: The score the level starts at
+            int, None: The score the next level starts at, or None at the
+                last level
+        """
+
+        level = self.level(score)
+        next_start = self.thresholds[level] if level < len(self.thresholds) else None
+        return level, self.thresholds[level - 1], next_start
+
+
+class QuadraticCurve(LevelCurve):
+    """Level = factor * sqrt(score) + 1, the curve the bot has always used"""
+
+    __slots__ = ("factor", )
+
+    def __init__(self, factor: str=LEVEL_CURVE_FACTOR, max_level: int=LEVEL_CURVE_MAX_LEVEL):
+        self.factor = Fraction(factor)
+        if self.factor <= 0:
+            raise ValueError("The factor has to be more than 0")
+
+        # ceil(((level - 1) / factor) ** 2) in integers, so a score right
+        # on a boundary is never a level short
+        numerator = self.factor.denominator ** 2
+        denominator = self.factor.numerator ** 2
+        super().__init__([
+            -(-(level - 1) ** 2 * numerator // denominator)
+            for level in range(1, max_level + 1)
+        ])
+
+    def __str__(self) -> str:
+        return f"Quadratic, factor {float(self.factor):g}"
+
+
+class LinearCurve(LevelCurve):
+    """The same score for every level"""
+
+    __slots__ = ("step", )
+
+    def __init__(self, step: int, max_level: int=LEVEL_CURVE_MAX_LEVEL):
+        if step <= 0:
+            raise ValueError("Levels have to take more than 0 XP")
+
+        self.step = step
+        super().__init__([step * (level - 1) for level in range(1, max_level + 1)])
+
+    def __str__(self) -> str:
+        return f"Linear, {self.step} XP per level"
+
+
+class TableCurve(LevelCurve):
+    """The score each level starts at, as a guild listed them"""
+
+    __slots__ = ()
+
+    def __str__(self) -> str:
+        return f"Table of {self.max_level} levels"
+
+
+@cache
+def make_curve(kind: str, value: str=None) -> LevelCurve:
+    """Make a curve from a guild's config, guilds with the same config share it
+
+    Args:
+        kind (str): quadratic, linear or table
+        value (str, None): The quadratic factor, the XP per level, or the XP
+            levels from 2 start at separated by commas
+
+    Raises:
+        ValueError: The config doesn't make a curve
+
+    Returns:
+        LevelCurve: The curve
+    """
+
+    match kind:
+
+        case "quadratic":
+            return QuadraticCurve(value or LEVEL_CURVE_FACTOR)
+
+        case "linear":
+            if not value:
+                raise ValueError("A linear curve needs the XP per level")
+
+            return LinearCurve(int(value))
+
+        case "table":
+            thresholds = [int(threshold) for threshold in (value or "").split(",") if threshold.strip()]
+            if thresholds[:1] != [0]:
+                thresholds.insert(0, 0)
+
+            if len(thresholds) > LEVEL_CURVE_MAX_LEVEL:
+                raise ValueError(f"A table can have at most {LEVEL_CURVE_MAX_LEVEL} levels")
+
+            return TableCurve(thresholds)
+
+    raise ValueError(f"Unknown level curve {kind}")
+
+
+DEFAULT_CURVE = make_curve("quadratic")
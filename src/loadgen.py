@@ -0,0 +1,508 @@
+"""Offline load generator that drives the real cogs with fake Discord objects
+
+Builds fake guilds, members and messages, then calls the cogs' handlers
+and commands directly at the configured rates, without connecting to
+Discord. Avatars are served by a local HTTP server so renders still
+download them. Arrivals are scheduled ahead of time, so latencies include
+the time an event waited for a free slot and a busy bot can't hide how far
+behind it has fallen.
+"""
+
+import io
+import random
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, field
+from time import perf_counter
+from types import SimpleNamespace
+from typing import Awaitable, Callable
+
+import discord
+from aiohttp import web
+from PIL import Image
+
+import constants
+
+# Scores are kept in memory and the XP rules are given to the cogs, so
+# nothing reads the database. Importing it would open and build the real
+# file, open an empty one in memory instead.
+constants.DB_PATH = ":memory:"
+
+# pylint: disable=C0413
+from db import set_storage
+from db.storage import MemoryStorage
+from cooldown import CooldownWheel
+from ext.commands import CommandsCog
+from ext.listeners import ListenersCog
+from bot.watchdog import LoopWatchdog
+from members import MemberCache
+from prewarm import Prewarmer
+from scheduler import RenderPriority
+from xp import XPRules, XPRulesCache
+
+
+log = logging.getLogger(__name__)
+
+LAG_INTERVAL = 0.05  # seconds between event loop lag probes
+PREWARM_INTERVAL = 2  # seconds between prewarms, runs are much shorter than the bot's uptime
+FIRST_ID = 10 ** 17  # fake IDs start around where real snowflakes are
+
+
+class FakeChannel:
+    """A text channel that drops everything sent to it"""
+
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.parent_id = None
+
+    async def send(self, *_args, **_kwargs):
+        """Pretend to send a message"""
+
+
+class FakeAsset:
+    """An avatar, every size is served from the same URL"""
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def with_size(self, _size: int) -> "FakeAsset":
+        """Get the avatar at another size"""
+
+        return self
+
+
+class FakeMember:
+    """The parts of a discord.Member the cogs and images use"""
+
+    def __init__(self, member_id: int, guild: "FakeGuild", avatar_url: str):
+        self.id = member_id
+        self.guild = guild
+        self.bot = False
+        self.name = self.display_name = f"member{member_id % 100000}"
+        self.discriminator = f"{member_id % 10000:04}"
+        self.mention = f"<@{member_id}>"
+        self.colour = discord.Colour(member_id & 0xFFFFFF)
+        self.display_avatar = FakeAsset(avatar_url)
+        self.status = discord.Status.online
+        self.roles = []
+
+    async def add_roles(self, *_roles, **_kwargs):
+        """Pretend to give the member roles"""
+
+
+class FakeGuild:
+    """The parts of a discord.Guild the cogs and images use"""
+
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.name = f"guild{guild_id % 100000}"
+        self.icon = None
+        self.member_map: dict[int, FakeMember] = {}
+        self.channels = [FakeChannel(guild_id + i) for i in range(1, 4)]
+
+    @property
+    def members(self) -> list[FakeMember]:
+        """Every member of the guild"""
+
+        return list(self.member_map.values())
+
+    @property
+    def member_count(self) -> int:
+        """The number of members"""
+
+        return len(self.member_map)
+
+    def get_member(self, member_id: int) -> FakeMember | None:
+        """Get a member of the guild"""
+
+        return self.member_map.get(member_id)
+
+    def get_channel_or_thread(self, channel_id: int) -> FakeChannel | None:
+        """Get a channel of the guild"""
+
+        return next((channel for channel in self.channels if channel.id == channel_id), None)
+
+
+class FakeXPRules(XPRulesCache):
+    """XP rules that give every guild the same rules, without the database"""
+
+    def __init__(self, rules: XPRules=None):
+        super().__init__()
+        self.default = rules or XPRules()
+
+    def compile(self, guild_id: int) -> XPRules:
+        return self.default
+
+
+class FakeBot:
+    """The parts of the bot the cogs use, holding the fake guilds"""
+
+    def __init__(self):
+        self.guild_map: dict[int, FakeGuild] = {}
+        self.member_cache = MemberCache(self)
+        self.xp_rules = FakeXPRules()
+        self.prewarmer = Prewarmer(self, PREWARM_INTERVAL)
+        self.cogs = {}
+        self.tree = SimpleNamespace(add_command=lambda *_args, **_kwargs: None)
+        self.user = SimpleNamespace(id=FIRST_ID - 1, mention="<@0>")
+
+    @property
+    def guilds(self) -> list[FakeGuild]:
+        """Every guild the bot is in"""
+
+        return list(self.guild_map.values())
+
+    def get_guild(self, guild_id: int) -> FakeGuild | None:
+        """Get a guild"""
+
+        return self.guild_map.get(guild_id)
+
+    def get_cog(self, name: str):
+        """Get a loaded cog"""
+
+        return self.cogs.get(name)
+
+    def get_user(self, user_id: int) -> FakeMember | None:
+        """Get any member with the ID, used for the global scoreboard"""
+
+        for guild in self.guild_map.values():
+            if (member := guild.get_member(user_id)) is not None:
+                return member
+
+        return None
+
+    async def fetch_user(self, user_id: int):
+        """Every fake user is cached, so fetching one always fails"""
+
+        raise discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), user_id)
+
+
+class AvatarServer:
+    """Serves generated avatars over HTTP in place of Discord's CDN
+
+    The server runs its own event loop on its own thread. Like a CDN it
+    doesn't slow down when the bot's loop is busy, and renders that block
+    the bot's loop while waiting for avatars don't deadlock.
+    """
+
+    def __init__(self, colours: int=16):
+        self.images = []
+        for i in range(colours):
+            image = Image.new("RGB", (128, 128), (i * 15 % 256, i * 40 % 256, i * 85 % 256))
+            buffer = io.BytesIO()
+            image.save(buffer, "PNG")
+            self.images.append(buffer.getvalue())
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="avatar-server", daemon=True)
+        self.runner: web.AppRunner = None
+        self.base_url = ""
+        self.requests = 0
+
+    async def avatar(self, request: web.Request) -> web.Response:
+        """Respond with the avatar of a member"""
+
+        self.requests += 1
+        member_id = int(request.match_info["member_id"])
+        return web.Response(body=self.images[member_id % len(self.images)], content_type="image/png")
+
+    async def start(self) -> None:
+        """Start serving on a free local port"""
+
+        self.thread.start()
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._serve(), self.loop))
+
+    async def _serve(self) -> None:
+        """Start the server, on the server's own loop"""
+
+        app = web.Application()
+        app.router.add_get("/avatars/{member_id}.png", self.avatar)
+
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+
+        host, port = self.runner.addresses[0][:2]
+        self.base_url = f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        """Stop serving"""
+
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop))
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def url(self, member_id: int) -> str:
+        """Get the avatar URL of a member"""
+
+        return f"{self.base_url}/avatars/{member_id}.png"
+
+
+@dataclass(slots=True)
+class EventStats:
+    """Latencies and outcomes of one kind of event"""
+
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    fallbacks: int = 0
+
+    def percentile(self, fraction: float) -> float:
+        """Get a latency percentile in milliseconds"""
+
+        if not self.latencies:
+            return 0
+
+        ordered = sorted(self.latencies)
+        return ordered[int(fraction * (len(ordered) - 1))] * 1000
+
+
+class LoadGenerator:
+    """Drives the listeners and commands cogs with fake events
+
+    Args:
+        rates (dict[str, float]): Events per second of each kind, kinds are
+            message, member_join, guild_join, rank and scoreboard
+        guilds (int): Guilds to start with
+        members (int): Members in each guild
+        concurrency (int): Most events handled at once
+        cooldown (float): Scoring cooldown in seconds
+        prewarm (bool): Prewarm avatars and scoreboard columns like the bot
+        seed (int): Seed for the random choices, for repeatable runs
+    """
+
+    def __init__(
+        self,
+        rates: dict[str, float],
+        guilds: int=10,
+        members: int=100,
+        concurrency: int=100,
+        cooldown: float=0,
+        prewarm: bool=False,
+        seed: int=None
+    ):
+        self.rates = {kind: rate for kind, rate in rates.items() if rate > 0}
+        self.guild_count = guilds
+        self.member_count = members
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.cooldown = cooldown
+        self.prewarm = prewarm
+        self.random = random.Random(seed)
+
+        self.bot = FakeBot()
+        self.avatars = AvatarServer()
+        self.listeners = None
+        self.commands = None
+
+        self.ids = iter(range(FIRST_ID, FIRST_ID * 2))
+        self.stats = {kind: EventStats() for kind in self.rates}
+        self.lag: list[float] = []
+        self.watchdog = LoopWatchdog()
+        self.tasks: set[asyncio.Task] = set()
+        self.elapsed = 0
+
+    def add_guild(self) -> FakeGuild:
+        """Make a guild full of members, without telling the bot"""
+
+        guild = FakeGuild(next(self.ids))
+        for _ in range(self.member_count):
+            self.add_member(guild)
+
+        return guild
+
+    def add_member(self, guild: FakeGuild) -> FakeMember:
+        """Make a member of a guild"""
+
+        member_id = next(self.ids)
+        member = guild.member_map[member_id] = FakeMember(member_id, guild, self.avatars.url(member_id))
+        return member
+
+    async def setup(self) -> None:
+        """Start the avatar server and load the cogs with fresh in memory storage"""
+
+        await self.avatars.start()
+        set_storage(MemoryStorage())
+
+        for _ in range(self.guild_count):
+            guild = self.add_guild()
+            self.bot.guild_map[guild.id] = guild
+
+        self.listeners = ListenersCog(self.bot)
+        self.listeners.cooldown = CooldownWheel(self.cooldown)
+        self.commands = CommandsCog(self.bot)
+        self.bot.cogs[self.commands.qualified_name] = self.commands
+        await self.listeners.cog_load()
+        await self.commands.cog_load()
+
+        await self.listeners.add_all_members()
+
+        if self.prewarm:
+            self.bot.prewarmer.start()
+
+    async def teardown(self) -> None:
+        """Stop the cogs and the avatar server"""
+
+        await self.bot.prewarmer.stop()
+        await self.commands.cog_unload()
+        await self.listeners.cog_unload()
+        await self.avatars.stop()
+
+    def event(self, kind: str) -> Callable[[], Awaitable[bool]]:
+        """Make an event of a kind, returning a coroutine function that handles it
+
+        For renders the coroutine returns None if the scheduler couldn't fit
+        the render in and the bot would have fallen back to an embed.
+        """
+
+        guild = self.random.choice(self.bot.guilds)
+
+        match kind:
+
+            case "message":
+                member = self.random.choice(guild.members)
+                message = SimpleNamespace(
+                    author=member, guild=guild, channel=self.random.choice(guild.channels)
+                )
+                return lambda: self.listeners.on_message(message)
+
+            case "member_join":
+                member = self.add_member(guild)
+                return lambda: self.listeners.on_member_join(member)
+
+            case "guild_join":
+                guild = self.add_guild()
+                self.bot.guild_map[guild.id] = guild
+                return lambda: self.listeners.on_guild_join(guild)
+
+            case "rank":
+                member = self.random.choice(guild.members)
+                return lambda: self.commands.render(
+                    lambda: self.commands.get_rank(member), RenderPriority.COMMAND_RANK
+                )
+
+            case "scoreboard":
+                return lambda: self.commands.render(
+                    lambda: self.commands.get_scoreboard(guild), RenderPriority.COMMAND_SCOREBOARD
+                )
+
+        raise ValueError(f"Unknown event kind {kind}")
+
+    async def handle(self, kind: str, scheduled: float) -> None:
+        """Handle one event, timing it from when it was due"""
+
+        stats = self.stats[kind]
+
+        async with self.semaphore:
+            try:
+                result = await self.event(kind)()
+            except Exception:  # pylint: disable=W0703
+                if not stats.errors:
+                    log.exception("%s event failed", kind)
+                stats.errors += 1
+                return
+
+        # Renders give back the file, or None and why there's no image
+        if kind in ("rank", "scoreboard") and result[0] is None:
+            stats.fallbacks += 1
+
+        stats.latencies.append(perf_counter() - scheduled)
+
+    async def arrivals(self, kind: str, rate: float, until: float) -> None:
+        """Start events of a kind at random intervals averaging the rate"""
+
+        due = perf_counter()
+
+        while (due := due + self.random.expovariate(rate)) < until:
+            if (delay := due - perf_counter()) > 0:
+                await asyncio.sleep(delay)
+            else:
+                await asyncio.sleep(0)  # behind schedule, still let the handlers run
+
+            task = asyncio.create_task(self.handle(kind, due))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def watch_lag(self) -> None:
+        """Measure how late the event loop wakes up from short sleeps"""
+
+        while True:
+            start = perf_counter()
+            await asyncio.sleep(LAG_INTERVAL)
+            self.lag.append(perf_counter() - start - LAG_INTERVAL)
+
+    async def run(self, duration: float) -> None:
+        """Generate load for a while and wait for the events to finish
+
+        Args:
+            duration (float): Seconds to generate events for
+        """
+
+        await self.setup()
+        watcher = asyncio.create_task(self.watch_lag())
+        self.watchdog.start()
+
+        start = perf_counter()
+        await asyncio.gather(*(
+            self.arrivals(kind, rate, start + duration)
+            for kind, rate in self.rates.items()
+        ))
+
+        if self.tasks:
+            await asyncio.gather(*self.tasks)
+
+        self.elapsed = perf_counter() - start
+        watcher.cancel()
+        self.watchdog.stop()
+        await self.teardown()
+
+    def report(self) -> str:
+        """Summarise the run
+
+        Returns:
+            str: The summary, one line per event kind
+        """
+
+        handled = sum(len(stats.latencies) for stats in self.stats.values())
+        lines = [
+            f"{handled} events in {self.elapsed:.1f}s, "
+            f"{handled / self.elapsed if self.elapsed else 0:.1f} events/s sustained",
+            f"{'event':<12}{'count':>8}{'errors':>8}{'fallback':>10}"
+            f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+        ]
+
+        for kind, stats in self.stats.items():
+            lines.append(
+                f"{kind:<12}{len(stats.latencies):>8}{stats.errors:>8}{stats.fallbacks:>10}"
+                f"{stats.percentile(0.5):>10.1f}{stats.percentile(0.95):>10.1f}"
+                f"{stats.percentile(0.99):>10.1f}{stats.percentile(1):>10.1f}"
+            )
+
+        lag = EventStats(self.lag)
+        lines.append(
+            f"Event loop lag: p50 {lag.percentile(0.5):.1f}ms, "
+            f"p99 {lag.percentile(0.99):.1f}ms, max {lag.percentile(1):.1f}ms"
+        )
+
+        # Where the loop was blocked, the lag itself is measured above
+        lines.extend(self.watchdog.summary().splitlines()[1:])
+
+        renderer = self.commands.renderer
+        lines.append(
+            f"Renders: {renderer.completed} completed, {renderer.rejected} rejected, "
+            f"{renderer.expired} expired, {renderer.too_large} too large, "
+            f"{renderer.failed} failed, {self.avatars.requests} avatars served"
+        )
+
+        cooldown = self.listeners.cooldown
+        lines.append(f"Cooldowns: {cooldown.allowed} scored, {cooldown.suppressed} suppressed")
+
+        if self.prewarm:
+            prewarmer = self.bot.prewarmer
+            lines.append(
+                f"Prewarm: {prewarmer.avatars} avatars, {prewarmer.tiles} columns "
+                f"in {prewarmer.cpu_seconds:.1f}s CPU, {prewarmer.deferred} waits for renders"
+            )
+
+        return "\n".join(lines)
@@ -1,8 +1,11 @@
 """Entry point for the application script"""
 
 import asyncio
+from time import perf_counter
 
-from bot import Bot
+IMPORT_START = perf_counter()
+
+from bot import Bot  # pylint: disable=C0413
 
 async def main():
     """Main entry point for the application"""
@@ -12,6 +15,7 @@ async def main():
         token = file.read()
 
     async with Bot() as bot:
+        bot.startup.record("imports", perf_counter() - IMPORT_START)
         await bot.load_extensions()
         await bot.start(token)
 
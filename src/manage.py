@@ -0,0 +1,175 @@
+"""Command line tools for managing the bot's data"""
+
+import sys
+import asyncio
+import logging
+from argparse import ArgumentParser
+
+from constants import BACKUP_PATH, DB_SHARDS, SCORE_COOLDOWN_SECONDS, TRANSFER_FORMATS
+
+# The database modules are imported by the commands that use them, importing
+# them opens and builds the database, which the load generator never touches
+# pylint: disable=C0415
+
+
+def print_progress(count: int) -> None:
+    """Print the number of rows processed so far"""
+
+    print(f"\r{count} rows", end="", file=sys.stderr, flush=True)
+
+
+def export_command(args) -> None:
+    """Export scores to a file or stdout"""
+
+    from db import transfer
+
+    fmt = args.format or transfer.detect_format(args.file)
+
+    if args.file == "-":
+        transfer.export_scores(sys.stdout, fmt, args.guild, print_progress)
+    else:
+        with open(args.file, "w", encoding="utf-8", newline="") as file:
+            transfer.export_scores(file, fmt, args.guild, print_progress)
+
+    print(file=sys.stderr)
+
+
+def import_command(args) -> None:
+    """Import scores from a file or stdin"""
+
+    from db import transfer
+
+    fmt = args.format or transfer.detect_format(args.file)
+
+    if args.file == "-":
+        transfer.import_scores(sys.stdin, fmt, args.guild, print_progress)
+    else:
+        with open(args.file, "r", encoding="utf-8", newline="") as file:
+            transfer.import_scores(file, fmt, args.guild, print_progress)
+
+    print(file=sys.stderr)
+
+
+def backup_command(args) -> None:
+    """Back up the database, safe while the bot is running"""
+
+    from db import backup
+
+    for path in backup.backup_all(args.directory, compress=not args.no_compress):
+        print(path)
+
+
+def restore_command(args) -> None:
+    """Replace the database with a backup, stop the bot first"""
+
+    from db import backup
+
+    backup.restore(args.file)
+
+
+def reshard_command(args) -> None:
+    """Move every guild's scores into a new set of shards, stop the bot first"""
+
+    from db import shards
+
+    copied = shards.reshard(args.shards)
+    for table, count in copied.items():
+        print(f"{table}: {count} rows")
+
+    print('Set STORAGE_BACKEND = "sharded" in constants.py to use the shards')
+
+
+def loadgen_command(args) -> None:
+    """Drive the cogs with fake events and report how they kept up"""
+
+    # Imported here so the other commands don't import discord.py and PIL
+    from loadgen import LoadGenerator
+
+    generator = LoadGenerator(
+        {
+            "message": args.messages,
+            "member_join": args.joins,
+            "guild_join": args.guild_joins,
+            "rank": args.ranks,
+            "scoreboard": args.scoreboards
+        },
+        guilds=args.guilds,
+        members=args.members,
+        concurrency=args.concurrency,
+        cooldown=args.cooldown,
+        prewarm=args.prewarm,
+        seed=args.seed
+    )
+
+    asyncio.run(generator.run(args.duration))
+    print(generator.report())
+
+
+def main():
+    """Main entry point for the management script"""
+
+    parser = ArgumentParser(description="Manage OneScore's data")
+    subparsers = parser.add_subparsers(required=True)
+
+    export_parser = subparsers.add_parser("export", help="export scores as csv or jsonl")
+    export_parser.add_argument("file", help="file to write, - for stdout")
+    export_parser.add_argument("--guild", type=int, help="only export this guild")
+    export_parser.add_argument("--format", choices=TRANSFER_FORMATS)
+    export_parser.set_defaults(func=export_command)
+
+    import_parser = subparsers.add_parser("import", help="upsert scores from csv or jsonl")
+    import_parser.add_argument("file", help="file to read, - for stdin")
+    import_parser.add_argument("--guild", type=int, help="guild for rows that don't have one")
+    import_parser.add_argument("--format", choices=TRANSFER_FORMATS)
+    import_parser.set_defaults(func=import_command)
+
+    backup_parser = subparsers.add_parser("backup", help="back up the database, safe while the bot runs")
+    backup_parser.add_argument("--directory", default=BACKUP_PATH, help="where to keep backups")
+    backup_parser.add_argument("--no-compress", action="store_true", help="don't gzip the backup")
+    backup_parser.set_defaults(func=backup_command, file=None)
+
+    restore_parser = subparsers.add_parser("restore", help="replace the database with a backup")
+    restore_parser.add_argument("file", help="backup to restore, .sqlite or .sqlite.gz")
+    restore_parser.set_defaults(func=restore_command, format=None)
+
+    reshard_parser = subparsers.add_parser(
+        "reshard", help="split scores into shards by guild, or change the number of shards"
+    )
+    reshard_parser.add_argument("--shards", type=int, default=DB_SHARDS, help="number of shards")
+    reshard_parser.set_defaults(func=reshard_command, file=None, format=None)
+
+    loadgen_parser = subparsers.add_parser(
+        "loadgen", help="replay fake events through the cogs, scores are kept in memory"
+    )
+    loadgen_parser.add_argument("--duration", type=float, default=30, help="seconds to run for")
+    loadgen_parser.add_argument("--guilds", type=int, default=10)
+    loadgen_parser.add_argument("--members", type=int, default=100, help="members per guild")
+    loadgen_parser.add_argument("--concurrency", type=int, default=100, help="events handled at once")
+    loadgen_parser.add_argument("--messages", type=float, default=200, help="messages per second")
+    loadgen_parser.add_argument("--joins", type=float, default=2, help="member joins per second")
+    loadgen_parser.add_argument("--guild-joins", type=float, default=0.1, help="guild joins per second")
+    loadgen_parser.add_argument("--ranks", type=float, default=1, help="rank cards per second")
+    loadgen_parser.add_argument("--scoreboards", type=float, default=0.2, help="scoreboards per second")
+    loadgen_parser.add_argument(
+        "--cooldown", type=float, default=SCORE_COOLDOWN_SECONDS, help="scoring cooldown in seconds"
+    )
+    loadgen_parser.add_argument(
+        "--prewarm", action="store_true", help="prewarm avatars and scoreboard columns like the bot"
+    )
+    loadgen_parser.add_argument("--seed", type=int, help="seed for repeatable runs")
+    loadgen_parser.set_defaults(func=loadgen_command, file=None)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+
+    if args.file == "-" and args.format is None:
+        parser.error("--format is required when using stdin or stdout")
+
+    args.func(args)
+
+    if args.func is not loadgen_command:
+        from db import db
+        db.close()
+
+if __name__ == "__main__":
+    main()
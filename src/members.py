@@ -0,0 +1,246 @@
+"""On demand member lookups for when the member cache is disabled"""
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+
+import discord
+
+from constants import (
+    MEMBER_CACHE_SIZE,
+    MINIMAL_INTENTS,
+    STATUS_CACHE_SECONDS,
+    USER_FETCH_CONCURRENCY
+)
+
+
+log = logging.getLogger(__name__)
+
+
+class MemberCache:
+    """A bounded LRU cache of members and users, fetched from Discord on a miss
+
+    The client's own caches are always checked first, so this costs
+    nothing when the full member cache is enabled.
+    """
+
+    def __init__(self, client: discord.Client, max_size: int=MEMBER_CACHE_SIZE):
+        self.client = client
+        self.max_size = max_size
+        self.members: OrderedDict[tuple[int, int], discord.Member] = OrderedDict()
+        self.users: OrderedDict[int, discord.User] = OrderedDict()
+        self.statuses: OrderedDict[tuple[int, int], tuple[discord.Status, float]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+        # Status lookups for rank cards, by where the status came from
+        self.status_hits = 0
+        self.status_queries = 0
+        self.status_unknown = 0
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def get(self, guild: discord.Guild, member_id: int) -> discord.Member | None:
+        """Get a member without making any requests
+
+        Args:
+            guild (discord.Guild): The guild
+            member_id (int): The member's ID
+
+        Returns:
+            discord.Member, None: The member if it is cached
+        """
+
+        if (member := guild.get_member(member_id)) is not None:
+            return member
+
+        key = (guild.id, member_id)
+        if (member := self.members.get(key)) is not None:
+            self.hits += 1
+            self.members.move_to_end(key)
+
+        return member
+
+    def put(self, member: discord.Member) -> None:
+        """Cache a member, evicting the least recently used one when full
+
+        Args:
+            member (discord.Member): The member
+        """
+
+        self._remember(self.members, (member.guild.id, member.id), member)
+
+    def _remember(self, cache: OrderedDict, key, value) -> None:
+        """Add a value to one of the LRU caches, evicting the oldest when full"""
+
+        cache[key] = value
+        cache.move_to_end(key)
+
+        while len(cache) > self.max_size:
+            cache.popitem(last=False)
+
+    def discard(self, guild_id: int, member_id: int) -> None:
+        """Remove a member from the cache
+
+        Args:
+            guild_id (int): The guild's ID
+            member_id (int): The member's ID
+        """
+
+        self.members.pop((guild_id, member_id), None)
+
+    async def fetch(self, guild: discord.Guild, member_id: int) -> discord.Member | None:
+        """Get a member, fetching it from Discord if it isn't cached
+
+        Args:
+            guild (discord.Guild): The guild
+            member_id (int): The member's ID
+
+        Returns:
+            discord.Member, None: The member, or None if they aren't in the guild
+        """
+
+        members = await self.fetch_many(guild, (member_id, ))
+        return members.get(member_id)
+
+    async def fetch_users(self, user_ids) -> dict[int, discord.User]:
+        """Get several users that may not share a guild, for the global scoreboard
+
+        Args:
+            user_ids (Iterable[int]): The users' IDs
+
+        Returns:
+            dict[int, discord.User]: The users that still exist by ID
+        """
+
+        found = {}
+        missing = []
+
+        for user_id in user_ids:
+            if (user := self.client.get_user(user_id)) is not None:
+                found[user_id] = user
+                continue
+
+            if (user := self.users.get(user_id)) is not None:
+                self.hits += 1
+                self.users.move_to_end(user_id)
+                found[user_id] = user
+                continue
+
+            missing.append(user_id)
+
+        # Misses are requested a few at a time rather than one after another,
+        # a cold scoreboard would otherwise wait on every request in turn
+        semaphore = asyncio.Semaphore(USER_FETCH_CONCURRENCY)
+
+        async def fetch(user_id: int) -> discord.User | None:
+            async with semaphore:
+                try:
+                    return await self.client.fetch_user(user_id)
+                except discord.NotFound:
+                    return None
+
+        self.misses += len(missing)
+        for user_id, user in zip(missing, await asyncio.gather(*map(fetch, missing))):
+            if user is not None:
+                self._remember(self.users, user_id, user)
+                found[user_id] = user
+
+        return found
+
+    async def fetch_status(self, guild: discord.Guild, member_id: int) -> discord.Status | None:
+        """Get a member's status, requesting their presence if it isn't cached
+
+        Statuses requested from the gateway are kept for STATUS_CACHE_SECONDS,
+        so a member asking for their card again doesn't request it again.
+        Discord only sends presences to bots with the presences intent, so
+        with the minimal intents no status can be known, not even on request,
+        and cards are drawn without one.
+
+        Args:
+            guild (discord.Guild): The guild
+            member_id (int): The member's ID
+
+        Returns:
+            discord.Status, None: The status, or None if it can't be known
+        """
+
+        if MINIMAL_INTENTS:
+            self.status_unknown += 1
+            return None
+
+        # The guild's member cache is kept up to date by presence updates
+        if (member := guild.get_member(member_id)) is not None:
+            self.status_hits += 1
+            return member.status
+
+        key = (guild.id, member_id)
+        if (cached := self.statuses.get(key)) is not None and cached[1] > time.monotonic():
+            self.status_hits += 1
+            self.statuses.move_to_end(key)
+            return cached[0]
+
+        self.status_queries += 1
+        try:
+            members = await guild.query_members(
+                user_ids=[member_id], limit=1, presences=True, cache=False
+            )
+        except (discord.ClientException, TimeoutError):
+            log.warning("Presence query failed for member %s", member_id)
+            self.status_unknown += 1
+            return None
+
+        if not members:
+            self.status_unknown += 1
+            return None
+
+        self.put(members[0])
+        self._remember(self.statuses, key, (members[0].status, time.monotonic() + STATUS_CACHE_SECONDS))
+        return members[0].status
+
+    async def fetch_many(self, guild: discord.Guild, member_ids) -> dict[int, discord.Member]:
+        """Get several members, fetching the uncached ones in batches
+
+        Args:
+            guild (discord.Guild): The guild
+            member_ids (Iterable[int]): The members' IDs
+
+        Returns:
+            dict[int, discord.Member]: The members that are in the guild by ID
+        """
+
+        found = {}
+        missing = []
+
+        for member_id in member_ids:
+            if (member := self.get(guild, member_id)) is not None:
+                found[member_id] = member
+            else:
+                missing.append(member_id)
+
+        self.misses += len(missing)
+
+        # The gateway accepts up to 100 user IDs per member request
+        for i in range(0, len(missing), 100):
+            batch = missing[i:i + 100]
+            log.debug("Fetching %s members from guild %s", len(batch), guild.id)
+
+            try:
+                members = await guild.query_members(user_ids=batch, limit=len(batch), cache=False)
+            except (discord.ClientException, TimeoutError):
+                log.warning("Member query failed for guild %s, fetching one by one", guild.id)
+                members = []
+                for member_id in batch:
+                    try:
+                        members.append(await guild.fetch_member(member_id))
+                    except discord.NotFound:
+                        continue
+
+            for member in members:
+                self.put(member)
+                found[member.id] = member
+
+        return found
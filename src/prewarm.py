@@ -0,0 +1,215 @@
+"""Fetches avatars and draws scoreboard columns before anyone asks for them"""
+
+import time
+import logging
+import asyncio
+from collections import OrderedDict
+
+import aiohttp
+import discord
+
+from db import get_storage
+from score import ScoreObject
+from constants import (
+    GRID_SCOREBOARD_SIZE,
+    COL_WIDTH,
+    COL_HEIGHT,
+    SHADOW_OFFSET_X,
+    SHADOW_OFFSET_Y,
+    PREWARM_INTERVAL,
+    PREWARM_ACTIVE_SECONDS,
+    PREWARM_RANK_MEMBERS,
+    PREWARM_BANDWIDTH,
+    PREWARM_CPU_SHARE
+)
+
+
+log = logging.getLogger(__name__)
+
+IDLE_POLL = 0.5  # seconds between checks of whether renders are running
+
+
+class Prewarmer:
+    """Keeps the avatars and grid columns of likely renders in the image caches
+
+    Guilds where members were scored recently have their top members'
+    avatars downloaded and grid columns drawn, and members whose rank card
+    was shown recently have their avatars downloaded. Downloads are paced
+    to a bandwidth budget. Columns are only drawn while no renders are
+    running or queued, on a thread, resting after each one long enough to
+    stay within a share of a core.
+
+    Members are only taken from the caches, prewarming never makes
+    requests to Discord.
+    """
+
+    def __init__(self, bot: discord.Client, interval: float=PREWARM_INTERVAL):
+        self.bot = bot
+        self.interval = interval
+        self.guilds: dict[int, float] = {}  # guild_id: when a member was last scored
+        self.rank_members: OrderedDict[tuple[int, int], float] = OrderedDict()
+        self.worker: asyncio.Task = None
+
+        self.avatars = 0
+        self.downloaded = 0
+        self.tiles = 0
+        self.cpu_seconds = 0.0
+        self.deferred = 0
+
+    def start(self) -> None:
+        """Start the worker task"""
+
+        self.worker = asyncio.create_task(self._worker(), name="prewarm-worker")
+
+    async def stop(self) -> None:
+        """Stop the worker task"""
+
+        if self.worker is not None:
+            self.worker.cancel()
+            await asyncio.gather(self.worker, return_exceptions=True)
+
+    def note_guild(self, guild_id: int) -> None:
+        """Note that a member of a guild was scored, so its scoreboard may change
+
+        Args:
+            guild_id (int): The guild's ID
+        """
+
+        self.guilds[guild_id] = time.monotonic()
+
+    def note_rank(self, member: discord.Member) -> None:
+        """Note that a member's rank card was shown, they'll likely ask again
+
+        Args:
+            member (discord.Member): The member
+        """
+
+        key = (member.guild.id, member.id)
+        self.rank_members[key] = time.monotonic()
+        self.rank_members.move_to_end(key)
+
+        while len(self.rank_members) > PREWARM_RANK_MEMBERS:
+            self.rank_members.popitem(last=False)
+
+    def targets(self) -> tuple[list[discord.Member], list[tuple[discord.Member, ScoreObject]]]:
+        """Get the members worth prewarming, forgetting guilds and members gone quiet
+
+        Returns:
+            list[discord.Member]: The members whose avatars to download
+            list[tuple[discord.Member, ScoreObject]]: The grid columns to draw
+        """
+
+        cutoff = time.monotonic() - PREWARM_ACTIVE_SECONDS
+        storage = get_storage()
+        columns = []
+
+        for guild_id, seen in list(self.guilds.items()):
+            if seen < cutoff:
+                del self.guilds[guild_id]
+                continue
+
+            if (guild := self.bot.get_guild(guild_id)) is None:
+                continue
+
+            rows = storage.top(guild_id, GRID_SCOREBOARD_SIZE)
+            curve = self.bot.xp_rules.get(guild_id).curve
+            for score in ScoreObject.ranked(rows, guild_id, curve=curve):
+                if (member := self.bot.member_cache.get(guild, score.member_id)) is not None:
+                    columns.append((member, score))
+
+        members = [member for member, _ in columns]
+
+        for (guild_id, member_id), seen in list(self.rank_members.items()):
+            if seen < cutoff:
+                del self.rank_members[(guild_id, member_id)]
+                continue
+
+            if (guild := self.bot.get_guild(guild_id)) is None:
+                continue
+
+            if (member := self.bot.member_cache.get(guild, member_id)) is not None:
+                members.append(member)
+
+        return members, columns
+
+    def renders_idle(self) -> bool:
+        """Check that no renders are running or queued"""
+
+        commands_cog = self.bot.get_cog("Score Commands")
+        return commands_cog is None or commands_cog.renderer.idle
+
+    @staticmethod
+    def draw_column(member: discord.Member, score: ScoreObject) -> float:
+        """Draw a member's grid column into the tile cache, blocks so run it in a thread
+
+        Args:
+            member (discord.Member): The member
+            score (ScoreObject): The member's score
+
+        Returns:
+            float: The CPU time the thread spent on it, in seconds
+        """
+
+        from image import MemberColumn  # pylint: disable=C0415
+
+        start = time.thread_time()
+
+        # The same size the grid draws its columns at
+        size = (COL_WIDTH + (SHADOW_OFFSET_X * -1), COL_HEIGHT + SHADOW_OFFSET_Y)
+        column = MemberColumn(member, score, size)
+        asyncio.run(column.draw())  # the avatar is cached, so nothing is awaited for long
+        column.cache_tile()
+
+        return time.thread_time() - start
+
+    async def prewarm(self) -> None:
+        """Download the missing avatars, then draw the missing columns"""
+
+        # Imported here so the image libraries load off the startup path
+        from image import avatar_cache, tile_cache, fetch_avatar, MemberColumn  # pylint: disable=C0415
+
+        members, columns = self.targets()
+
+        for member in members:
+            url = member.display_avatar.url
+            if url in avatar_cache:
+                continue
+
+            try:
+                data = await fetch_avatar(url)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                log.debug("Couldn't prewarm the avatar of %s", member.id)
+                continue
+
+            self.avatars += 1
+            self.downloaded += len(data)
+            await asyncio.sleep(len(data) / PREWARM_BANDWIDTH)
+
+        for member, score in columns:
+            if MemberColumn.tile_key(member, score) in tile_cache:
+                continue
+
+            # Renders someone is waiting on always come first
+            while not self.renders_idle():
+                self.deferred += 1
+                await asyncio.sleep(IDLE_POLL)
+
+            # The avatar may not have fit in the cache or failed to download
+            if member.display_avatar.url not in avatar_cache:
+                continue
+
+            cpu_seconds = await asyncio.to_thread(self.draw_column, member, score)
+            self.tiles += 1
+            self.cpu_seconds += cpu_seconds
+            await asyncio.sleep(cpu_seconds * (1 / PREWARM_CPU_SHARE - 1))
+
+    async def _worker(self) -> None:
+        """Prewarm every interval until cancelled"""
+
+        while True:
+            await asyncio.sleep(self.interval)
+
+            try:
+                await self.prewarm()
+            except Exception:  # pylint: disable=W0703
+                log.exception("Prewarming failed")
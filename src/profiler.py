@@ -0,0 +1,220 @@
+"""On demand profiling of the running bot
+
+A ProfileSession samples the stacks of every thread, or runs cProfile on
+the event loop's thread, and traces allocations with tracemalloc for a
+while. The results only keep code in the chosen scope and are written to
+the logs directory: collapsed stacks that flame graph tools read, or
+cProfile stats, plus the allocations that grew the most.
+"""
+
+import re
+import sys
+import asyncio
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+from cProfile import Profile
+from datetime import datetime
+from pathlib import Path
+from pstats import Stats
+from types import CodeType
+
+from constants import (
+    LOGS,
+    LOG_FILENAME_FORMAT_PREFIX,
+    PROFILE_SAMPLE_INTERVAL,
+    PROFILE_TRACEMALLOC_FRAMES,
+    PROFILE_TOP_ALLOCATIONS
+)
+
+
+log = logging.getLogger(__name__)
+
+# The source files each scope keeps, by the end of their path
+SCOPES = {
+    "all": (),
+    "render": ("image.py", "scheduler.py"),
+    "db": ("db/db.py", "db/storage.py", "db/transfer.py"),
+    "listeners": ("ext/listeners.py", "cooldown.py", "rewards.py", "xp.py")
+}
+MODES = ("sample", "cprofile")
+
+
+class ProfileSession:
+    """Profiles the bot until stopped, then writes what it found"""
+
+    def __init__(self, scope: str="all", mode: str="sample"):
+        if scope not in SCOPES:
+            raise ValueError(f"Scope must be one of {', '.join(SCOPES)}")
+
+        if mode not in MODES:
+            raise ValueError(f"Mode must be one of {', '.join(MODES)}")
+
+        self.scope = scope
+        self.mode = mode
+        self.suffixes = SCOPES[scope]
+
+        self.samples: Counter[str] = Counter()
+        self.profile: Profile = None
+        self.sampler: threading.Thread = None
+        self.stopped = threading.Event()
+        self.in_scope: dict[CodeType, bool] = {}
+
+        self.snapshot: tracemalloc.Snapshot = None
+        self.allocations: list[tracemalloc.StatisticDiff] = []
+        self.started_tracing = False
+
+        self.requests = 0
+        self.max_requests = 0
+        self.done = asyncio.Event()
+
+    def matches(self, code: CodeType) -> bool:
+        """Check whether a function belongs to the session's scope
+
+        Args:
+            code (CodeType): The function's code object
+
+        Returns:
+            bool: True if the code is in scope
+        """
+
+        if (match := self.in_scope.get(code)) is None:
+            filename = code.co_filename.replace("\\", "/")
+            match = self.in_scope[code] = not self.suffixes or any(
+                filename.endswith("/" + suffix) for suffix in self.suffixes
+            )
+
+        return match
+
+    def start(self) -> None:
+        """Start profiling, cProfile only sees the thread this is called on"""
+
+        log.info("Starting %s profile of %s", self.mode, self.scope)
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+            self.started_tracing = True
+
+        self.snapshot = tracemalloc.take_snapshot()
+
+        if self.mode == "cprofile":
+            self.profile = Profile()
+            self.profile.enable()
+        else:
+            self.sampler = threading.Thread(
+                target=self._sample, name="profile-sampler", daemon=True
+            )
+            self.sampler.start()
+
+    def _sample(self) -> None:
+        """Count the in scope stacks of every other thread until stopped"""
+
+        own_id = threading.get_ident()
+
+        while not self.stopped.wait(PROFILE_SAMPLE_INTERVAL):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+            for thread_id, frame in sys._current_frames().items():  # pylint: disable=W0212
+                if thread_id == own_id:
+                    continue
+
+                stack = []
+                in_scope = False
+                while frame is not None:
+                    code = frame.f_code
+                    in_scope = in_scope or self.matches(code)
+                    stack.append(
+                        f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+                    )
+                    frame = frame.f_back
+
+                if in_scope:
+                    stack.append(names.get(thread_id, str(thread_id)))
+                    self.samples[";".join(reversed(stack))] += 1
+
+    def request(self) -> None:
+        """Count a request, finishing the session once there have been enough"""
+
+        self.requests += 1
+        if self.max_requests and self.requests >= self.max_requests:
+            self.done.set()
+
+    async def wait(self, seconds: float, requests: int=0) -> None:
+        """Wait until the time is up or enough requests have been counted
+
+        Args:
+            seconds (float): The longest to wait
+            requests (int): The requests to wait for, 0 to only wait for the time
+        """
+
+        self.max_requests = requests
+
+        try:
+            await asyncio.wait_for(self.done.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    def stop(self) -> None:
+        """Stop profiling, call on the same thread as start"""
+
+        if self.profile is not None:
+            self.profile.disable()
+
+        if self.sampler is not None:
+            self.stopped.set()
+            self.sampler.join()
+
+        # Keep only the allocations made from code in scope
+        snapshot = tracemalloc.take_snapshot()
+        if self.suffixes:
+            filters = [
+                tracemalloc.Filter(True, f"*/{suffix}", all_frames=True)
+                for suffix in self.suffixes
+            ]
+            snapshot = snapshot.filter_traces(filters)
+            self.snapshot = self.snapshot.filter_traces(filters)
+
+        self.allocations = snapshot.compare_to(self.snapshot, "lineno")
+
+        if self.started_tracing:
+            tracemalloc.stop()
+
+        log.info("Stopped profile of %s after %s requests", self.scope, self.requests)
+
+    def write(self) -> list[Path]:
+        """Write the results to the logs directory
+
+        Returns:
+            list[Path]: The files written
+        """
+
+        directory = Path(LOGS) / "profiles"
+        directory.mkdir(parents=True, exist_ok=True)
+
+        timestamp = datetime.now().strftime(LOG_FILENAME_FORMAT_PREFIX)
+        stem = f"{timestamp} {self.scope}"
+        paths = []
+
+        if self.profile is not None:
+            self.profile.dump_stats(path := directory / f"{stem}.prof")
+            paths.append(path)
+
+            with (path := directory / f"{stem}.stats.txt").open("w", encoding="utf-8") as file:
+                stats = Stats(self.profile, stream=file).sort_stats("cumulative")
+                restrictions = ["|".join(map(re.escape, self.suffixes))] if self.suffixes else []
+                stats.print_stats(*restrictions)
+            paths.append(path)
+        else:
+            with (path := directory / f"{stem}.folded").open("w", encoding="utf-8") as file:
+                for stack, count in self.samples.most_common():
+                    file.write(f"{stack} {count}\n")
+            paths.append(path)
+
+        with (path := directory / f"{stem}.alloc.txt").open("w", encoding="utf-8") as file:
+            for stat in self.allocations[:PROFILE_TOP_ALLOCATIONS]:
+                file.write(f"{stat}\n")
+        paths.append(path)
+
+        log.info("Wrote profile to %s", ", ".join(map(str, paths)))
+        return paths
@@ -0,0 +1,186 @@
+"""Queue for handing out level up rewards and announcements"""
+
+import logging
+import asyncio
+from dataclasses import dataclass
+
+import discord
+
+from constants import (
+    REWARD_QUEUE_SIZE,
+    REWARD_BATCH_SECONDS,
+    REWARD_ACTION_INTERVAL
+)
+
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class LevelUp:
+    """A member reaching a new level"""
+
+    member: discord.Member
+    channel: discord.abc.Messageable
+    old_level: int
+    new_level: int
+    role_ids: list[int]
+    announce: bool
+    announce_channel_id: int = None
+
+
+class RewardQueue:
+    """Batches level ups and applies them at a pace Discord's rate limits allow
+
+    on_message only ever puts level ups on the queue. A single worker
+    collects them for a short window, merges repeated level ups of the same
+    member into one role edit, and groups announcements by channel, so a
+    burst of level ups becomes a handful of requests spread over time.
+    """
+
+    def __init__(self, max_size: int=REWARD_QUEUE_SIZE):
+        self.queue: asyncio.Queue[LevelUp] = asyncio.Queue(max_size)
+        self.worker: asyncio.Task = None
+
+        self.processed = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        """Start the worker task"""
+
+        self.worker = asyncio.create_task(self._worker(), name="reward-worker")
+
+    async def stop(self) -> None:
+        """Stop the worker task"""
+
+        if self.worker is not None:
+            self.worker.cancel()
+            await asyncio.gather(self.worker, return_exceptions=True)
+
+    def put(self, level_up: LevelUp) -> None:
+        """Queue a level up without waiting
+
+        Args:
+            level_up (LevelUp): The level up
+        """
+
+        try:
+            self.queue.put_nowait(level_up)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            log.warning("Reward queue is full, dropping level up of %s", level_up.member.id)
+
+    async def _collect(self) -> list[LevelUp]:
+        """Wait for a level up, then gather any others that arrive soon after"""
+
+        batch = [await self.queue.get()]
+        await asyncio.sleep(REWARD_BATCH_SECONDS)
+
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+
+        return batch
+
+    async def _worker(self) -> None:
+        """Apply batches of level ups until cancelled"""
+
+        while True:
+            batch = await self._collect()
+
+            # A member or guild that went away mid batch mustn't stop the
+            # worker, every later level up would wait on the queue forever
+            try:
+                await self.apply(batch)
+            except Exception:  # pylint: disable=W0703
+                log.exception("Applying %s level ups failed", len(batch))
+
+            self.processed += len(batch)
+
+    @staticmethod
+    def merge(batch: list[LevelUp]) -> list[LevelUp]:
+        """Merge level ups of the same member into one
+
+        Args:
+            batch (list[LevelUp]): The level ups, oldest first
+
+        Returns:
+            list[LevelUp]: One level up per member, in the order they were first seen
+        """
+
+        # The first old level and the last new level are kept
+        merged: dict[tuple[int, int], LevelUp] = {}
+        for level_up in batch:
+            key = (level_up.member.guild.id, level_up.member.id)
+            if (previous := merged.get(key)) is None:
+                merged[key] = level_up
+                continue
+
+            previous.new_level = max(previous.new_level, level_up.new_level)
+            previous.role_ids.extend(
+                role_id for role_id in level_up.role_ids
+                if role_id not in previous.role_ids
+            )
+            previous.channel = level_up.channel
+
+        return list(merged.values())
+
+    async def apply(self, batch: list[LevelUp]) -> None:
+        """Give the roles and send the announcements of a batch of level ups
+
+        Args:
+            batch (list[LevelUp]): The level ups, oldest first
+        """
+
+        announcements: dict[int, list[LevelUp]] = {}
+
+        for level_up in self.merge(batch):
+            if level_up.role_ids:
+                await self.give_roles(level_up)
+                await asyncio.sleep(REWARD_ACTION_INTERVAL)
+
+            if level_up.announce:
+                channel_id = level_up.announce_channel_id or level_up.channel.id
+                announcements.setdefault(channel_id, []).append(level_up)
+
+        for channel_id, level_ups in announcements.items():
+            await self.announce(channel_id, level_ups)
+            await asyncio.sleep(REWARD_ACTION_INTERVAL)
+
+    async def give_roles(self, level_up: LevelUp) -> None:
+        """Give a member the reward roles of their new levels in one request
+
+        Args:
+            level_up (LevelUp): The level up
+        """
+
+        guild = level_up.member.guild
+        roles = [discord.Object(role_id) for role_id in level_up.role_ids]
+
+        log.debug("Giving %s reward roles to member %s", len(roles), level_up.member.id)
+        try:
+            await level_up.member.add_roles(*roles, reason=f"Reached level {level_up.new_level}")
+        except discord.HTTPException as error:
+            log.warning("Couldn't give reward roles in guild %s: %s", guild.id, error)
+
+    async def announce(self, channel_id: int, level_ups: list[LevelUp]) -> None:
+        """Announce the level ups in a channel with a single message
+
+        Args:
+            channel_id (int): The channel's ID
+            level_ups (list[LevelUp]): The level ups to announce
+        """
+
+        guild = level_ups[0].member.guild
+        if (channel := guild.get_channel_or_thread(channel_id)) is None:
+            log.debug("Announcement channel %s no longer exists", channel_id)
+            return
+
+        lines = [
+            f"{level_up.member.mention} reached **level {level_up.new_level}**!"
+            for level_up in level_ups
+        ]
+
+        try:
+            await channel.send("\n".join(lines)[:2000])
+        except discord.HTTPException as error:
+            log.warning("Couldn't announce level ups in channel %s: %s", channel_id, error)
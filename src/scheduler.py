@@ -0,0 +1,212 @@
+"""Admission control and scheduling for image renders"""
+
+import logging
+import asyncio
+from dataclasses import dataclass, field
+from enum import IntEnum
+from itertools import count
+from typing import Awaitable, Callable
+
+from discord import File
+
+from constants import (
+    RENDER_WORKERS,
+    RENDER_QUEUE_SIZE,
+    RENDER_DEADLINE_INTERACTION,
+    RENDER_DEADLINE_COMMAND
+)
+
+
+log = logging.getLogger(__name__)
+
+
+class RenderPriority(IntEnum):
+    """Priority of a render job, lower values are rendered first
+
+    Interactions come first because they have a follow-up window to
+    respect, and rank cards come before grids because they are cheaper.
+    """
+
+    INTERACTION_RANK = 0
+    INTERACTION_SCOREBOARD = 1
+    COMMAND_RANK = 2
+    COMMAND_SCOREBOARD = 3
+
+    @property
+    def is_interaction(self) -> bool:
+        """Whether the job was requested through an interaction"""
+
+        return self in (self.INTERACTION_RANK, self.INTERACTION_SCOREBOARD)
+
+    @property
+    def deadline(self) -> float:
+        """The default time in seconds a job of this priority can wait"""
+
+        if self.is_interaction:
+            return RENDER_DEADLINE_INTERACTION
+
+        return RENDER_DEADLINE_COMMAND
+
+
+class SchedulerSaturated(Exception):
+    """Raised when the render queue is full"""
+
+
+class RenderExpired(Exception):
+    """Raised when a render job missed its deadline"""
+
+
+class RenderTooLarge(Exception):
+    """Raised when a render would use more memory than it is allowed"""
+
+
+@dataclass(order=True)
+class RenderJob:
+    """A queued render, ordered by priority then submission order"""
+
+    priority: RenderPriority
+    sequence: int
+    deadline: float = field(compare=False)
+    render: Callable[[], Awaitable[File]] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class RenderScheduler:
+    """A bounded priority queue of render jobs with per-job deadlines"""
+
+    def __init__(self, workers: int=RENDER_WORKERS, max_queue: int=RENDER_QUEUE_SIZE):
+        self.worker_count = workers
+        self.queue: asyncio.PriorityQueue[RenderJob] = asyncio.PriorityQueue(max_queue)
+        self.workers: list[asyncio.Task] = []
+        self.sequence = count()
+        self.active = 0
+
+        # Counters for monitoring how the scheduler copes with load
+        self.completed = 0
+        self.rejected = 0
+        self.expired = 0
+        self.too_large = 0
+        self.failed = 0
+
+    @property
+    def saturated(self) -> bool:
+        """Whether new jobs would be rejected"""
+
+        return self.queue.full()
+
+    @property
+    def idle(self) -> bool:
+        """Whether nothing is being rendered or waiting to be"""
+
+        return self.active == 0 and self.queue.empty()
+
+    def start(self) -> None:
+        """Start the worker tasks"""
+
+        log.debug("Starting %s render workers", self.worker_count)
+        self.workers = [
+            asyncio.create_task(self._worker(), name=f"render-worker-{i}")
+            for i in range(self.worker_count)
+        ]
+
+    async def stop(self) -> None:
+        """Stop the worker tasks and fail any jobs still queued"""
+
+        log.debug("Stopping render workers")
+        for worker in self.workers:
+            worker.cancel()
+
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers.clear()
+
+        while not self.queue.empty():
+            job = self.queue.get_nowait()
+            if not job.future.done():
+                job.future.set_exception(SchedulerSaturated("Scheduler stopped"))
+
+    def submit(
+        self,
+        render: Callable[[], Awaitable[File]],
+        priority: RenderPriority,
+        timeout: float=None
+    ) -> asyncio.Future:
+        """Queue a render job
+
+        Args:
+            render (Callable): Coroutine function that produces the file
+            priority (RenderPriority): The priority of the job
+            timeout (float): Seconds until the job is stale, defaults to
+                the deadline of the priority
+
+        Raises:
+            SchedulerSaturated: The queue is full
+
+        Returns:
+            asyncio.Future: Resolves to the rendered file, or raises
+                RenderExpired if the job went stale
+        """
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or priority.deadline)
+        job = RenderJob(priority, next(self.sequence), deadline, render, loop.create_future())
+
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull as error:
+            self.rejected += 1
+            log.warning("Render queue is saturated, rejecting %s job", priority.name)
+            raise SchedulerSaturated from error
+
+        return job.future
+
+    async def _worker(self) -> None:
+        """Take jobs off the queue and render them until cancelled"""
+
+        loop = asyncio.get_running_loop()
+
+        while True:
+            job = await self.queue.get()
+
+            try:
+                # The caller may have given up on the job already
+                if job.future.done():
+                    continue
+
+                remaining = job.deadline - loop.time()
+                if remaining <= 0:
+                    self.expired += 1
+                    log.warning("Dropping stale %s render job", job.priority.name)
+                    job.future.set_exception(RenderExpired)
+                    continue
+
+                self.active += 1
+                try:
+                    result = await asyncio.wait_for(job.render(), remaining)
+                except asyncio.TimeoutError:
+                    self.expired += 1
+                    log.warning("%s render job missed its deadline", job.priority.name)
+                    result = RenderExpired()
+                except RenderTooLarge as error:
+                    # A budget doing its job, not a failure
+                    self.too_large += 1
+                    log.warning("%s render job is too large: %s", job.priority.name, error)
+                    result = error
+                except Exception as error:  # pylint: disable=W0703
+                    self.failed += 1
+                    log.exception("%s render job failed", job.priority.name)
+                    result = error
+                else:
+                    self.completed += 1
+                finally:
+                    self.active -= 1
+
+                if job.future.done():
+                    continue
+
+                if isinstance(result, Exception):
+                    job.future.set_exception(result)
+                else:
+                    job.future.set_result(result)
+
+            finally:
+                self.queue.task_done()
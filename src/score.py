@@ -1,111 +1,122 @@
 """File for handling and calculating scores"""
 
 import logging
-from dataclasses import dataclass
-from math import sqrt, ceil
+from dataclasses import dataclass, field
+from typing import Iterable
 
-from db import db
+from db import Storage, get_storage
+from levels import LevelCurve, DEFAULT_CURVE
 
 
 log = logging.getLogger(__name__)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ScoreObject:
-    """Score object"""
+    """A member's score and everything the cards show about it
 
-    member_id: int
-    guild_id: int
-    _score: int
-
-    @property
-    def rank(self) -> str:
-        """Get the rank of the score
-
-        Returns:
-            str: The rank
-        """
-
-        return db.field(
-            "SELECT row_number FROM "
-                "(SELECT member_id, row_number() OVER "
-                "( ORDER BY score DESC ) AS row_number FROM scores "
-                "WHERE guild_id = ? AND active = 1) "
-            "WHERE member_id = ?",
-            self.guild_id, self.member_id
-        )
-
-    @property
-    def level(self) -> float:
-        """Get the level of the score
-
-        Returns:
-            int: The level
-        """
-
-        return (0.07 * sqrt(max(self._score, 1))) + 1
-
-    @property
-    def score(self) -> int:
-        """Get the score obtained in the current level
-
-        Returns:
-            int: Score obtained in the current level
-        """
+    The level and progress are worked out once when the object is made,
+    since the cards read them many times. The rank is looked up by the
+    constructors, a guild_id of None means the global score and rank.
+    The history is the score gained on each recent day, oldest first.
+    The curve is the guild's, see levels.py, at its last level the
+    progress stays full.
+    """
 
-        return self._score - self.prev_level_score
+    member_id: int
+    guild_id: int | None
+    total_score: int
+    rank: int | None
+    history: tuple[int, ...] = ()
+    curve: LevelCurve = field(default=DEFAULT_CURVE, repr=False, compare=False)
+    level: int = field(init=False)
+    prev_level_score: int = field(init=False)
+    next_level_score: int = field(init=False)
+    score: int = field(init=False)
+    progress: float = field(init=False)
+
+    def __post_init__(self):
+        level, prev_level_score, next_level_score = self.curve.bounds(self.total_score)
+        score = self.total_score - prev_level_score
+
+        if next_level_score is None:
+            next_level_score = self.total_score
+            progress = 100.0
+        else:
+            progress = score / (next_level_score - prev_level_score) * 100
+
+        # Frozen, so the derived fields have to be set around __setattr__
+        object.__setattr__(self, "level", level)
+        object.__setattr__(self, "prev_level_score", prev_level_score)
+        object.__setattr__(self, "next_level_score", next_level_score)
+        object.__setattr__(self, "score", score)
+        object.__setattr__(self, "progress", progress)
+
+    @classmethod
+    def fetch(
+        cls,
+        member_id: int,
+        guild_id: int | None,
+        storage: Storage=None,
+        history_days: int=0,
+        curve: LevelCurve=None
+    ) -> "ScoreObject":
+        """Look up a member's score and rank
 
-    @property
-    def total_score(self) -> int:
-        """Get the total score
+        Args:
+            member_id (int): The member's ID
+            guild_id (int, None): The guild's ID, or None for the global score
+            storage (Storage, None): The storage to read, defaults to the bot's
+            history_days (int): How many days of history to get, if any
+            curve (LevelCurve, None): The guild's level curve, defaults to
+                the default curve
 
         Returns:
-            int: The total score
+            ScoreObject: The score, 0 if the member has none
         """
 
-        return self._score
-
-    @property
-    def next_level_score(self) -> float:
-        """Get the score required for the next level
-
-        Returns:
-            int: The score required for the next level
-        """
+        storage = storage or get_storage()
 
-        return (ceil(self.level - 1) / 0.07) ** 2
+        if guild_id is None:
+            score = storage.global_score(member_id)
+            rank = storage.global_rank(member_id)
+        else:
+            score = storage.score(member_id, guild_id)
+            rank = storage.rank(member_id, guild_id)
 
-    @property
-    def prev_level_score(self) -> float:
-        """Get the score required for the previous level
+        history = tuple(storage.history(member_id, guild_id, history_days)) if history_days else ()
+        return cls(member_id, guild_id, score or 0, rank, history, curve or DEFAULT_CURVE)
 
-        Returns:
-            int: The score required for the previous level
-        """
+    @classmethod
+    def ranked(
+        cls,
+        rows: Iterable[tuple[int, int]],
+        guild_id: int | None,
+        start: int=1,
+        curve: LevelCurve=None
+    ) -> list["ScoreObject"]:
+        """Make score objects from rows already in rank order
 
-        return (ceil(self.level - 2) / 0.07) ** 2
+        The rank comes from each row's position, so a whole scoreboard
+        needs no queries beyond the one that got the rows.
 
-    @property
-    def progress(self) -> float:
-        """Get the progress to the next level
+        Args:
+            rows (Iterable[tuple[int, int]]): member_id and score pairs,
+                highest first, like the ones Storage.top returns
+            guild_id (int, None): The guild's ID, or None for global scores
+            start (int): The rank of the first row
+            curve (LevelCurve, None): The guild's level curve, defaults to
+                the default curve
 
         Returns:
-            float: The progress to the next level
+            list[ScoreObject]: The score objects
         """
 
-        return (
-            self.score /
-            (self.next_level_score - self.prev_level_score)
-        ) * 100
-
-    def set_score(self, score: int) -> None:
-        """Set the score
-
-        Args:
-            score (int): The score
-        """
-
-        self._score = score
+        curve = curve or DEFAULT_CURVE
+        return [
+            cls(member_id, guild_id, score, rank, curve=curve)
+            for rank, (member_id, score) in enumerate(rows, start=start)
+        ]
 
     def __str__(self) -> str:
         """Get the string representation of the score object
@@ -115,19 +126,3 @@ class ScoreObject:
         """
 
         return f"Level {self.level} (#{self.rank})"
-
-    def __repr__(self) -> str:
-        return (
-            "ScoreObject("
-            f"\n\tmember_id={self.member_id}, "
-            f"\n\tguild_id={self.guild_id}, "
-            f"\n\t_score={self._score}"
-            f"\n\trank={self.rank}, "
-            f"\n\tlevel={self.level}, "
-            f"\n\tscore={self.score}, "
-            f"\n\ttotal_score={self.total_score}, "
-            f"\n\tnext_level_score={self.next_level_score}, "
-            f"\n\tprev_level_score={self.prev_level_score}, "
-            f"\n\tprogress={self.progress}"
-            "\n)"
-        )
@@ -0,0 +1,325 @@
+"""Per guild rules for how much XP a message is worth and what levels reward"""
+
+import logging
+from dataclasses import dataclass, field
+from random import randint
+
+import discord
+
+from db import db
+from levels import LevelCurve, DEFAULT_CURVE, make_curve
+from constants import DEFAULT_BASE_XP
+
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class XPRules:
+    """A guild's XP rules compiled into lookups"""
+
+    base_xp: int = DEFAULT_BASE_XP
+    random_min: int = 0
+    random_max: int = 0
+    channel_multipliers: dict[int, float] = field(default_factory=dict)
+    role_multipliers: dict[int, float] = field(default_factory=dict)
+    ignored_channels: frozenset[int] = frozenset()
+    level_rewards: dict[int, tuple[int, ...]] = field(default_factory=dict)
+    announce: bool = False
+    announce_channel_id: int = None
+    curve: LevelCurve = DEFAULT_CURVE
+
+    def rewards_between(self, old_level: int, new_level: int) -> list[int]:
+        """Get the reward roles for the levels after old_level up to new_level
+
+        Args:
+            old_level (int): The level before the message
+            new_level (int): The level after the message
+
+        Returns:
+            list[int]: The IDs of the roles to give
+        """
+
+        if not self.level_rewards:
+            return []
+
+        return [
+            role_id
+            for level in range(old_level + 1, new_level + 1)
+            for role_id in self.level_rewards.get(level, ())
+        ]
+
+    def evaluate(self, channel: discord.abc.Messageable, member: discord.Member) -> int:
+        """Work out the XP a message is worth
+
+        Args:
+            channel (discord.abc.Messageable): The channel the message was sent in
+            member (discord.Member): The author of the message
+
+        Returns:
+            int: The XP, 0 if the message shouldn't be scored
+        """
+
+        # Threads follow the rules of the channel they're in
+        parent_id = getattr(channel, "parent_id", None)
+
+        if channel.id in self.ignored_channels or parent_id in self.ignored_channels:
+            return 0
+
+        xp = self.base_xp
+        if self.random_max:
+            xp += randint(self.random_min, self.random_max)
+
+        multiplier = self.channel_multipliers.get(
+            channel.id, self.channel_multipliers.get(parent_id, 1)
+        )
+
+        # The member gets the best multiplier out of their roles
+        if self.role_multipliers:
+            multiplier *= max(
+                (self.role_multipliers[role.id] for role in member.roles
+                 if role.id in self.role_multipliers),
+                default=1
+            )
+
+        return max(round(xp * multiplier), 0)
+
+
+class XPRulesCache:
+    """Compiled XP rules for each guild, compiled again after a change"""
+
+    def __init__(self):
+        self.rules: dict[int, XPRules] = {}
+
+    def get(self, guild_id: int) -> XPRules:
+        """Get the compiled rules of a guild
+
+        Args:
+            guild_id (int): The guild's ID
+
+        Returns:
+            XPRules: The rules
+        """
+
+        if (rules := self.rules.get(guild_id)) is None:
+            rules = self.rules[guild_id] = self.compile(guild_id)
+
+        return rules
+
+    def invalidate(self, guild_id: int) -> None:
+        """Forget a guild's compiled rules so the next message compiles them
+
+        Args:
+            guild_id (int): The guild's ID
+        """
+
+        self.rules.pop(guild_id, None)
+
+    @staticmethod
+    def compile(guild_id: int) -> XPRules:
+        """Read a guild's config and compile it into rules
+
+        Args:
+            guild_id (int): The guild's ID
+
+        Returns:
+            XPRules: The rules
+        """
+
+        log.debug("Compiling XP rules for guild %s", guild_id)
+
+        config = db.record(
+            "SELECT base_xp, random_min, random_max FROM xp_config WHERE guild_id = ?",
+            guild_id
+        ) or (DEFAULT_BASE_XP, 0, 0)
+
+        channel_multipliers = dict(db.records(
+            "SELECT channel_id, multiplier FROM xp_channel_multipliers WHERE guild_id = ?",
+            guild_id
+        ))
+        role_multipliers = dict(db.records(
+            "SELECT role_id, multiplier FROM xp_role_multipliers WHERE guild_id = ?",
+            guild_id
+        ))
+        ignored_channels = frozenset(db.column(
+            "SELECT channel_id FROM xp_ignored_channels WHERE guild_id = ?",
+            guild_id
+        ))
+
+        level_rewards: dict[int, tuple[int, ...]] = {}
+        for level, role_id in db.records(
+            "SELECT level, role_id FROM level_rewards WHERE guild_id = ?",
+            guild_id
+        ):
+            level_rewards[level] = level_rewards.get(level, ()) + (role_id, )
+
+        announcements = db.record(
+            "SELECT channel_id FROM level_announcements WHERE guild_id = ?",
+            guild_id
+        )
+
+        curve = DEFAULT_CURVE
+        if (curve_config := db.record(
+            "SELECT kind, value FROM level_curves WHERE guild_id = ?",
+            guild_id
+        )) is not None:
+            try:
+                curve = make_curve(*curve_config)
+            except ValueError:
+                log.warning("Guild %s has a broken level curve, using the default", guild_id)
+
+        return XPRules(
+            *config,
+            channel_multipliers,
+            role_multipliers,
+            ignored_channels,
+            level_rewards,
+            announce=announcements is not None,
+            announce_channel_id=announcements[0] if announcements else None,
+            curve=curve
+        )
+
+    def set_base_xp(self, guild_id: int, base_xp: int, random_min: int=0, random_max: int=0):
+        """Set the XP a message is worth before multipliers
+
+        Args:
+            guild_id (int): The guild's ID
+            base_xp (int): The XP every message gets
+            random_min (int): The smallest random bonus
+            random_max (int): The largest random bonus, 0 for no bonus
+        """
+
+        db.execute(
+            "INSERT INTO xp_config (guild_id, base_xp, random_min, random_max) "
+            "VALUES (?, ?, ?, ?) ON CONFLICT (guild_id) DO UPDATE SET "
+            "base_xp = excluded.base_xp, random_min = excluded.random_min, "
+            "random_max = excluded.random_max",
+            guild_id, base_xp, random_min, random_max
+        )
+        self.invalidate(guild_id)
+
+    def set_channel_multiplier(self, guild_id: int, channel_id: int, multiplier: float):
+        """Set a channel's multiplier, a multiplier of 1 removes it
+
+        Args:
+            guild_id (int): The guild's ID
+            channel_id (int): The channel's ID
+            multiplier (float): The multiplier
+        """
+
+        self._set_multiplier("xp_channel_multipliers", "channel_id", guild_id, channel_id, multiplier)
+
+    def set_role_multiplier(self, guild_id: int, role_id: int, multiplier: float):
+        """Set a role's multiplier, a multiplier of 1 removes it
+
+        Args:
+            guild_id (int): The guild's ID
+            role_id (int): The role's ID
+            multiplier (float): The multiplier
+        """
+
+        self._set_multiplier("xp_role_multipliers", "role_id", guild_id, role_id, multiplier)
+
+    def _set_multiplier(self, table: str, column: str, guild_id: int, target_id: int, multiplier: float):
+        """Upsert or delete a row in one of the multiplier tables"""
+
+        if multiplier == 1:
+            db.execute(
+                f"DELETE FROM {table} WHERE guild_id = ? AND {column} = ?",
+                guild_id, target_id
+            )
+        else:
+            db.execute(
+                f"INSERT INTO {table} (guild_id, {column}, multiplier) VALUES (?, ?, ?) "
+                f"ON CONFLICT (guild_id, {column}) DO UPDATE SET multiplier = excluded.multiplier",
+                guild_id, target_id, multiplier
+            )
+
+        self.invalidate(guild_id)
+
+    def set_level_reward(self, guild_id: int, level: int, role_id: int, rewarded: bool):
+        """Add or remove a role reward for reaching a level
+
+        Args:
+            guild_id (int): The guild's ID
+            level (int): The level
+            role_id (int): The role's ID
+            rewarded (bool): Whether the role is given at the level
+        """
+
+        if rewarded:
+            db.execute(
+                "INSERT OR IGNORE INTO level_rewards (guild_id, level, role_id) VALUES (?, ?, ?)",
+                guild_id, level, role_id
+            )
+        else:
+            db.execute(
+                "DELETE FROM level_rewards WHERE guild_id = ? AND level = ? AND role_id = ?",
+                guild_id, level, role_id
+            )
+
+        self.invalidate(guild_id)
+
+    def set_announcements(self, guild_id: int, enabled: bool, channel_id: int=None):
+        """Turn level up announcements on or off
+
+        Args:
+            guild_id (int): The guild's ID
+            enabled (bool): Whether to announce level ups
+            channel_id (int, None): The channel to announce in, None to
+                announce where the member sent the message
+        """
+
+        if enabled:
+            db.execute(
+                "INSERT INTO level_announcements (guild_id, channel_id) VALUES (?, ?) "
+                "ON CONFLICT (guild_id) DO UPDATE SET channel_id = excluded.channel_id",
+                guild_id, channel_id
+            )
+        else:
+            db.execute("DELETE FROM level_announcements WHERE guild_id = ?", guild_id)
+
+        self.invalidate(guild_id)
+
+    def set_level_curve(self, guild_id: int, kind: str, value: str=None):
+        """Set the curve scores are turned into levels with
+
+        Args:
+            guild_id (int): The guild's ID
+            kind (str): quadratic, linear or table, see levels.make_curve
+            value (str, None): The curve's factor, XP per level or table
+
+        Raises:
+            ValueError: The config doesn't make a curve
+        """
+
+        make_curve(kind, value)
+
+        db.execute(
+            "INSERT INTO level_curves (guild_id, kind, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (guild_id) DO UPDATE SET kind = excluded.kind, value = excluded.value",
+            guild_id, kind, value
+        )
+        self.invalidate(guild_id)
+
+    def set_ignored(self, guild_id: int, channel_id: int, ignored: bool):
+        """Ignore or stop ignoring messages in a channel
+
+        Args:
+            guild_id (int): The guild's ID
+            channel_id (int): The channel's ID
+            ignored (bool): Whether to ignore the channel
+        """
+
+        if ignored:
+            db.execute(
+                "INSERT OR IGNORE INTO xp_ignored_channels (guild_id, channel_id) VALUES (?, ?)",
+                guild_id, channel_id
+            )
+        else:
+            db.execute(
+                "DELETE FROM xp_ignored_channels WHERE guild_id = ? AND channel_id = ?",
+                guild_id, channel_id
+            )
+
+        self.invalidate(guild_id)
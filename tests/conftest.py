@@ -0,0 +1,84 @@
+"""Shared fixtures, every test gets databases of its own
+
+The bot's modules import their paths from constants when they're first
+imported, so the paths are pointed away from the real data here, before
+any test imports them.
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+# pylint: disable=C0413
+import constants
+
+SCRATCH = Path(tempfile.mkdtemp(prefix="onescore-tests-"))
+
+constants.DB_PATH = ":memory:"
+constants.BUILD_PATH = str(ROOT / "data" / "db" / "build.sql")
+constants.SHARD_BUILD_PATH = str(ROOT / "data" / "db" / "shard.sql")
+constants.SHARD_PATH = str(SCRATCH / "shards")
+constants.JOURNAL_PATH = str(SCRATCH / "scores.journal")
+constants.BACKUP_PATH = str(SCRATCH / "backups")
+constants.GATEWAY_BASELINE_PATH = str(SCRATCH / "gateway_baseline.json")
+
+from db import db, storage as storage_module
+
+
+def install(database: db.Database, monkeypatch) -> db.Database:
+    """Build a database and use it in place of the shared main one"""
+
+    database.build()
+
+    monkeypatch.setattr(db, "main", database)
+    for name in (
+        "build", "commit", "close", "field", "record", "records", "column",
+        "execute", "write", "multiexec", "stream", "scriptexec"
+    ):
+        monkeypatch.setattr(db, name, getattr(database, name))
+
+    return database
+
+
+@pytest.fixture
+def main_db(monkeypatch) -> db.Database:
+    """A fresh main database in memory, in place of the shared one"""
+
+    database = install(db.Database(":memory:"), monkeypatch)
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def file_db(monkeypatch, tmp_path) -> db.Database:
+    """A fresh main database in a file, for what needs other connections to it"""
+
+    database = install(db.Database(str(tmp_path / "db.sqlite")), monkeypatch)
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def sqlite_storage(main_db) -> storage_module.SQLiteStorage:
+    """Scores kept in the fresh main database"""
+
+    storage = storage_module.SQLiteStorage()
+    yield storage
+    if storage.journal is not None:
+        storage.journal.close()
+
+
+@pytest.fixture
+def sharded_storage(main_db, tmp_path) -> storage_module.ShardedSQLiteStorage:
+    """Scores kept in fresh shards"""
+
+    storage = storage_module.ShardedSQLiteStorage(str(tmp_path / "shards"))
+    yield storage
+    if storage.journal is not None:
+        storage.journal.close()
+    storage.router.close()
@@ -0,0 +1,147 @@
+"""Backups are verified, rotated, and restore what they copied"""
+
+import gzip
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from db import backup
+from db.storage import ShardedSQLiteStorage, SQLiteStorage
+
+
+@pytest.fixture
+def storage(file_db, monkeypatch) -> SQLiteStorage:
+    """Scores in the file database, installed as the bot's storage"""
+
+    installed = SQLiteStorage()
+    monkeypatch.setattr(backup, "get_storage", lambda: installed)
+
+    for member_id in range(1, 21):
+        installed.increment(member_id, 7, member_id * 10)
+    installed.commit()
+
+    return installed
+
+
+def scores(database) -> list[tuple]:
+    return database.records("SELECT member_id, guild_id, score FROM scores ORDER BY member_id")
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_backup_and_restore(storage, file_db, tmp_path, compress):
+    before = scores(file_db)
+
+    path = backup.create_backup(tmp_path / "backups", compress)
+    assert path.name.startswith("db-")
+    assert path.suffix == (".gz" if compress else ".sqlite")
+    assert not list(path.parent.glob("*.partial"))
+
+    # Lose some scores and gain others, restoring puts everything back
+    file_db.execute("DELETE FROM scores WHERE member_id > 10")
+    storage.increment(1, 7, 1000)
+    storage.commit()
+
+    backup.restore(path)
+    assert scores(file_db) == before
+    assert storage.global_score(1) == 10
+    assert storage.global_score(15) == 150
+
+
+def test_backups_are_single_files(storage, tmp_path):
+    path = backup.create_backup(tmp_path / "backups", compress=False)
+
+    assert [file.name for file in path.parent.iterdir()] == [path.name]
+    with closing(sqlite3.connect(path)) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+
+
+def test_uncommitted_writes_are_left_out(storage, file_db, tmp_path):
+    storage.increment(1, 7, 5)
+    storage.increment(99, 7, 5)
+
+    path = backup.create_backup(tmp_path, compress=False)
+    with closing(sqlite3.connect(path)) as conn:
+        assert conn.execute("SELECT COUNT(*), SUM(score) FROM scores").fetchone() == (20, 2100)
+
+    backup.verify(path, {"scores": 20, "global_scores": 20})
+
+
+def test_verify_rejects_damaged_backups(storage, tmp_path):
+    path = backup.create_backup(tmp_path, compress=False)
+
+    with pytest.raises(backup.BackupError):
+        backup.verify(path, {"scores": 19, "global_scores": 20})
+
+    damaged = tmp_path / "damaged.sqlite"
+    damaged.write_bytes(b"not a database" * 100)
+    with pytest.raises(backup.BackupError):
+        backup.verify(damaged)
+
+
+def test_restore_rejects_damaged_backups(storage, file_db, tmp_path):
+    before = scores(file_db)
+    damaged = tmp_path / "db-2026-01-01_00-00-00.sqlite.gz"
+    with gzip.open(damaged, "wb") as file:
+        file.write(b"not a database" * 100)
+
+    with pytest.raises(backup.BackupError):
+        backup.restore(damaged)
+
+    assert scores(file_db) == before
+
+
+def test_rotate(tmp_path):
+    names = [f"db-2026-01-0{day}_00-00-00.sqlite" for day in range(1, 6)]
+    names += ["db-2026-01-05_00-00-00_1.sqlite.gz", "shard-0-2026-01-01_00-00-00.sqlite", "notes.txt"]
+    for name in names:
+        (tmp_path / name).touch()
+
+    backup.rotate(tmp_path, keep=3)
+
+    assert [path.name for path in backup.list_backups(tmp_path)] == [
+        "db-2026-01-04_00-00-00.sqlite",
+        "db-2026-01-05_00-00-00.sqlite",
+        "db-2026-01-05_00-00-00_1.sqlite.gz"
+    ]
+
+    # Other databases' backups and other files are left alone
+    assert (tmp_path / "shard-0-2026-01-01_00-00-00.sqlite").exists()
+    assert (tmp_path / "notes.txt").exists()
+
+
+def test_backups_in_the_same_second_are_kept(storage, tmp_path):
+    paths = [backup.create_backup(tmp_path, compress=False) for _ in range(3)]
+
+    assert len(set(paths)) == 3
+    assert all(path.exists() for path in paths)
+
+
+def test_backup_all_shards(file_db, tmp_path, monkeypatch):
+    sharded = ShardedSQLiteStorage(str(tmp_path / "shards"))
+    monkeypatch.setattr(backup, "get_storage", lambda: sharded)
+
+    for guild_id in range(8):
+        sharded.increment(1, guild_id, 10)
+    sharded.commit()
+
+    paths = backup.backup_all(tmp_path / "backups", compress=True)
+    prefixes = [backup.PREFIX_PATTERN.match(path.name).group(1) for path in paths]
+    assert prefixes == ["db"] + [f"shard-{index}" for index in range(len(sharded.router))]
+
+    # Each backup restores into the database it was made from
+    sharded.router.shards[1].execute("DELETE FROM scores")
+    sharded.router.shards[1].commit()
+    backup.restore(paths[2])
+    assert sharded.score(1, 1) == 10
+    assert sharded.score(1, 5) == 10
+
+    sharded.router.close()
+
+
+def test_restore_of_a_missing_shard(storage, tmp_path):
+    path = tmp_path / "shard-3-2026-01-01_00-00-00.sqlite"
+    path.touch()
+
+    with pytest.raises(backup.BackupError):
+        backup.restore(path)
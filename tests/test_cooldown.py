@@ -0,0 +1,76 @@
+"""The cooldown wheel lets each member through once per window"""
+
+from cooldown import CooldownWheel
+
+
+def make_wheel(cooldown: float=60, resolution: float=1) -> tuple[CooldownWheel, float]:
+    """A wheel and the time it was made at, on a tick boundary"""
+
+    wheel = CooldownWheel(cooldown, resolution)
+    return wheel, wheel.tick * resolution
+
+
+def test_suppressed_within_the_window():
+    wheel, now = make_wheel()
+
+    assert wheel.hit(1, 2, now)
+    assert not wheel.hit(1, 2, now + 1)
+    assert not wheel.hit(1, 2, now + 59.9)
+    assert wheel.hit(1, 2, now + 60)
+    assert (wheel.allowed, wheel.suppressed) == (2, 2)
+
+
+def test_members_and_guilds_are_separate():
+    wheel, now = make_wheel()
+
+    assert wheel.hit(1, 2, now)
+    assert wheel.hit(1, 3, now)
+    assert wheel.hit(2, 2, now)
+    assert not wheel.hit(1, 3, now + 30)
+    assert len(wheel) == 3
+
+
+def test_expired_members_are_forgotten():
+    wheel, now = make_wheel()
+
+    for member_id in range(100):
+        wheel.hit(member_id, 2, now + member_id // 10)
+
+    wheel.advance(now + 65)
+    assert len(wheel) == 40
+
+    wheel.advance(now + 70)
+    assert len(wheel) == 0
+
+
+def test_long_gaps():
+    wheel, now = make_wheel()
+
+    assert wheel.hit(1, 2, now)
+
+    # Much longer than a turn of the wheel, everything has expired
+    assert wheel.hit(1, 2, now + 10000)
+    assert not wheel.hit(1, 2, now + 10001)
+    assert wheel.hit(1, 2, now + 10060)
+
+
+def test_time_going_backwards():
+    wheel, now = make_wheel()
+
+    assert wheel.hit(1, 2, now + 10)
+    assert not wheel.hit(1, 2, now)
+
+
+def test_coarse_resolution():
+    wheel, now = make_wheel(cooldown=60, resolution=15)
+
+    assert wheel.hit(1, 2, now)
+    assert not wheel.hit(1, 2, now + 59)
+    assert wheel.hit(1, 2, now + 60)
+
+
+def test_zero_disables():
+    wheel, now = make_wheel(cooldown=0)
+
+    assert all(wheel.hit(1, 2, now) for _ in range(5))
+    assert (wheel.allowed, wheel.suppressed, len(wheel)) == (5, 0, 0)
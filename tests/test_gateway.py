@@ -0,0 +1,68 @@
+"""Minimal intents' savings are estimated from a full intents baseline"""
+
+from datetime import timedelta
+
+import pytest
+
+from bot.gateway import GatewayStats
+
+
+def run(stats: GatewayStats, seconds: int, events) -> GatewayStats:
+    """Pretend the stats have been counting for a while"""
+
+    stats.since -= timedelta(seconds=seconds)
+    for event_type, size in events:
+        stats.record_size(size)
+        stats.record(event_type)
+
+    return stats
+
+
+def test_sizes_go_to_the_next_event(tmp_path):
+    stats = GatewayStats(False, tmp_path / "baseline.json")
+
+    # A heartbeat ack has a payload but no event type
+    stats.record_size(20)
+    stats.record_size(300)
+    stats.record("PRESENCE_UPDATE")
+    stats.record("MESSAGE_CREATE")
+
+    assert stats.sizes == {"PRESENCE_UPDATE": 300, "MESSAGE_CREATE": 0}
+
+
+def test_baseline_and_savings(tmp_path):
+    path = tmp_path / "baseline.json"
+    events = (
+        [("PRESENCE_UPDATE", 1024)] * 1200
+        + [("TYPING_START", 512)] * 600
+        + [("MESSAGE_CREATE", 2048)] * 300
+    )
+
+    full = run(GatewayStats(False, path), 600, events)
+    assert "would drop 1800 events" in full.summary()
+    assert full.save_baseline()
+
+    minimal = run(GatewayStats(True, path), 60, [("MESSAGE_CREATE", 0)] * 30)
+    baseline = minimal.load_baseline()
+    assert baseline["events"]["PRESENCE_UPDATE"] == pytest.approx(2, rel=1e-3)
+    assert baseline["bytes"]["TYPING_START"] == pytest.approx(512, rel=1e-3)
+    assert "MESSAGE_CREATE" not in baseline["events"]
+
+    # 3 events/s, 2.5 kB/s, for a minute
+    assert "saving an estimated 3.0 events/s (2.5 kB/s, 0.1 MB so far)" in minimal.summary()
+    assert not minimal.save_baseline()
+
+
+def test_short_runs_keep_the_baseline(tmp_path):
+    path = tmp_path / "baseline.json"
+
+    assert not run(GatewayStats(False, path), 60, [("PRESENCE_UPDATE", 10)]).save_baseline()
+    assert not path.exists()
+    assert "run with full intents for 10 minutes" in GatewayStats(True, path).summary()
+
+
+def test_unreadable_baseline(tmp_path):
+    path = tmp_path / "baseline.json"
+    path.write_text("{", encoding="utf-8")
+
+    assert GatewayStats(True, path).load_baseline() is None
@@ -0,0 +1,94 @@
+"""History rings keep the right days as they wrap around"""
+
+from db import history
+from db.history import HISTORY_DAYS, SLOT_MAX, add, pack, recent, unpack
+
+DAY = 20000  # any day, well past the start of the epoch
+
+
+def test_new_ring_is_empty():
+    assert list(unpack(None)) == [0] * HISTORY_DAYS
+    assert list(unpack(b"\x01\x02")) == [0] * HISTORY_DAYS
+
+
+def test_pack_round_trip():
+    ring = unpack(None)
+    for day in range(DAY, DAY + HISTORY_DAYS):
+        add(ring, None, day, day)
+
+    packed = pack(ring)
+    assert len(packed) == HISTORY_DAYS * 4
+    assert unpack(packed) == ring
+
+    # Little endian whatever the platform, slot 0 is the day divisible by the size
+    assert packed[:4] == (DAY - DAY % HISTORY_DAYS + HISTORY_DAYS).to_bytes(4, "little")
+
+
+def test_adds_up_each_day():
+    ring, last_day = unpack(None), None
+
+    for day, amount in ((DAY, 5), (DAY, 7), (DAY + 1, 3), (DAY + 3, 1)):
+        last_day = add(ring, last_day, day, amount)
+
+    assert last_day == DAY + 3
+    assert recent(ring, last_day, 5, DAY + 3) == [0, 12, 3, 0, 1]
+
+    # Read later, days with nothing written are empty
+    assert recent(ring, last_day, 5, DAY + 5) == [3, 0, 1, 0, 0]
+
+
+def test_wraps_around():
+    ring, last_day = unpack(None), None
+
+    # Every day for longer than the ring, only the last HISTORY_DAYS are kept
+    for day in range(DAY, DAY + HISTORY_DAYS * 2 + 10):
+        last_day = add(ring, last_day, day, day - DAY + 1)
+
+    expected = list(range(HISTORY_DAYS + 11, HISTORY_DAYS * 2 + 11))
+    assert recent(ring, last_day, HISTORY_DAYS, last_day) == expected
+    assert recent(ring, last_day, HISTORY_DAYS + 5, last_day)[:5] == [0] * 5
+
+
+def test_skipped_days_are_cleared():
+    ring, last_day = unpack(None), None
+
+    for day in range(DAY, DAY + HISTORY_DAYS):
+        last_day = add(ring, last_day, day, 1)
+
+    # A gap shorter than the ring clears only the days in it
+    last_day = add(ring, last_day, DAY + HISTORY_DAYS + 9, 2)
+    assert recent(ring, last_day, 12, last_day) == [1, 1] + [0] * 9 + [2]
+    assert sum(ring) == HISTORY_DAYS - 10 + 2
+
+    # A gap longer than the ring clears all of it
+    last_day = add(ring, last_day, DAY + HISTORY_DAYS * 5, 4)
+    assert sum(ring) == 4
+    assert recent(ring, last_day, 1, last_day) == [4]
+
+
+def test_old_days_are_dropped():
+    ring, last_day = unpack(None), None
+    last_day = add(ring, last_day, DAY + HISTORY_DAYS, 1)
+
+    # Inside the ring still counts, a day it no longer covers doesn't
+    assert add(ring, last_day, DAY + 1, 5) == last_day
+    assert add(ring, last_day, DAY, 7) == last_day
+    assert recent(ring, last_day, HISTORY_DAYS, last_day)[0] == 5
+    assert sum(ring) == 6
+
+
+def test_slots_are_clamped():
+    ring = unpack(None)
+    last_day = add(ring, None, DAY, SLOT_MAX - 1)
+    add(ring, last_day, DAY, 10)
+    add(ring, last_day, DAY, -10)
+
+    assert ring[DAY % HISTORY_DAYS] == SLOT_MAX
+    assert unpack(pack(ring))[DAY % HISTORY_DAYS] == SLOT_MAX
+
+
+def test_recent_defaults_to_today():
+    ring = unpack(None)
+    last_day = add(ring, None, history.today(), 3)
+
+    assert recent(ring, last_day, 2) == [0, 3]
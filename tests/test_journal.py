@@ -0,0 +1,161 @@
+"""The journal replays what a crash lost, once, and empties after commits"""
+
+import pytest
+
+from db.journal import RECORD, RECORD_SIZE, Journal, read_records
+from db.storage import ShardedSQLiteStorage, SQLiteStorage
+
+
+def crash(storage, main_db) -> None:
+    """Lose everything written since the last commit"""
+
+    for database in {main_db, *storage.databases()}:
+        database.writer.rollback()
+
+
+def restart(storage):
+    """A new storage over the same databases, as after a restart"""
+
+    if isinstance(storage, ShardedSQLiteStorage):
+        return ShardedSQLiteStorage(str(storage.router.directory))
+
+    return SQLiteStorage()
+
+
+def test_read_records_stops_at_a_torn_record(tmp_path):
+    path = tmp_path / "scores.journal"
+    journal = Journal(path)
+    for member_id in (1, 2, 3):
+        journal.append(member_id, 7, 10)
+    journal.close()
+
+    # A crash in the middle of a write
+    with path.open("ab") as file:
+        file.write(b"\x01" * (RECORD_SIZE // 2))
+
+    assert list(read_records(path)) == [(1, 1, 7, 10), (2, 2, 7, 10), (3, 3, 7, 10)]
+
+
+def test_read_records_stops_at_a_corrupt_record(tmp_path):
+    path = tmp_path / "scores.journal"
+    journal = Journal(path)
+    for member_id in (1, 2, 3):
+        journal.append(member_id, 7, 10)
+    journal.close()
+
+    data = bytearray(path.read_bytes())
+    data[RECORD_SIZE + RECORD.size - 1] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    assert list(read_records(path)) == [(1, 1, 7, 10)]
+
+
+def test_read_records_without_a_file(tmp_path):
+    assert not list(read_records(tmp_path / "missing.journal"))
+
+
+@pytest.mark.parametrize("backend", ["sqlite_storage", "sharded_storage"])
+def test_replays_what_a_crash_lost(backend, request, main_db, tmp_path):
+    storage, path = request.getfixturevalue(backend), tmp_path / "scores.journal"
+
+    assert storage.open_journal(path) == 0
+    storage.increment(1, 7, 10)
+    storage.commit()
+
+    storage.increment(1, 7, 5)
+    storage.increment(2, 8, 3)
+    storage.journal.sync()
+    crash(storage, main_db)
+
+    restarted = restart(storage)
+    assert restarted.open_journal(path) == 2
+    assert restarted.score(1, 7) == 15
+    assert restarted.score(2, 8) == 3
+    assert restarted.global_score(1) == 15
+
+    # Replaying committed the increments, so the next start has nothing to do
+    again = restart(storage)
+    assert again.open_journal(path) == 0
+    assert again.score(1, 7) == 15
+    assert again.global_score(2) == 3
+
+    for opened in (restarted, again):
+        opened.journal.close()
+        if isinstance(opened, ShardedSQLiteStorage):
+            opened.router.close()
+
+
+def test_committed_increments_are_not_replayed(sqlite_storage, main_db, tmp_path):
+    path = tmp_path / "scores.journal"
+    sqlite_storage.open_journal(path)
+
+    sqlite_storage.increment(1, 7, 10)
+    sqlite_storage.journal.sync()
+    sqlite_storage.commit()
+    crash(sqlite_storage, main_db)
+
+    # The records are still in the file, but the checkpoint has them
+    assert len(list(read_records(path))) == 1
+
+    restarted = restart(sqlite_storage)
+    assert restarted.open_journal(path) == 0
+    assert restarted.score(1, 7) == 10
+    restarted.journal.close()
+
+
+def test_sharded_totals_are_recounted(sharded_storage, main_db, tmp_path):
+    path = tmp_path / "scores.journal"
+    sharded_storage.open_journal(path)
+
+    sharded_storage.increment(1, 7, 10)
+    sharded_storage.increment(1, 8, 4)
+    sharded_storage.journal.sync()
+
+    # The shards committed but the main database didn't
+    sharded_storage.flush_globals()
+    sharded_storage.checkpoint()
+    sharded_storage.router.commit()
+    crash(sharded_storage, main_db)
+    assert main_db.field("SELECT score FROM global_scores WHERE member_id = 1") is None
+
+    restarted = restart(sharded_storage)
+    assert restarted.open_journal(path) == 0
+    assert restarted.global_score(1) == 14
+    restarted.journal.close()
+    restarted.router.close()
+
+
+def test_checkpoint_and_truncate(sqlite_storage, main_db, tmp_path):
+    path = tmp_path / "scores.journal"
+    sqlite_storage.open_journal(path)
+    journal = sqlite_storage.journal
+
+    for member_id in (1, 2, 3):
+        sqlite_storage.increment(member_id, 7, 10)
+
+    assert not journal.idle
+    journal.sync()
+    assert path.stat().st_size == 3 * RECORD_SIZE
+
+    # Written and not yet committed, there's nothing for a sync to do
+    assert journal.idle
+
+    sqlite_storage.commit()
+    assert main_db.field("SELECT lsn FROM journal_checkpoint") == journal.lsn == 3
+
+    # Everything in the file is committed, the next sync empties it
+    assert not journal.idle
+    journal.sync()
+    assert path.stat().st_size == 0
+    assert journal.idle
+
+
+def test_committed_buffer_is_dropped(sqlite_storage, tmp_path):
+    path = tmp_path / "scores.journal"
+    sqlite_storage.open_journal(path)
+
+    sqlite_storage.increment(1, 7, 10)
+    sqlite_storage.commit()
+    sqlite_storage.journal.sync()
+
+    assert path.stat().st_size == 0
@@ -0,0 +1,85 @@
+"""Level curves put scores on the right side of every threshold"""
+
+from math import isqrt
+
+import pytest
+
+from levels import LinearCurve, QuadraticCurve, TableCurve, make_curve
+from score import ScoreObject
+
+
+def test_quadratic_matches_the_formula():
+    curve = QuadraticCurve("0.07")
+
+    # level = floor(0.07 * sqrt(score)) + 1, worked out exactly
+    for score in range(0, 200000, 7):
+        assert curve.level(score) == isqrt(score * 49 // 10000) + 1
+
+
+@pytest.mark.parametrize("curve", [
+    QuadraticCurve("0.07", max_level=50),
+    LinearCurve(100, max_level=50),
+    TableCurve([0, 10, 25, 60, 61, 1000])
+])
+def test_thresholds(curve):
+    assert curve.level(0) == 1
+
+    for level, start in enumerate(curve.thresholds, start=1):
+        assert curve.level(start) == level
+        if start:
+            assert curve.level(start - 1) == level - 1
+
+    # Past the table scores stay at the last level
+    assert curve.level(curve.thresholds[-1] * 10 + 1) == curve.max_level
+
+
+def test_negative_scores_are_level_one():
+    assert QuadraticCurve().level(-5) == 1
+
+
+def test_levels_matches_level():
+    curve = QuadraticCurve()
+    scores = list(range(0, 50000, 13))
+
+    assert curve.levels(scores) == [curve.level(score) for score in scores]
+
+
+def test_bounds():
+    curve = TableCurve([0, 10, 25])
+
+    assert curve.bounds(0) == (1, 0, 10)
+    assert curve.bounds(24) == (2, 10, 25)
+    assert curve.bounds(25) == (3, 25, None)
+    assert curve.bounds(500) == (3, 25, None)
+
+
+@pytest.mark.parametrize("kind, value", [
+    ("table", "10, 10"),
+    ("table", "20, 10"),
+    ("linear", "0"),
+    ("linear", None),
+    ("quadratic", "-1"),
+    ("linear", "1000000000000000000"),
+    ("quadratic", "1e-6"),
+    ("table", "10, 99999999999999999999"),
+    ("cubic", None)
+])
+def test_invalid_curves(kind, value):
+    with pytest.raises(ValueError):
+        make_curve(kind, value)
+
+
+def test_table_starts_at_zero():
+    assert list(make_curve("table", "10,25").thresholds) == [0, 10, 25]
+    assert list(make_curve("table", "0,10,25").thresholds) == [0, 10, 25]
+
+
+def test_progress():
+    curve = TableCurve([0, 100, 300])
+
+    assert ScoreObject(1, 2, 150, 1, curve=curve).progress == 25.0
+    assert ScoreObject(1, 2, 100, 1, curve=curve).progress == 0.0
+
+    # The last level stays full
+    top = ScoreObject(1, 2, 1000, 1, curve=curve)
+    assert (top.level, top.progress, top.next_level_score) == (3, 100.0, 1000)
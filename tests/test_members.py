@@ -0,0 +1,55 @@
+"""Users missing from every cache are fetched a few at a time"""
+
+import asyncio
+from types import SimpleNamespace
+
+import discord
+
+from constants import USER_FETCH_CONCURRENCY
+from members import MemberCache
+
+
+class FakeClient:
+    """Knows some users, fetches the rest slowly and counts how many at once"""
+
+    def __init__(self, cached=(), missing=()):
+        self.cached = set(cached)
+        self.missing = set(missing)
+        self.fetching = 0
+        self.most_fetching = 0
+        self.fetched = []
+
+    def get_user(self, user_id):
+        return SimpleNamespace(id=user_id, cached=True) if user_id in self.cached else None
+
+    async def fetch_user(self, user_id):
+        self.fetching += 1
+        self.most_fetching = max(self.most_fetching, self.fetching)
+        await asyncio.sleep(0.01)
+        self.fetching -= 1
+        self.fetched.append(user_id)
+
+        if user_id in self.missing:
+            raise discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), "Unknown User")
+
+        return SimpleNamespace(id=user_id, cached=False)
+
+
+def test_fetch_users():
+    client = FakeClient(cached=(1, 2), missing=(13, ))
+    cache = MemberCache(client)
+    user_ids = list(range(1, 31))
+
+    found = asyncio.run(cache.fetch_users(user_ids))
+
+    assert sorted(found) == [user_id for user_id in user_ids if user_id != 13]
+    assert found[1].cached and not found[3].cached
+    assert sorted(client.fetched) == list(range(3, 31))
+    assert 1 < client.most_fetching <= USER_FETCH_CONCURRENCY
+    assert cache.misses == 28
+
+    # Fetched users are remembered, and users that don't exist are asked again
+    client.fetched.clear()
+    found = asyncio.run(cache.fetch_users(user_ids))
+    assert client.fetched == [13]
+    assert cache.hits == 27
@@ -0,0 +1,138 @@
+"""The reward queue merges level ups and spaces its requests out"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import rewards
+from rewards import LevelUp, RewardQueue
+
+
+class FakeMember:
+    """Records the roles it's given"""
+
+    def __init__(self, member_id: int, guild, fail: bool=False):
+        self.id = member_id
+        self.guild = guild
+        self.mention = f"<@{member_id}>"
+        self.fail = fail
+        self.roles = []
+
+    async def add_roles(self, *roles, reason=None):
+        if self.fail:
+            raise AttributeError("the member left")
+
+        self.roles.append(([role.id for role in roles], reason))
+
+
+class FakeChannel:
+    """Records the messages sent to it"""
+
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.sent = []
+
+    async def send(self, content):
+        self.sent.append(content)
+
+
+@pytest.fixture
+def guild():
+    channels = {channel_id: FakeChannel(channel_id) for channel_id in (10, 11)}
+    return SimpleNamespace(id=1, channels=channels, get_channel_or_thread=channels.get)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """The pauses the queue takes, without waiting for them"""
+
+    pauses = []
+    sleep = asyncio.sleep
+
+    async def record(delay):
+        pauses.append(delay)
+        await sleep(0)
+
+    monkeypatch.setattr(rewards.asyncio, "sleep", record)
+    return pauses
+
+
+def level_up(member, channel, old: int, new: int, role_ids=(), announce=True, announce_channel_id=None):
+    return LevelUp(member, channel, old, new, list(role_ids), announce, announce_channel_id)
+
+
+def test_merges_level_ups_of_a_member(guild):
+    first, second = FakeMember(5, guild), FakeMember(6, guild)
+    channels = guild.channels
+
+    merged = RewardQueue.merge([
+        level_up(first, channels[10], 1, 2, [100]),
+        level_up(second, channels[10], 3, 4),
+        level_up(first, channels[11], 2, 3, [100, 101])
+    ])
+
+    assert [(item.member.id, item.old_level, item.new_level) for item in merged] == [(5, 1, 3), (6, 3, 4)]
+    assert merged[0].role_ids == [100, 101]
+    assert merged[0].channel is channels[11]
+
+
+def test_one_request_per_member_and_channel(guild, sleeps):
+    first, second, third = (FakeMember(member_id, guild) for member_id in (5, 6, 7))
+    channels = guild.channels
+
+    asyncio.run(RewardQueue().apply([
+        level_up(first, channels[10], 1, 2, [100]),
+        level_up(first, channels[10], 2, 3, [101]),
+        level_up(second, channels[10], 1, 2, [100]),
+        level_up(third, channels[10], 1, 2, announce_channel_id=11)
+    ]))
+
+    assert first.roles == [([100, 101], "Reached level 3")]
+    assert second.roles == [([100], "Reached level 2")]
+    assert not third.roles
+    assert channels[10].sent == ["<@5> reached **level 3**!\n<@6> reached **level 2**!"]
+    assert channels[11].sent == ["<@7> reached **level 2**!"]
+
+    # Two role edits and two announcements, each followed by a pause
+    assert sleeps == [rewards.REWARD_ACTION_INTERVAL] * 4
+
+
+def test_missing_channels_are_skipped(guild, sleeps):
+    member = FakeMember(5, guild)
+
+    asyncio.run(RewardQueue().apply([level_up(member, guild.channels[10], 1, 2, announce_channel_id=99)]))
+    assert not guild.channels[10].sent
+
+
+def test_worker_survives_a_failed_batch(guild, sleeps, monkeypatch):
+    monkeypatch.setattr(rewards, "REWARD_BATCH_SECONDS", 0)
+    gone, member = FakeMember(5, guild, fail=True), FakeMember(6, guild)
+
+    async def run():
+        queue = RewardQueue()
+        queue.start()
+
+        queue.put(level_up(gone, guild.channels[10], 1, 2, [100]))
+        while queue.processed < 1:
+            await asyncio.sleep(0)
+
+        queue.put(level_up(member, guild.channels[10], 1, 2, [100]))
+        while queue.processed < 2:
+            await asyncio.sleep(0)
+
+        await queue.stop()
+
+    asyncio.run(asyncio.wait_for(run(), 5))
+    assert member.roles == [([100], "Reached level 2")]
+
+
+def test_full_queue_drops(guild):
+    async def run():
+        queue = RewardQueue(max_size=1)
+        for _ in range(3):
+            queue.put(level_up(FakeMember(5, guild), guild.channels[10], 1, 2))
+
+        return queue.dropped
+
+    assert asyncio.run(run()) == 2
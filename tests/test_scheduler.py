@@ -0,0 +1,136 @@
+"""The render scheduler admits, orders and expires jobs, and counts them"""
+
+import asyncio
+
+import pytest
+
+from scheduler import (
+    RenderExpired,
+    RenderPriority,
+    RenderScheduler,
+    RenderTooLarge,
+    SchedulerSaturated
+)
+
+
+def render(result, log: list=None, delay: float=0):
+    """A render job that waits a while, then returns or raises its result"""
+
+    async def job():
+        if log is not None:
+            log.append(result)
+        await asyncio.sleep(delay)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return job
+
+
+def test_priority_order():
+    async def run():
+        scheduler, order = RenderScheduler(workers=1), []
+
+        jobs = [
+            scheduler.submit(render("command scoreboard", order), RenderPriority.COMMAND_SCOREBOARD),
+            scheduler.submit(render("command rank", order), RenderPriority.COMMAND_RANK),
+            scheduler.submit(render("interaction rank", order), RenderPriority.INTERACTION_RANK),
+            scheduler.submit(render("second interaction rank", order), RenderPriority.INTERACTION_RANK)
+        ]
+
+        scheduler.start()
+        await asyncio.gather(*jobs)
+        await scheduler.stop()
+        return scheduler, order
+
+    scheduler, order = asyncio.run(run())
+    assert order == ["interaction rank", "second interaction rank", "command rank", "command scoreboard"]
+    assert scheduler.completed == 4
+    assert scheduler.idle
+
+
+def test_full_queue_rejects():
+    async def run():
+        scheduler = RenderScheduler(workers=1, max_queue=2)
+
+        for _ in range(2):
+            scheduler.submit(render("card"), RenderPriority.COMMAND_RANK)
+        assert scheduler.saturated
+
+        with pytest.raises(SchedulerSaturated):
+            scheduler.submit(render("card"), RenderPriority.INTERACTION_RANK)
+
+        # Jobs still queued fail when the scheduler stops
+        pending = scheduler.queue._queue[0].future  # pylint: disable=W0212
+        await scheduler.stop()
+        with pytest.raises(SchedulerSaturated):
+            await pending
+
+        return scheduler
+
+    assert asyncio.run(run()).rejected == 1
+
+
+def test_deadlines():
+    async def run():
+        scheduler = RenderScheduler(workers=1)
+
+        # The first job holds the only worker past the second one's deadline
+        slow = scheduler.submit(render("slow", delay=0.2), RenderPriority.INTERACTION_RANK)
+        stale = scheduler.submit(render("stale"), RenderPriority.COMMAND_RANK, timeout=0.05)
+        late = scheduler.submit(render("late", delay=1), RenderPriority.COMMAND_RANK, timeout=0.3)
+
+        scheduler.start()
+        assert await slow == "slow"
+        with pytest.raises(RenderExpired):
+            await stale
+        with pytest.raises(RenderExpired):
+            await late
+
+        await scheduler.stop()
+        return scheduler
+
+    scheduler = asyncio.run(run())
+    assert (scheduler.completed, scheduler.expired, scheduler.failed) == (1, 2, 0)
+
+
+def test_failures_are_counted_apart():
+    async def run():
+        scheduler = RenderScheduler(workers=2)
+        scheduler.start()
+
+        too_large = scheduler.submit(render(RenderTooLarge("grid")), RenderPriority.COMMAND_SCOREBOARD)
+        broken = scheduler.submit(render(OSError("font")), RenderPriority.COMMAND_RANK)
+
+        with pytest.raises(RenderTooLarge):
+            await too_large
+        with pytest.raises(OSError):
+            await broken
+
+        await scheduler.stop()
+        return scheduler
+
+    scheduler = asyncio.run(run())
+    assert (scheduler.too_large, scheduler.failed, scheduler.completed) == (1, 1, 0)
+
+
+def test_cancelled_jobs_are_skipped():
+    async def run():
+        scheduler, order = RenderScheduler(workers=1), []
+
+        cancelled = scheduler.submit(render("cancelled", order), RenderPriority.INTERACTION_RANK)
+        kept = scheduler.submit(render("kept", order), RenderPriority.COMMAND_RANK)
+        cancelled.cancel()
+
+        scheduler.start()
+        await kept
+        await scheduler.stop()
+        return order
+
+    assert asyncio.run(run()) == ["kept"]
+
+
+def test_default_deadlines():
+    assert RenderPriority.INTERACTION_SCOREBOARD.is_interaction
+    assert not RenderPriority.COMMAND_RANK.is_interaction
+    assert RenderPriority.INTERACTION_RANK.deadline > RenderPriority.COMMAND_SCOREBOARD.deadline
@@ -0,0 +1,156 @@
+"""Guilds are routed to a shard, and resharding moves every row without loss"""
+
+import json
+import sqlite3
+
+import pytest
+
+from db import journal, shards
+from db.storage import ShardedSQLiteStorage
+
+
+def shard_rows(directory, table: str) -> dict[int, list[tuple]]:
+    """Every shard's rows of a table, by shard number"""
+
+    router = shards.ShardRouter(directory)
+    try:
+        return {
+            index: sorted(shard.records(f"SELECT * FROM {table}"))
+            for index, shard in enumerate(router.shards)
+        }
+    finally:
+        router.close()
+
+
+@pytest.fixture
+def filled(sqlite_storage, main_db):
+    """Scores, an archived member, a departure and history in the main database"""
+
+    for guild_id in range(10, 16):
+        for member_id in range(1, 6):
+            sqlite_storage.increment(member_id, guild_id, member_id * guild_id)
+
+    sqlite_storage.set_active(5, 11, False)
+    sqlite_storage.set_active(5, 12, False)
+    main_db.execute("UPDATE departures SET departed_at = 0 WHERE guild_id = 12")
+    sqlite_storage.archive(10, range(10, 16), 10)
+    sqlite_storage.commit()
+
+    return {
+        table: sorted(main_db.records(f"SELECT {', '.join(columns)} FROM {table}"))
+        for table, columns in shards.SHARD_TABLES.items()
+    }
+
+
+def test_routes_by_guild_id(tmp_path):
+    router = shards.ShardRouter(tmp_path)
+
+    assert len(router) == json.loads((tmp_path / shards.MANIFEST).read_text())["count"]
+    for guild_id in range(6):
+        assert router.index(guild_id) == guild_id % len(router)
+    assert router.shard(len(router) + 1) is router.shards[1]
+    router.close()
+
+
+def test_manifest_count_wins(tmp_path):
+    (tmp_path / shards.MANIFEST).write_text(json.dumps({"count": 3}))
+
+    router = shards.ShardRouter(tmp_path)
+    assert len(router) == 3
+    router.close()
+
+
+def test_from_main(filled, main_db, tmp_path):
+    global_scores = main_db.records("SELECT * FROM global_scores ORDER BY member_id")
+    directory = tmp_path / "shards"
+
+    copied = shards.reshard(3, directory)
+    assert copied == {table: len(rows) for table, rows in filled.items()}
+    assert copied["archived_scores"] == 1 and copied["departures"] == 1
+
+    # Every row is in its guild's shard, and nowhere else
+    for table, columns in shards.SHARD_TABLES.items():
+        moved = shard_rows(directory, table)
+        assert sorted(row for rows in moved.values() for row in rows) == filled[table]
+        for index, rows in moved.items():
+            assert all(row[columns.index("guild_id")] % 3 == index for row in rows)
+
+    # The main database keeps the totals, and the trigger dropped to keep
+    # them is back for the main database's own use
+    assert all(main_db.field(f"SELECT COUNT(*) FROM {table}") == 0 for table in shards.SHARD_TABLES)
+    assert main_db.records("SELECT * FROM global_scores ORDER BY member_id") == global_scores
+    assert main_db.field(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name = 'global_scores_delete'"
+    ) == 1
+
+
+def test_between_shard_counts(filled, main_db, tmp_path):
+    directory = tmp_path / "shards"
+    shards.reshard(4, directory)
+
+    for count in (2, 1, 5):
+        shards.reshard(count, directory)
+        assert len(shard_rows(directory, "scores")) == count
+
+        for table in shards.SHARD_TABLES:
+            moved = shard_rows(directory, table)
+            assert sorted(row for rows in moved.values() for row in rows) == filled[table]
+
+    assert not directory.with_name("shards.new").exists()
+    assert not directory.with_name("shards.old").exists()
+
+    sharded = ShardedSQLiteStorage(str(directory))
+    assert sharded.global_score(5) == sum(5 * guild_id for guild_id in range(10, 16))
+    assert sharded.score(5, 12) is None
+    assert sharded.increment(5, 12, 1) == 5 * 12 + 1
+    sharded.router.close()
+
+
+def test_a_failed_reshard_changes_nothing(filled, main_db, tmp_path, monkeypatch):
+    directory = tmp_path / "shards"
+    shards.reshard(2, directory)
+    before = shard_rows(directory, "scores")
+
+    monkeypatch.setitem(shards.SHARD_TABLES, "missing_table", ("guild_id", ))
+    with pytest.raises(sqlite3.OperationalError):
+        shards.reshard(3, directory)
+
+    assert shard_rows(directory, "scores") == before
+
+
+def test_a_failed_first_reshard_keeps_the_main_database(filled, main_db, tmp_path, monkeypatch):
+    monkeypatch.setitem(shards.SHARD_TABLES, "missing_table", ("guild_id", ))
+    with pytest.raises(sqlite3.OperationalError):
+        shards.reshard(3, tmp_path / "shards")
+
+    assert not shards.is_sharded(tmp_path / "shards")
+    assert len(main_db.records("SELECT * FROM scores")) == len(filled["scores"])
+
+
+def test_refuses(main_db, tmp_path, monkeypatch):
+    with pytest.raises(ValueError):
+        shards.reshard(0, tmp_path / "shards")
+
+    # Increments left in the journal from a crash
+    path = tmp_path / "scores.journal"
+    left = journal.Journal(path)
+    left.append(1, 10, 5)
+    left.close()
+    monkeypatch.setattr(shards, "JOURNAL_PATH", str(path))
+
+    with pytest.raises(RuntimeError):
+        shards.reshard(2, tmp_path / "shards")
+
+    assert not shards.is_sharded(tmp_path / "shards")
+
+
+def test_recount_globals(sharded_storage, main_db):
+    sharded_storage.increment(1, 10, 10)
+    sharded_storage.increment(1, 11, 5)
+    sharded_storage.commit()
+
+    # The totals lost track, as after a crash between commits
+    main_db.execute("UPDATE global_scores SET score = 0")
+    sharded_storage.router.recount_globals([1, 1, 2])
+
+    assert main_db.records("SELECT * FROM global_scores") == [(1, 15)]
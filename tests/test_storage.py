@@ -0,0 +1,173 @@
+"""The storage backends agree with each other, archive and restore, and reshard"""
+
+import random
+
+import pytest
+
+from db import shards
+from db.storage import MemoryStorage, ShardedSQLiteStorage
+
+
+MEMBERS = range(1, 41)
+GUILDS = (7, 8, 9)
+
+
+def apply_all(storages, seed: int=1, steps: int=2000) -> None:
+    """Apply the same random operations to every storage, with the same amounts"""
+
+    rng = random.Random(seed)
+
+    for _ in range(steps):
+        member_id, guild_id = rng.choice(MEMBERS), rng.choice(GUILDS)
+        action, amount, active = rng.random(), rng.randrange(1, 50), rng.random() < 0.5
+
+        for storage in storages:
+            if action < 0.85:
+                storage.increment(member_id, guild_id, amount)
+            elif action < 0.92:
+                storage.set_active(member_id, guild_id, False)
+            elif action < 0.98:
+                storage.upsert_member(member_id, guild_id)
+            else:
+                storage.set_guild_active(guild_id, active)
+
+
+def snapshot(storage) -> dict:
+    """Everything the bot can read out of a storage"""
+
+    return {
+        "members": sorted(storage.iter_members()),
+        "scores": {
+            (member_id, guild_id): (storage.score(member_id, guild_id), storage.rank(member_id, guild_id))
+            for member_id in MEMBERS for guild_id in GUILDS
+        },
+        "top": {guild_id: storage.top(guild_id, 10) for guild_id in GUILDS},
+        "neighbours": {
+            (member_id, guild_id): storage.neighbours(member_id, guild_id, 3)
+            for member_id in MEMBERS for guild_id in GUILDS + (None, )
+        },
+        "globals": {
+            member_id: (storage.global_score(member_id), storage.global_rank(member_id))
+            for member_id in MEMBERS
+        },
+        "global_top": storage.global_top(10),
+        "history": {member_id: storage.history(member_id, None, 3) for member_id in MEMBERS}
+    }
+
+
+@pytest.mark.parametrize("backend", ["sqlite_storage", "sharded_storage"])
+def test_matches_memory(backend, request):
+    storage, memory = request.getfixturevalue(backend), MemoryStorage()
+
+    apply_all([storage, memory], steps=1000)
+    assert snapshot(storage) == snapshot(memory)
+
+    # Committing writes the pending history and totals, nothing changes
+    storage.commit()
+    apply_all([storage, memory], seed=2, steps=1000)
+    storage.commit()
+    assert snapshot(storage) == snapshot(memory)
+
+
+def test_increment_returns_the_total(sqlite_storage):
+    assert sqlite_storage.increment(1, 7, 30) == 30
+    assert sqlite_storage.increment(1, 7, 12) == 42
+    assert sqlite_storage.increment(1, 8, 5) == 5
+    assert sqlite_storage.global_score(1) == 47
+
+
+def test_ties_rank_by_member_id(sqlite_storage):
+    for member_id in (3, 1, 2):
+        sqlite_storage.increment(member_id, 7, 10)
+
+    assert sqlite_storage.top(7, 3) == [(1, 10), (2, 10), (3, 10)]
+    assert [sqlite_storage.rank(member_id, 7) for member_id in (1, 2, 3)] == [1, 2, 3]
+    assert sqlite_storage.neighbours(2, 7, 1) == (1, [(1, 10), (2, 10), (3, 10)])
+
+
+def depart(storage, member_id: int, guild_id: int) -> None:
+    """Make a member leave long enough ago to be archived"""
+
+    storage.set_active(member_id, guild_id, False)
+    storage.database(guild_id).execute(
+        "UPDATE departures SET departed_at = 0 WHERE member_id = ? AND guild_id = ?",
+        member_id, guild_id
+    )
+
+
+@pytest.mark.parametrize("backend", ["sqlite_storage", "sharded_storage"])
+def test_archive_and_restore(backend, request):
+    storage = request.getfixturevalue(backend)
+
+    storage.increment(1, 7, 100)
+    storage.increment(1, 8, 20)
+    storage.increment(2, 7, 50)
+    storage.commit()
+    history = storage.history(1, 7, 3)
+    depart(storage, 1, 7)
+
+    assert storage.archive(10, GUILDS, 10) == 1
+    assert storage.archive(10, GUILDS, 10) == 0
+    assert storage.score(1, 7) is None
+    assert storage.top(7, 10) == [(2, 50)]
+
+    # Archived scores and history still count
+    assert storage.global_score(1) == 120
+    assert storage.history(1, 7, 3) == history
+
+    # The first message back restores the score, in the total it returns
+    assert storage.increment(1, 7, 5) == 105
+    assert storage.rank(1, 7) == 1
+    assert storage.global_score(1) == 125
+    storage.commit()
+    assert storage.history(1, 7, 3)[-1] == history[-1] + 5
+
+
+def test_archive_respects_the_limit_and_guilds(sqlite_storage):
+    for member_id in MEMBERS:
+        sqlite_storage.increment(member_id, 7, member_id)
+        sqlite_storage.set_active(member_id, 7, False)
+
+    # Departed recently, but from a guild the bot isn't in any more
+    assert sqlite_storage.archive(0, [8], 15) == 15
+    assert sqlite_storage.archive(0, [7], 100) == 0
+    assert sqlite_storage.archive(0, [8], 100) == len(MEMBERS) - 15
+
+
+def test_reshard(main_db, sqlite_storage, tmp_path):
+    memory = MemoryStorage()
+    apply_all([sqlite_storage, memory], steps=1500)
+    sqlite_storage.commit()
+    expected = snapshot(memory)
+
+    directory = tmp_path / "shards"
+    copied = shards.reshard(3, directory)
+    assert copied["scores"] == len(expected["members"])
+    assert main_db.field("SELECT COUNT(*) FROM scores") == 0
+
+    sharded = ShardedSQLiteStorage(str(directory))
+    assert len(sharded.router) == 3
+    assert snapshot(sharded) == expected
+    sharded.router.close()
+
+    shards.reshard(2, directory)
+    sharded = ShardedSQLiteStorage(str(directory))
+    assert len(sharded.router) == 2
+    assert snapshot(sharded) == expected
+    sharded.router.close()
+
+
+def test_sharded_globals_are_written_on_commit(sharded_storage, main_db):
+    sharded_storage.increment(1, 7, 10)
+    sharded_storage.increment(1, 8, 5)
+
+    # Nothing is written to the main database until a commit or a read
+    assert main_db.field("SELECT score FROM global_scores WHERE member_id = 1") is None
+    sharded_storage.commit()
+    assert main_db.field("SELECT score FROM global_scores WHERE member_id = 1") == 15
+
+    # A recount isn't added to by what was pending
+    sharded_storage.increment(1, 7, 1)
+    sharded_storage.recount_globals([1])
+    sharded_storage.commit()
+    assert sharded_storage.global_score(1) == 16
@@ -0,0 +1,118 @@
+"""Scores survive an export and import, and other bots' exports import"""
+
+import io
+import json
+
+import pytest
+
+from db import transfer
+from test_storage import depart
+
+
+@pytest.fixture(params=["sqlite_storage", "sharded_storage"])
+def storage(request, monkeypatch):
+    """Each SQLite backend, installed as the bot's storage"""
+
+    installed = request.getfixturevalue(request.param)
+    monkeypatch.setattr(transfer, "get_storage", lambda: installed)
+    return installed
+
+
+def fill(storage) -> None:
+    """A few members in two guilds, one of them archived"""
+
+    for member_id, guild_id, amount in ((1, 7, 100), (2, 7, 50), (1, 8, 30), (3, 8, 5)):
+        storage.increment(member_id, guild_id, amount)
+
+    depart(storage, 3, 8)
+    storage.archive(10, [7, 8], 10)
+    storage.commit()
+
+
+@pytest.mark.parametrize("fmt", transfer.FORMATS)
+def test_round_trip(storage, fmt):
+    fill(storage)
+
+    exported = io.StringIO()
+    assert transfer.export_scores(exported, fmt) == 4
+    rows = sorted(transfer.iter_scores())
+    assert rows == [(1, 7, 100, 1), (1, 8, 30, 1), (2, 7, 50, 1), (3, 8, 5, 0)]
+
+    # Everyone gains some more, importing puts the exported scores back
+    for member_id, guild_id, *_ in rows:
+        storage.increment(member_id, guild_id, 11)
+    storage.commit()
+
+    exported.seek(0)
+    assert transfer.import_scores(exported, fmt) == 4
+    assert sorted(transfer.iter_scores()) == rows
+    assert [storage.global_score(member_id) for member_id in (1, 2, 3)] == [130, 50, 5]
+
+
+def test_export_one_guild(storage):
+    fill(storage)
+
+    exported = io.StringIO()
+    assert transfer.export_scores(exported, "jsonl", 7) == 2
+    assert [json.loads(line) for line in exported.getvalue().splitlines()] == [
+        {"member_id": 1, "guild_id": 7, "score": 100, "active": 1},
+        {"member_id": 2, "guild_id": 7, "score": 50, "active": 1}
+    ]
+
+
+def test_other_bots_columns(storage):
+    exported = io.StringIO("UserID,XP,Level\n5,120.6,3\n6,40,1\n")
+
+    assert transfer.import_scores(exported, "csv", 9) == 2
+    assert storage.top(9, 10) == [(5, 120), (6, 40)]
+    assert storage.global_score(5) == 120
+
+
+@pytest.mark.parametrize("record, expected", [
+    ({"member_id": "1", "guild_id": "2", "score": "3", "active": "0"}, (1, 2, 3, 0)),
+    ({"user_id": 1, "server_id": 2, "exp": 3.9}, (1, 2, 3, 1)),
+    ({" ID ": "1", "Points": "3"}, (1, 9, 3, 1)),
+    ({"userid": "1", "guildid": "", "experience": "3"}, (1, 9, 3, 1))
+])
+def test_aliases(record, expected):
+    assert transfer._normalise(record, 9) == expected  # pylint: disable=W0212
+
+
+@pytest.mark.parametrize("record", [
+    {"member_id": "1", "score": "3"},
+    {"member_id": "1", "guild_id": "2"},
+    {"member_id": "one", "guild_id": "2", "score": "3"}
+])
+def test_bad_records(record):
+    with pytest.raises(ValueError):
+        transfer._normalise(record)  # pylint: disable=W0212
+
+
+def test_bad_rows_stop_the_import(storage):
+    exported = io.StringIO('{"member_id": 1, "score": 5}\n\n{"member_id": 2}\n')
+
+    with pytest.raises(ValueError):
+        transfer.import_scores(exported, "jsonl", 7)
+
+
+def test_read_batches():
+    exported = io.StringIO("".join(f'{{"id": {member_id}, "xp": 1}}\n' for member_id in range(7)))
+
+    batches = list(transfer.read_batches(exported, "jsonl", 7, 3))
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    assert batches[2] == [(6, 7, 1, 1)]
+
+
+@pytest.mark.parametrize("filename, fmt", [
+    ("scores.csv", "csv"),
+    ("Scores.JSONL", "jsonl"),
+    ("scores.json", "jsonl"),
+    ("scores.ndjson", "jsonl")
+])
+def test_detect_format(filename, fmt):
+    assert transfer.detect_format(filename) == fmt
+
+
+def test_unsupported_format():
+    with pytest.raises(ValueError):
+        transfer.detect_format("scores.xlsx")
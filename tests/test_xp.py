@@ -0,0 +1,117 @@
+"""XP rules evaluate messages by channel and role, and compile from the config"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from constants import DEFAULT_BASE_XP
+from levels import DEFAULT_CURVE
+from xp import XPRules, XPRulesCache
+
+
+def channel(channel_id: int, parent_id: int=None):
+    """A channel, or a thread in the parent channel"""
+
+    if parent_id is None:
+        return SimpleNamespace(id=channel_id)
+
+    return SimpleNamespace(id=channel_id, parent_id=parent_id)
+
+
+def member(*role_ids: int):
+    return SimpleNamespace(roles=[SimpleNamespace(id=role_id) for role_id in role_ids])
+
+
+def test_default_rules():
+    assert XPRules().evaluate(channel(1), member()) == DEFAULT_BASE_XP
+
+
+def test_channels():
+    rules = XPRules(
+        base_xp=10,
+        channel_multipliers={1: 2.0, 2: 0.5},
+        ignored_channels=frozenset((3, ))
+    )
+
+    assert rules.evaluate(channel(1), member()) == 20
+    assert rules.evaluate(channel(2), member()) == 5
+    assert rules.evaluate(channel(3), member()) == 0
+    assert rules.evaluate(channel(4), member()) == 10
+
+    # Threads follow their channel, unless they have a multiplier of their own
+    assert rules.evaluate(channel(10, parent_id=1), member()) == 20
+    assert rules.evaluate(channel(11, parent_id=3), member()) == 0
+    assert rules.evaluate(channel(2, parent_id=1), member()) == 5
+
+
+def test_best_role_multiplier():
+    rules = XPRules(base_xp=10, channel_multipliers={1: 2.0}, role_multipliers={5: 1.5, 6: 3.0, 7: 0.5})
+
+    assert rules.evaluate(channel(4), member(5, 6, 7)) == 30
+    assert rules.evaluate(channel(4), member(7)) == 5
+    assert rules.evaluate(channel(4), member(8)) == 10
+    assert rules.evaluate(channel(1), member(5)) == 30
+
+
+def test_random_bonus_and_rounding():
+    rules = XPRules(base_xp=10, random_min=1, random_max=5, role_multipliers={5: 0.25})
+
+    assert {rules.evaluate(channel(4), member()) for _ in range(500)} == set(range(11, 16))
+    assert {rules.evaluate(channel(4), member(5)) for _ in range(500)} <= {3, 4}
+
+
+def test_rewards_between():
+    rules = XPRules(level_rewards={2: (20, ), 5: (50, 51), 9: (90, )})
+
+    assert rules.rewards_between(1, 2) == [20]
+    assert rules.rewards_between(2, 4) == []
+    assert rules.rewards_between(1, 9) == [20, 50, 51, 90]
+    assert XPRules().rewards_between(1, 50) == []
+
+
+@pytest.fixture
+def cache(main_db) -> XPRulesCache:
+    return XPRulesCache()
+
+
+def test_compile(cache):
+    cache.set_base_xp(1, 15, 0, 3)
+    cache.set_channel_multiplier(1, 100, 2.0)
+    cache.set_role_multiplier(1, 200, 1.5)
+    cache.set_ignored(1, 300, True)
+    cache.set_level_reward(1, 5, 500, True)
+    cache.set_level_reward(1, 5, 501, True)
+    cache.set_announcements(1, True, 400)
+    cache.set_level_curve(1, "linear", "100")
+
+    rules = cache.get(1)
+    assert (rules.base_xp, rules.random_min, rules.random_max) == (15, 0, 3)
+    assert rules.channel_multipliers == {100: 2.0}
+    assert rules.role_multipliers == {200: 1.5}
+    assert rules.ignored_channels == {300}
+    assert sorted(rules.level_rewards[5]) == [500, 501]
+    assert (rules.announce, rules.announce_channel_id) == (True, 400)
+    assert rules.curve.level(250) == 3
+
+    # Other guilds keep the defaults
+    assert cache.get(2) == XPRules()
+
+
+def test_changes_recompile(cache):
+    first = cache.get(1)
+    assert cache.get(1) is first
+
+    cache.set_channel_multiplier(1, 100, 2.0)
+    assert cache.get(1).channel_multipliers == {100: 2.0}
+
+    # A multiplier of 1 is the same as none
+    cache.set_channel_multiplier(1, 100, 1)
+    cache.set_announcements(1, False)
+    cache.set_level_reward(1, 5, 500, False)
+    assert cache.get(1) == first
+
+
+def test_broken_curve_uses_the_default(cache, main_db):
+    main_db.execute("INSERT INTO level_curves (guild_id, kind, value) VALUES (1, 'linear', '0')")
+
+    assert cache.get(1).curve is DEFAULT_CURVE